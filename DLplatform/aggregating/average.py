@@ -24,24 +24,44 @@ class Average(Aggregator):
         else:
             return param1.distance(param2)**2
 
-    def __call__(self, params : List[Parameters]) -> Parameters:
+    def calculateDivergenceFromSquaredDistance(self, squaredDistance):
+        return squaredDistance
+
+    def __call__(self, params : List[Parameters], weights : List[float] = None) -> Parameters:
         '''
 
         This aggregator takes n lists of model parameters and returns a list of component-wise arithmetic means.
+        If weights are given, the weighted arithmetic mean is returned instead.
 
         Parameters
         ----------
         params A list of Paramters objects. These objects support addition and scalar multiplication.
+        weights A list of non-negative weights, one per element of params (optional)
 
         Returns
         -------
         A new parameter object that is the average of params.
 
         '''
+        if weights is None:
+            newParams = params[0].getCopy()
+            for i in range(1,len(params)):
+                newParams.add(params[i])
+            newParams.scalarMultiply(1/float(len(params)))
+            return newParams
+
+        if len(weights) != len(params):
+            error_text = "Amount of weights (" + str(len(weights)) + ") does not match amount of parameters (" + str(len(params)) + ")"
+            self.error(error_text)
+            raise ValueError(error_text)
+
         newParams = params[0].getCopy()
+        newParams.scalarMultiply(float(weights[0]))
         for i in range(1,len(params)):
-            newParams.add(params[i])
-        newParams.scalarMultiply(1/float(len(params)))
+            weightedParams = params[i].getCopy()
+            weightedParams.scalarMultiply(float(weights[i]))
+            newParams.add(weightedParams)
+        newParams.scalarMultiply(1/float(sum(weights)))
         return newParams
         
     def __str__(self):
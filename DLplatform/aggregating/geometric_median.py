@@ -3,7 +3,6 @@ from DLplatform.aggregating import Aggregator
 from DLplatform.parameters import Parameters
 from typing import List
 import numpy as np
-from scipy.spatial.distance import cdist, euclidean
 
 class GeometricMedian(Aggregator):
     '''
@@ -25,6 +24,9 @@ class GeometricMedian(Aggregator):
         else:
             return param1.distance(param2)
 
+    def calculateDivergenceFromSquaredDistance(self, squaredDistance):
+        return np.sqrt(squaredDistance)
+
     def __call__(self, params: List[Parameters]) -> Parameters:
         '''
 
@@ -54,7 +56,9 @@ class GeometricMedian(Aggregator):
         iterCount = 0
         
         while iterCount <= mat_iter:
-            D = cdist(X, [y])
+            # distances of all the models to the current estimate as a column, computed with numpy
+            # instead of scipy's cdist, so that processes using the aggregators do not import scipy
+            D = np.linalg.norm(X - y, axis = 1).reshape(-1, 1)
             nonzeros = (D != 0)[:, 0]
     
             Dinv = 1 / D[nonzeros]
@@ -73,7 +77,7 @@ class GeometricMedian(Aggregator):
                 rinv = 0 if r == 0 else num_zeros/r
                 y1 = max(0, 1-rinv)*T + min(1, rinv)*y
     
-            if euclidean(y, y1) < eps:
+            if np.linalg.norm(y - y1) < eps:
                 return y1
     
             y = y1
@@ -1,2 +1,3 @@
 from DLplatform.communicating.communicator import Communicator
-from DLplatform.communicating.rabbitMQComm import RabbitMQComm
\ No newline at end of file
+from DLplatform.communicating.rabbitMQComm import RabbitMQComm
+from DLplatform.communicating.localComm import LocalBroker, LocalComm
\ No newline at end of file
@@ -1,7 +1,11 @@
 from DLplatform.baseClass import baseClass
 from DLplatform.parameters import Parameters
+from DLplatform.phaseTimer import PhaseTimer
+from DLplatform.metrics import MetricsRegistry
+from DLplatform.profiling import Profiler
 
 from typing import List
+from functools import partial
 from multiprocessing import Process
 from abc import ABCMeta
 
@@ -28,6 +32,12 @@ class Communicator(baseClass, Process):
 
         self._consumerConnection    = None
         self.learningLogger         = None
+        # timing of serialization and publishing, disabled unless a timer is set
+        self._phaseTimer            = PhaseTimer()
+        # live metrics, only collected if a registry is set
+        self._metrics               = None
+        # profiling of the communicator process, only if a profiler is set
+        self._profiler              = None
 
     def setLearningLogger(self, learningLogger):
         '''
@@ -36,6 +46,35 @@ class Communicator(baseClass, Process):
         '''
         self.learningLogger = learningLogger
 
+    def setPhaseTimer(self, phaseTimer : PhaseTimer):
+        '''
+        Setter for the PhaseTimer measuring serialization and publishing of messages
+        '''
+        self._phaseTimer = phaseTimer
+
+    def setMetricsRegistry(self, registry : MetricsRegistry):
+        '''
+        Setter for the MetricsRegistry counting published messages and their bytes
+        '''
+        self._metrics = registry
+        registry.counter("dlplatform_messages_sent_total", "Messages published, by kind")
+        registry.counter("dlplatform_message_bytes_sent_total", "Bytes of the messages published, by kind")
+
+    def setProfiler(self, profiler : Profiler):
+        '''
+        Setter for the Profiler the process of the communicator is run under
+        '''
+        self._profiler = profiler
+
+    def _countPublished(self, topic : str, message):
+        '''
+        Counts a published message in the metrics, by its kind, i.e., the first word of its topic
+        '''
+        if not self._metrics is None:
+            labels = {"kind": topic.split('.')[0]}
+            self._metrics.counter("dlplatform_messages_sent_total").inc(labels = labels)
+            self._metrics.counter("dlplatform_message_bytes_sent_total").inc(len(message), labels = labels)
+
     # the point where it is still to RabbitMQ oriented, should be much more high level
     def _onMessageReceived(self, ch, method, properties, body):
         '''
@@ -93,16 +132,18 @@ class Communicator(baseClass, Process):
     def sendDeregistration(self, identifier : str):
         raise NotImplementedError
 
-    def sendParameters(self, identifier : str, param : Parameters):
+    def sendParameters(self, identifier : str, param : Parameters, roundId = None):
         '''
-        Publish message with parametres
+        Publish message with parametres as answer to the balancing
+        request of the synchronization round roundId
         '''
 
         raise NotImplementedError
 
-    def sendBalancingRequest(self, identifier : str):
+    def sendBalancingRequest(self, identifier : str, roundId = None):
         '''
         Publish message to query the worker for its current parameters
+        within the synchronization round roundId
         '''
 
         raise NotImplementedError
@@ -129,6 +170,10 @@ class Communicator(baseClass, Process):
         if (self._consumerConnection == None):
             raise AttributeError("Consumer connection wasn't set properly!")
 
+        if not self._profiler is None:
+            # run of the subclass is looked up via the class, so the wrapper can be pickled with the process
+            self.run = self._profiler.wrap(partial(type(self).run, self), self.getName())
+
         super().start()
 
     def run(self):
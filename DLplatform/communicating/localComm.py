@@ -0,0 +1,167 @@
+from DLplatform.baseClass import baseClass
+from DLplatform.communicating.rabbitMQComm import RabbitMQComm
+from DLplatform.communicating import Communicator
+
+from multiprocessing import Manager
+from typing import List
+import uuid
+
+def topicMatches(pattern : str, topic : str) -> bool:
+    '''
+    Matches a routing key against a binding pattern the way topic exchanges
+    of RabbitMQ do: words are separated by dots, "*" stands for exactly one word
+    and "#" for zero or more words
+
+    Parameters
+    ----------
+    pattern - binding pattern, e.g., "#.1.#"
+    topic - routing key, e.g., "newModel.0.1"
+
+    Returns
+    -------
+    bool
+    '''
+    return _wordsMatch(pattern.split('.'), topic.split('.'))
+
+def _wordsMatch(patternWords : List[str], topicWords : List[str]) -> bool:
+    if len(patternWords) == 0:
+        return len(topicWords) == 0
+    if patternWords[0] == '#':
+        return any(_wordsMatch(patternWords[1:], topicWords[i:]) for i in range(len(topicWords) + 1))
+    if len(topicWords) == 0:
+        return False
+    if patternWords[0] == '*' or patternWords[0] == topicWords[0]:
+        return _wordsMatch(patternWords[1:], topicWords[1:])
+    return False
+
+class LocalBroker(baseClass):
+    '''
+    Stand-in for the RabbitMQ server when all the workers and the coordinator run
+    on one host, e.g., for benchmarks and tests of the whole system without a broker.
+    The subscriptions of the communicators and the statistics of the published
+    messages are kept by a multiprocessing manager, so the broker has to be created
+    before the processes of workers and coordinator are started. Every LocalComm
+    created with this broker gets its own inbox queue from the manager.
+    '''
+
+    def __init__(self, name = "LocalBroker"):
+        '''
+        Initialize BaseClass parent with name LocalBroker and starts the manager process
+
+        Returns
+        -------
+        None
+        '''
+        baseClass.__init__(self, name = name)
+
+        self._manager       = Manager()
+        self._subscriptions = self._manager.dict()
+        self._statistics    = self._manager.dict()
+        self._lock          = self._manager.Lock()
+
+    def createInbox(self):
+        '''
+        Returns
+        -------
+        a queue managed by the broker, to which messages for one communicator are delivered
+        '''
+        return self._manager.Queue()
+
+    def getStatistics(self) -> dict:
+        '''
+        Getter for the statistics of the published messages
+
+        Returns
+        -------
+        dict - for every kind of message, i.e., the first word of its topic, a list of
+            the amount of messages and the amount of bytes published
+        '''
+        return dict(self._statistics)
+
+    def shutdown(self):
+        '''
+        Stops the manager process; communicators of this broker cannot be used afterwards
+        '''
+        self._manager.shutdown()
+
+class LocalComm(RabbitMQComm):
+    '''
+    Communicator that delivers the messages through a LocalBroker instead of a
+    RabbitMQ server. Message formats, validation of the arguments and logging
+    are the ones of RabbitMQComm; only publishing and consuming are replaced.
+    Published messages are delivered to the inboxes of all the communicators
+    that subscribed to the exchange with a matching topic, the consuming process
+    passes messages from its inbox to the worker or coordinator.
+    '''
+
+    def __init__(self, broker : LocalBroker, uniqueId = "", name = "LocalComm"):
+        '''
+        Initializes the BaseClass with name LocalComm
+
+        Parameters
+        ----------
+        broker - the LocalBroker shared by all the communicators of the experiment
+        uniqueId - appended to the exchange names as for RabbitMQComm
+        '''
+        Communicator.__init__(self, name = name)
+
+        self._exchangeCoordinator       = 'coordinator' + uniqueId
+        self._exchangeNodes             = 'nodes' + uniqueId
+        self._subscriptionId            = uuid.uuid4().hex
+        self._subscriptions             = broker._subscriptions
+        self._statistics                = broker._statistics
+        self._lock                      = broker._lock
+        self._inbox                     = broker.createInbox()
+
+    def __getstate__(self):
+        return Communicator.__getstate__(self)
+
+    def __setstate__(self, d):
+        Communicator.__setstate__(self, d)
+
+    def _setupPublishConnection(self):
+        pass
+
+    def _publish(self, exchange, topic, message):
+        '''
+        Delivers a message to all the inboxes subscribed to the exchange with a matching topic
+        and counts it in the statistics of the broker
+        '''
+        with self._phaseTimer.measure("publish"):
+            for subscribedExchange, topics, inbox in list(self._subscriptions.values()):
+                if subscribedExchange == exchange and any(topicMatches(pattern, topic) for pattern in topics):
+                    inbox.put((topic, exchange, message))
+
+        self._countPublished(topic, message)
+        kind = topic.split('.')[0]
+        with self._lock:
+            messages, size = self._statistics.get(kind, (0, 0))
+            self._statistics[kind] = (messages + 1, size + len(message))
+
+    def run(self):
+        '''
+        Method that is run as target of the process with communicator
+        Subscribes the inbox to the exchange and topics set in initiate and
+        passes the received messages to the interprocess communication queue.
+
+        Returns
+        -------
+        None
+        '''
+
+        # run Process parent class
+        Communicator.run(self)
+
+        self._subscriptions[self._subscriptionId] = (self._exchange, self._topics, self._inbox)
+        try:
+            while True:
+                routing_key, exchange, body = self._inbox.get()
+                self.info("received message " + routing_key)
+                self._consumerConnection.put((routing_key, exchange, body))
+        except (KeyboardInterrupt, EOFError, BrokenPipeError):
+            pass
+        finally:
+            try:
+                del self._subscriptions[self._subscriptionId]
+            except (KeyError, EOFError, BrokenPipeError, ConnectionError):
+                pass
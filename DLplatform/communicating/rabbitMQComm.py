@@ -2,7 +2,6 @@ from DLplatform.parameters import Parameters
 from DLplatform.communicating import Communicator
 
 from typing import List
-import pika
 import pickle
 import sys
 import threading
@@ -69,10 +68,15 @@ class RabbitMQComm(Communicator):
             d['_publishConnection'] = "reconnect_required"
         if '_publishChannel' in d:
             d['_publishChannel'] = "reconnect_required"
+        if '_connectionClosedError' in d:
+            d['_connectionClosedError'] = None
         return d
 
     def __setstate__(self, d):
         if '_publishConnection' in d and d['_publishConnection'] == "reconnect_required":
+            import pika
+            import pika.exceptions
+            d['_connectionClosedError'] = pika.exceptions.ConnectionClosed
             credentials = pika.PlainCredentials(d['_user'], d['_password'])
             d['_publishConnection'] = pika.BlockingConnection(pika.ConnectionParameters(host=d['_hostname'],
                                         port=d['_port'], credentials=credentials, blocked_connection_timeout=None,
@@ -96,7 +100,7 @@ class RabbitMQComm(Communicator):
         self._exchange = exchange
         self._topics = topics
 
-    def connect(self) -> pika.BlockingConnection:
+    def connect(self) -> 'pika.BlockingConnection':
         '''
         Performs connection to the communication server
         All the parameters of a server are set up in the initializer.
@@ -106,6 +110,8 @@ class RabbitMQComm(Communicator):
         connection to the server
         '''
 
+        # pika is imported only by processes connecting to the server, e.g., not with LocalComm
+        import pika
         credentials = pika.PlainCredentials(self._user, self._password)
         return pika.BlockingConnection(pika.ConnectionParameters(host = self._hostname,
                     port = self._port, credentials = credentials, blocked_connection_timeout = None,
@@ -117,6 +123,9 @@ class RabbitMQComm(Communicator):
         Declares to exchanges: for Nodes and Coordinator, each instance of communicator
         will know, which of the exchanges should be used for publishing
         '''
+        # pika is loaded by connect, the exception is kept for the publish path
+        from pika.exceptions import ConnectionClosed
+        self._connectionClosedError     = ConnectionClosed
         self._publishConnection         = self.connect()
         self._publishChannel            = self._publishConnection.channel()
 
@@ -149,13 +158,15 @@ class RabbitMQComm(Communicator):
         Publishes a message to the exchange (Nodes for workers and Coordinator for coordinator) with
         a needed topic, e.g., "violation" or "newModel.0.1"
         '''
-        try:
-            self._publishChannel.basic_publish(exchange=exchange, routing_key=topic, body=message)
-        except pika.exceptions.ConnectionClosed:
-            # should actually never happen if everything is working smoothly
-            print("Pika connection to RabbitMQ server was closed!")
-            self._setupPublishConnection()
-            self._publishChannel.basic_publish(exchange=exchange, routing_key=topic, body=message)
+        with self._phaseTimer.measure("publish"):
+            try:
+                self._publishChannel.basic_publish(exchange=exchange, routing_key=topic, body=message)
+            except self._connectionClosedError:
+                # should actually never happen if everything is working smoothly
+                print("Pika connection to RabbitMQ server was closed!")
+                self._setupPublishConnection()
+                self._publishChannel.basic_publish(exchange=exchange, routing_key=topic, body=message)
+        self._countPublished(topic, message)
 
     def sendViolation(self, identifier : str, param : Parameters):
         '''
@@ -189,7 +200,8 @@ class RabbitMQComm(Communicator):
             self.error(error_text)
             raise ValueError(error_text)
 
-        message = pickle.dumps({'id' : identifier, 'param' : param})
+        with self._phaseTimer.measure("serialization"):
+            message = pickle.dumps({'id' : identifier, 'param' : param})
         message_size = sys.getsizeof(message)
         topic = 'violation'
         self._publish(self._exchangeCoordinator, topic, message)
@@ -223,7 +235,8 @@ class RabbitMQComm(Communicator):
             raise ValueError(error_text)
 
         topic = 'registration'
-        message = pickle.dumps({'id' : identifier, 'param' : param})
+        with self._phaseTimer.measure("serialization"):
+            message = pickle.dumps({'id' : identifier, 'param' : param})
         message_size = sys.getsizeof(message)
         self._publish(self._exchangeCoordinator, topic, message)
         self.learningLogger.logRegistrationMessage(self._exchangeCoordinator, topic, identifier, message_size, 'send')
@@ -244,23 +257,26 @@ class RabbitMQComm(Communicator):
             raise ValueError(error_text)
 
         topic = 'deregistration'
-        message = pickle.dumps({'id' : identifier, 'param' : param})
+        with self._phaseTimer.measure("serialization"):
+            message = pickle.dumps({'id' : identifier, 'param' : param})
         message_size = sys.getsizeof(message)
         self._publish(self._exchangeCoordinator, topic, message)
         self.learningLogger.logRegistrationMessage(self._exchangeCoordinator, topic, identifier, message_size, 'send')
 
-    def sendParameters(self, identifier : str, param : Parameters):
+    def sendParameters(self, identifier : str, param : Parameters, roundId = None):
         '''
         Publish message with parametres
         Called from a worker that was requested for its parameters
         while balancing process and published to coordinator
         exchange with topic balancing. Message is pickled dictionary of 
-        the form {'id': identifier, 'param': param}
+        the form {'id': identifier, 'param': param} and, if roundId is given,
+        'round': roundId
 
         Parameters
         ----------
         identifier of a worker sending its parameters
         param - parameters of the worker
+        roundId - synchronization round of the balancing request that is answered
 
         Returns
         -------
@@ -283,20 +299,26 @@ class RabbitMQComm(Communicator):
             raise ValueError(error_text)
 
         topic = 'balancing'
-        message = pickle.dumps({'id' : identifier, 'param' : param})
+        with self._phaseTimer.measure("serialization"):
+            content = {'id' : identifier, 'param' : param}
+            if not roundId is None:
+                content['round'] = roundId
+            message = pickle.dumps(content)
         message_size = sys.getsizeof(message)
         self._publish(self._exchangeCoordinator, topic, message)
         self.learningLogger.logBalancingMessage(self._exchangeCoordinator, topic, identifier, message_size, 'send')
 
-    def sendBalancingRequest(self, identifier : str):
+    def sendBalancingRequest(self, identifier : str, roundId = None):
         '''
         Publish message to query the worker for its current parameters
         Called from coordinator while balancing process and published to nodes
-        exchange with topic identifier of the worker and 'request'. Message is empty.
+        exchange with topic identifier of the worker and 'request'. Message is
+        the identifier of the synchronization round as string or empty.
 
         Parameters
         ----------
         identifier of a worker requested for its parameters
+        roundId - identifier of the synchronization round of the coordinator
 
         Returns
         -------
@@ -313,9 +335,10 @@ class RabbitMQComm(Communicator):
             raise ValueError(error_text)
 
         topic = 'request.' + identifier
-        # since it is just a request nothing should be sent in a message
-        message_size = 0
-        self._publish(self._exchangeNodes, topic, '')
+        # since it is just a request only the round is sent
+        message = '' if roundId is None else str(roundId)
+        message_size = len(message)
+        self._publish(self._exchangeNodes, topic, message)
         self.learningLogger.logBalancingRequestMessage(self._exchangeNodes, topic, identifier, message_size, 'send')
 
     def sendExitRequest(self, identifier : str):
@@ -390,7 +413,8 @@ class RabbitMQComm(Communicator):
             raise ValueError(error_text)
 
         topic = 'newModel.' + '.'.join(identifiers)
-        message = pickle.dumps({'param' : param, 'flags' : flags})
+        with self._phaseTimer.measure("serialization"):
+            message = pickle.dumps({'param' : param, 'flags' : flags})
         message_size = sys.getsizeof(message)
         self._publish(self._exchangeNodes, topic, message)
         self.learningLogger.logSendModelMessage(self._exchangeNodes, topic, message_size, 'send')
@@ -487,7 +511,7 @@ class RabbitMQComm(Communicator):
         channel = self._setupConsumeConnection()
         try:
             channel.start_consuming()
-        except pika.exceptions.ConnectionClosed:
+        except self._connectionClosedError:
             # should actually never happen if everything is working smoothly
             print("Pika connection to RabbitMQ server was closed!")
         except KeyboardInterrupt:
@@ -1,7 +1,9 @@
 from DLplatform.baseClass import baseClass
 from DLplatform.parameters import Parameters
 from DLplatform.communicating import Communicator
-from DLplatform.synchronizing import Synchronizer
+from DLplatform.synchronizing import Synchronizer, DynamicSync
+from DLplatform.metrics import MetricsRegistry
+from DLplatform.profiling import Profiler
 
 from pickle import loads
 from multiprocessing import Queue
@@ -86,6 +88,15 @@ class Coordinator(baseClass):
         # if this parameter is larger than 0, then when less than this amount of workers is active,
         # process stops - all the other still active workers are asked to exit
         self._minStopNodes              = minStopNodes
+        # synchronization rounds: a round starts when a violation is processed while no
+        # balancing is in progress and ends when the aggregated model is sent
+        self._roundId                   = 0
+        self._roundOpen                 = False
+        self._roundStart                = None
+        # live metrics, only collected if a registry is set
+        self._metrics                   = None
+        # profiling of the processes of the coordinator, only if a profiler is set
+        self._profiler                  = None
 
         # initializing queue for communication with communicator process
         self._communicatorConnection    = Queue()
@@ -93,6 +104,35 @@ class Coordinator(baseClass):
     def setLearningLogger(self, logger):
         self._learningLogger = logger
 
+    def setMetricsRegistry(self, registry : MetricsRegistry):
+        '''
+        Sets the MetricsRegistry of the coordinator process. Queue depths and nodes are
+        read when the metrics are exposed, received messages and synchronization rounds
+        are counted. The registry is handed to the communicator when the coordinator is run.
+        Exposing the metrics, e.g., by registry.startHttpServer, has to be started in the
+        process running the coordinator.
+        '''
+        self._metrics = registry
+        registry.gauge("dlplatform_violations_queue_depth", "Violations and balancing replies waiting for processing",
+                       function = lambda: len(self._violations))
+        registry.gauge("dlplatform_communicator_queue_depth", "Messages from the communicator waiting for the coordinator",
+                       function = lambda: self._communicatorConnection.qsize())
+        registry.gauge("dlplatform_active_nodes", "Registered workers", function = lambda: len(self._activeNodes))
+        registry.gauge("dlplatform_balancing_set_size", "Workers in the current balancing", function = lambda: len(self._balancingSet))
+        registry.counter("dlplatform_messages_received_total", "Messages received from the workers, by kind")
+        registry.counter("dlplatform_message_bytes_received_total", "Bytes of the messages received from the workers, by kind")
+        registry.counter("dlplatform_sync_rounds_total", "Finished synchronization rounds, by kind of synchronization")
+        registry.histogram("dlplatform_round_seconds", "Duration of the synchronization rounds")
+        registry.histogram("dlplatform_aggregation_seconds", "Duration of the aggregations")
+
+    def setProfiler(self, profiler : Profiler):
+        '''
+        Sets the Profiler of the coordinator. The coordinator process is run under the
+        profiler and the profiler is handed to the communicator. Without an output
+        directory of its own the profiles are written to the directory of the learning logger.
+        '''
+        self._profiler = profiler
+
     def setCommunicator(self, comm : Communicator):
         '''
 
@@ -210,10 +250,14 @@ class Coordinator(baseClass):
     def onMessageReceived(self, routing_key, exchange, body):
         message = loads(body)
         message_size = sys.getsizeof(body)
+        if not self._metrics is None:
+            labels = {"kind": routing_key}
+            self._metrics.counter("dlplatform_messages_received_total").inc(labels = labels)
+            self._metrics.counter("dlplatform_message_bytes_received_total").inc(len(body), labels = labels)
         if routing_key == 'violation':
             self.info("Coordinator received a violation")
             self._communicator.learningLogger.logViolationMessage(exchange, routing_key, message['id'], message_size, 'receive')
-            self._violations.append(body)
+            self._violations.append((routing_key, body, time.time()))
         if routing_key == 'balancing':
             self.info("Coordinator received a balancing model")
             self._communicator.learningLogger.logBalancingMessage(exchange, routing_key, message['id'], message_size, 'receive')
@@ -222,7 +266,7 @@ class Coordinator(baseClass):
             # for a new model to come and will not react to requests anymore
             # so it cannot be that the model answers several times and thus initiates new 
             # balancing when not needed
-            self._violations.append(body)
+            self._violations.append((routing_key, body, time.time()))
         if routing_key == 'registration':
             self.info("Coordinator received a registration")
             self._communicator.learningLogger.logRegistrationMessage(exchange, routing_key, message['id'], message_size, 'receive')
@@ -236,9 +280,13 @@ class Coordinator(baseClass):
             # we send around the initial parameters only when all the expected nodes are there
             # in case when parameter is not set, it is equal to 0 - so every new node will satisfy the condition
             if len(self._waitingNodes) >= self._minStartNodes:
+                flags = {"setReference":True}
+                if isinstance(self._synchronizer, DynamicSync):
+                    # nodes joining later get the threshold adapted so far, so all nodes use the same one
+                    flags["delta"] = self._synchronizer.getDelta()
                 for worker_id in self._waitingNodes:
                     time.sleep(0.1)#without the sleep rabbitMQ gets congested and messages do not get delivered to nodes (occurred with 21 nodes and BatchLearners)
-                    self._communicator.sendAggregatedModel(identifiers = [worker_id], param = self._waitingNodes[worker_id], flags = {"setReference":True})
+                    self._communicator.sendAggregatedModel(identifiers = [worker_id], param = self._waitingNodes[worker_id], flags = flags)
                 self._waitingNodes.clear()
                 # we want to allow to wait for 10 nodes, but then others to join dynamically
                 self._minStartNodes = 1
@@ -270,6 +318,12 @@ class Coordinator(baseClass):
                 sys.exit()
 
     def run(self):
+        if self._profiler is None:
+            self._run()
+        else:
+            self._profiler.profile(self._run, self.getName())
+
+    def _run(self):
         if self._communicator is None:
             self.error("Communicator is not set!")
             raise AttributeError("Communicator is not set!")
@@ -281,6 +335,12 @@ class Coordinator(baseClass):
         self._communicator.initiate(exchange = self._communicator._exchangeCoordinator,
                                     topics = ['registration', 'deregistration', 'violation', 'balancing'])
         self._communicator.daemon = True
+        if not self._metrics is None:
+            self._communicator.setMetricsRegistry(self._metrics)
+        if not self._profiler is None:
+            if self._profiler.getOutputDir() is None and not self._learningLogger is None:
+                self._profiler.setOutputDir(self._learningLogger.getLogPath())
+            self._communicator.setProfiler(self._profiler)
 
         self._setConnectionsToComponents()
 
@@ -300,16 +360,26 @@ class Coordinator(baseClass):
             # - we got all the balancing models
             if len(self._violations) > 0 or (len(self._balancingSet.keys()) != 0 and not None in set(self._balancingSet.values())):
                 if len(self._violations) > 0:
-                    message = loads(self._violations[0])
+                    routing_key, body, receivedAt = self._violations[0]
+                    message = loads(body)
                     nodeId = message['id']
                     param = message['param']
+                    if not self._roundOpen:
+                        self._roundId += 1
+                        self._roundOpen = True
+                        self._roundStart = receivedAt
+                    # a reply belongs to the round of the request it answers, which may be an earlier one
+                    self._learningLogger.logRoundEvent(message.get('round', self._roundId), 'violation' if routing_key == 'violation' else 'reply',
+                                                       nodeId, receivedAt)
                     self._nodesInViolation.append(nodeId)
                     self._balancingSet[nodeId] = param
                     # @NOTE always deleting the current violation leads to potential extension of a dynamic small balancing to 
                     # a full_sync - might be a case that blocking everything, balancing one violation and then considering the next one
                     # is a better idea from the point of view of effectiveness
                     del self._violations[0]
+                evaluationStart = time.time()
                 nodes, params, flags = self._synchronizer.evaluate(self._balancingSet, self._activeNodes)
+                evaluationEnd = time.time()
                 # fill balancing set with None for new nodes in balancing set
                 for newNode in nodes:
                     if not newNode in self._balancingSet.keys() and newNode in self._activeNodes:
@@ -320,11 +390,23 @@ class Coordinator(baseClass):
                     for newNode in nodes:
                         # balancingRequest can be sent only when it is dynamic averaging
                         if self._balancingSet[newNode] is None and newNode in self._activeNodes:
-                            self._communicator.sendBalancingRequest(newNode)
+                            self._communicator.sendBalancingRequest(newNode, self._roundId)
+                            self._learningLogger.logRoundEvent(self._roundId, 'request', newNode)
                 elif not params is None:
+                    self._learningLogger.logRoundEvent(self._roundId, 'aggregationStart', timestamp = evaluationStart)
+                    self._learningLogger.logRoundEvent(self._roundId, 'aggregationEnd', timestamp = evaluationEnd)
                     # we do not want to update the nodes that are already inactive
                     nodesToSendAvg = list(set(nodes) & set(self._activeNodes))
+                    # workers log the round of the model they receive
+                    flags = dict(flags, round = self._roundId)
+                    publishStart = time.time()
                     self._communicator.sendAggregatedModel(nodesToSendAvg, params, flags)
+                    self._learningLogger.logRoundEvent(self._roundId, 'publish', ','.join(map(str, nodesToSendAvg)), publishStart)
+                    self._roundOpen = False
+                    if not self._metrics is None:
+                        self._metrics.counter("dlplatform_sync_rounds_total").inc(labels = {"sync": "full" if flags.get("setReference", False) else "partial"})
+                        self._metrics.histogram("dlplatform_round_seconds").observe(publishStart - self._roundStart)
+                        self._metrics.histogram("dlplatform_aggregation_seconds").observe(evaluationEnd - evaluationStart)
                     self._learningLogger.logBalancing(flags, self._nodesInViolation, list(self._balancingSet.keys()))
                     self._learningLogger.logAveragedModel(nodes, params, flags)
                     self._balancingSet.clear()
@@ -2,3 +2,10 @@ from DLplatform.dataprovisioning.datasource import DataSource
 from DLplatform.dataprovisioning.datascheduler import DataScheduler
 from DLplatform.dataprovisioning.intervalDataScheduler import IntervalDataScheduler
 
+from DLplatform.dataprovisioning.memmapDataSource import MemmapDataSource
+from DLplatform.dataprovisioning.prefetchingDataSource import PrefetchingDataSource
+from DLplatform.dataprovisioning.cachedDataSource import CachedDataSource
+from DLplatform.dataprovisioning.partitioning import DataPartitioner
+from DLplatform.dataprovisioning.rateControlledDataScheduler import RateControlledDataScheduler
+from DLplatform.dataprovisioning.streamRecorder import StreamRecorder
+from DLplatform.dataprovisioning.replayDataScheduler import ReplayDataScheduler
@@ -3,8 +3,8 @@ from DLplatform.dataprovisioning import DataScheduler
 import time
 
 class BatchDataScheduler(DataScheduler):
-    def __init__(self, name = "BatchDataScheduler"):
-        DataScheduler.__init__(self, name = name)
+    def __init__(self, name = "BatchDataScheduler", batchSize = None):
+        DataScheduler.__init__(self, name = name, batchSize = batchSize)
 
     def generateSamples(self):
         '''
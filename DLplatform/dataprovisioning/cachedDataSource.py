@@ -0,0 +1,219 @@
+from DLplatform.dataprovisioning.memmapDataSource import MemmapDataSource
+
+import hashlib
+import numpy as np
+import os
+import socket
+import tempfile
+import time
+
+class CachedDataSource(MemmapDataSource):
+    '''
+    Data source with a dataset cache shared by all workers on a host.
+    Sub-classes implement loadArrays, which reads and decodes the whole dataset
+    into numpy arrays, and getCacheKey, which identifies the dataset (e.g., its
+    path and preprocessing options). The first worker calling prepare() for a
+    dataset decodes it and writes the arrays into the cache directory, all the
+    other workers wait for it and then only memory-map the cached arrays read-only,
+    so decoding happens once per host and the arrays are shared via the page cache.
+    The cache stays valid for later runs with the same cache key.
+    '''
+
+    def __init__(self, cacheDir = None, order = "sequential", nodeId = 0, numNodes = 1, seed = 0,
+                 timeout = 3600, indices = None, name = "CachedDataSource"):
+        '''
+        Initialize BaseClass parent with name CachedDataSource
+
+        Parameters
+        ----------
+        cacheDir - directory for the cached arrays, by default a directory in the temporary directory
+        order, nodeId, numNodes, seed, indices - see MemmapDataSource
+        timeout - seconds to wait for another worker building the cache
+
+        Returns
+        -------
+        None
+        '''
+        MemmapDataSource.__init__(self, xPath = None, yPath = None, order = order, nodeId = nodeId,
+                                  numNodes = numNodes, seed = seed, indices = indices, name = name)
+
+        if cacheDir is None:
+            cacheDir = os.path.join(tempfile.gettempdir(), "dlplatform_cache")
+        self._cacheDir      = cacheDir
+        self._timeout       = timeout
+
+    def getCacheKey(self) -> str:
+        '''
+        Identity of the dataset, workers with the same key share the cache.
+        Should be implemented in sub-classes.
+
+        Returns
+        -------
+        str
+        '''
+        raise NotImplementedError
+
+    def loadArrays(self) -> tuple:
+        '''
+        Reads the whole dataset. Called only by the worker building the cache.
+        Should be implemented in sub-classes.
+
+        Returns
+        -------
+        tuple - array of examples and array of labels
+        '''
+        raise NotImplementedError
+
+    def getCachePath(self) -> str:
+        '''
+        Returns
+        -------
+        str - directory of the cached arrays of this dataset
+        '''
+        key = hashlib.sha1(self.getCacheKey().encode("utf-8")).hexdigest()
+        return os.path.join(self._cacheDir, key)
+
+    def prepare(self):
+        '''
+        Builds the cache if no other worker did it and opens the cached arrays.
+        The worker building the cache holds a lock file containing its host and pid.
+        A lock of a process on this host that is not running anymore, e.g., a crashed
+        builder, is broken, see _breakStaleLock, and the cache is built again.
+
+        Exception
+        ---------
+        TimeoutError
+            in case the cache was not built by another worker within timeout seconds
+        '''
+        path = self.getCachePath()
+        doneFile = os.path.join(path, "done")
+        lockFile = os.path.join(path, "lock")
+        start = time.time()
+        waiting = False
+        while not os.path.exists(doneFile):
+            os.makedirs(path, exist_ok = True)
+            lock = self._acquireLock(lockFile)
+            if not lock is None:
+                try:
+                    # the cache may have been finished after the check above
+                    if not os.path.exists(doneFile):
+                        self._buildCache(path, doneFile)
+                finally:
+                    self._releaseLock(lock, lockFile)
+            elif self._isStale(self._lockOwner(lockFile)):
+                self._breakStaleLock(lockFile)
+            else:
+                if not waiting:
+                    self.info("Waiting for the dataset cache " + doneFile)
+                    waiting = True
+                if time.time() - start > self._timeout:
+                    error_text = "The dataset cache " + doneFile + " was not built within " + str(self._timeout) + " seconds. " + \
+                        "If the building worker failed, remove the lock file in this directory."
+                    self.error(error_text)
+                    raise TimeoutError(error_text)
+                time.sleep(0.1)
+
+        self._xPath = os.path.join(path, "X.npy")
+        self._yPath = os.path.join(path, "y.npy")
+        MemmapDataSource.prepare(self)
+
+    def _acquireLock(self, lockFile : str):
+        '''
+        Creates the lock file and writes host and pid of this process into it
+
+        Returns
+        -------
+        file descriptor of the lock file or None if another process holds the lock
+        '''
+        try:
+            lock = os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        os.write(lock, self._lockOwnerId().encode("utf-8"))
+        return lock
+
+    def _lockOwnerId(self) -> str:
+        return socket.gethostname() + " " + str(os.getpid())
+
+    def _lockOwner(self, lockFile : str) -> list:
+        '''
+        Returns
+        -------
+        list - host and pid written into the lock file, None if there is no lock file
+        '''
+        try:
+            with open(lockFile) as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return None
+
+    def _releaseLock(self, lock : int, lockFile : str):
+        '''
+        Closes the lock and removes the lock file, if it is still the one of this process
+        '''
+        os.close(lock)
+        if self._lockOwner(lockFile) == self._lockOwnerId().split():
+            try:
+                os.remove(lockFile)
+            except FileNotFoundError:
+                pass
+
+    def _breakStaleLock(self, lockFile : str):
+        '''
+        Removes a stale lock. Several waiting workers may find the same stale lock, so it is
+        renamed to a name of this process first, which only one of them succeeds in, and the
+        renamed lock is checked again: if another worker replaced the stale lock with its own
+        in the meantime, the lock is moved back unless a new one was created already.
+        '''
+        brokenFile = lockFile + "." + self._lockOwnerId().replace(" ", "_") + ".stale"
+        try:
+            os.rename(lockFile, brokenFile)
+        except FileNotFoundError:
+            return
+        if self._isStale(self._lockOwner(brokenFile)):
+            self.info("Removed the lock " + lockFile + " of a builder that is not running anymore")
+        else:
+            try:
+                os.link(brokenFile, lockFile)
+            except FileExistsError:
+                # the owner of the moved lock builds as well, the files of builders do not collide
+                pass
+        os.remove(brokenFile)
+
+    def _isStale(self, owner : list) -> bool:
+        '''
+        Parameters
+        ----------
+        owner - host and pid written into a lock file, see _lockOwner
+
+        Returns
+        -------
+        bool - True if the lock is held by a process on this host that is not running.
+            Locks of other hosts, e.g., on a shared file system, are never considered stale.
+        '''
+        # the builder may not have written its pid yet
+        if owner is None or len(owner) != 2 or owner[0] != socket.gethostname():
+            return False
+        try:
+            os.kill(int(owner[1]), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            return False
+        return False
+
+    def _buildCache(self, path : str, doneFile : str):
+        '''
+        Writes the arrays of the dataset into the cache. Files are written under temporary
+        names of this process and renamed, the done marker is written last, so a cache
+        is never read partially, also if a removed stale lock lets two workers build it.
+        '''
+        self.info("Building the dataset cache in " + path)
+        X, y = self.loadArrays()
+        for array, fileName in [(X, "X.npy"), (y, "y.npy")]:
+            tmpFile = os.path.join(path, fileName + "." + str(os.getpid()) + ".tmp")
+            with open(tmpFile, "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmpFile, os.path.join(path, fileName))
+        with open(doneFile, "w") as f:
+            f.write(self.getCacheKey())
@@ -1,4 +1,5 @@
 from DLplatform.dataprovisioning.datasource import DataSource
+from DLplatform.dataprovisioning.partitioning import DataPartitioner
 import inspect
 import types
 
@@ -8,6 +9,33 @@ class DataSourceFactory():
     
     def getDataSource(self, nodeId) -> DataSource:
         pass
+
+    def setPartitioner(self, partitioner : DataPartitioner):
+        '''
+        Sets the partitioner defining which examples belong to which node,
+        sub-classes get the indices of a node via getNodeIndices.
+
+        Exception
+        ---------
+        ValueError
+            in case partitioner is not of type DataPartitioner
+        '''
+        if not isinstance(partitioner, DataPartitioner):
+            raise ValueError("The attribute partitioner is of type " + str(type(partitioner)) + " and not of type" + str(DataPartitioner))
+        self._partitioner = partitioner
+
+    def getNodeIndices(self, nodeId : int):
+        '''
+        Indices of the examples of a node according to the partitioner.
+
+        Exception
+        ---------
+        AttributeError
+            in case no partitioner is set
+        '''
+        if getattr(self, "_partitioner", None) is None:
+            raise AttributeError("Partitioner not set!")
+        return self._partitioner.getIndices(nodeId)
     
     def getStrReprOfArg(self, arg) -> str:
         if isinstance(arg, str):
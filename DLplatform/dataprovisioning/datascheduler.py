@@ -4,6 +4,8 @@ from DLplatform.dataprovisioning import DataSource
 from abc import ABCMeta
 from multiprocessing import Process
 from pickle import dumps
+import os
+import signal
 
 class DataScheduler(baseClass, Process):
     '''
@@ -17,10 +19,17 @@ class DataScheduler(baseClass, Process):
 
     __metaclass__ = ABCMeta
 
-    def __init__(self, name = "DataScheduler"):
+    def __init__(self, name = "DataScheduler", batchSize = None):
         '''
         Initialize a parent class with name DataScheduler.
-        Initialize a Process for method self.generateSamples.
+        Initialize a Process for method self.generateSamples, see _run.
+
+        Parameters
+        ----------
+        batchSize - if None, single examples are sent to the worker. Otherwise
+            batchSize examples are read at once and sent as a tuple of an array of
+            examples and an array of labels, which saves the per example overhead
+            of reading, pickling and passing them through the pipe.
 
         Returns
         -------
@@ -29,18 +38,28 @@ class DataScheduler(baseClass, Process):
         '''
 
         baseClass.__init__(self, name = name)
-        Process.__init__(self, target = self.generateSamples)
+        Process.__init__(self, target = self._run)
 
         self._dataSource            = None
+        self._batchSize             = batchSize
+        self._learningLogger        = None
+        self._workerConnection      = None
+        self._bufferSlots           = None
+        self._blockOnFullBuffer     = True
+        self._droppedUpdates        = None
+        self._recorder              = None
+        # profiling of the data scheduler process, only if a profiler is set
+        self._profiler              = None
 
     def getData(self) -> tuple:
         '''
         Returns an example from the DataSource.
         Example is considered to be a tuple consisting of example and its label.
+        If batchSize is set, a batch of examples is returned instead.
 
         Returns
         -------
-        a training example together with label
+        a training example together with label or an array of examples together with an array of labels
 
         Exception
         --------
@@ -53,7 +72,31 @@ class DataScheduler(baseClass, Process):
             self.error("Data source not set!")
             raise AttributeError("Data source not set!")
             
-        return self._dataSource.getNext()
+        if self._batchSize is None:
+            return self._dataSource.getNext()
+        return self._dataSource.getNextBatch(self._batchSize)
+
+    def setLearningLogger(self, learningLogger):
+        '''
+        Setter for the logger of data provision statistics, optional
+
+        Parameters
+        ----------
+        learningLogger : LearningLogger
+        '''
+
+        self._learningLogger = learningLogger
+
+    def getBatchSize(self) -> int:
+        '''
+        Getter for the amount of examples sent at once
+
+        Returns
+        -------
+        int or None if single examples are sent
+        '''
+
+        return self._batchSize
 
     def generateSamples(self):
         '''
@@ -65,6 +108,37 @@ class DataScheduler(baseClass, Process):
 
         self._dataSource.prepare()
 
+    def _run(self):
+        '''
+        Target of the process: runs generateSamples and closes data source and recorder
+        when it ends or when the process is terminated, which is how workers stop their
+        data schedulers, so that, e.g., the last data updates of a recording are written
+        '''
+        previousHandler = signal.getsignal(signal.SIGTERM)
+
+        def onTerminate(signum, frame):
+            self._close()
+            if callable(previousHandler):
+                # e.g., the handler of a profiler writing its profile
+                previousHandler(signum, frame)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+        signal.signal(signal.SIGTERM, onTerminate)
+        try:
+            self.generateSamples()
+        finally:
+            self._close()
+
+    def _close(self):
+        '''
+        Closes data source and recorder, if they are set
+        '''
+        if not self._dataSource is None:
+            self._dataSource.close()
+        if not self._recorder is None:
+            self._recorder.close()
+
     def setConnection(self, workerConnection):
         '''
         Setter for the connection to worker in order
@@ -79,6 +153,47 @@ class DataScheduler(baseClass, Process):
 
         self._workerConnection = workerConnection
 
+    def setProfiler(self, profiler):
+        '''
+        Setter for the Profiler the process of the data scheduler is run under, optional
+
+        Parameters
+        ----------
+        profiler : Profiler
+        '''
+
+        self._profiler = profiler
+
+    def setRecorder(self, recorder):
+        '''
+        Setter for a recorder of the data updates sent to the worker, optional
+
+        Parameters
+        ----------
+        recorder : StreamRecorder
+        '''
+
+        self._recorder = recorder
+
+    def setBufferSlots(self, bufferSlots, blockOnFullBuffer : bool, droppedUpdates):
+        '''
+        Setter for the bounded handoff to the worker. Before sending data a slot
+        is acquired, the worker releases it when the data is consumed.
+
+        Parameters
+        ----------
+        bufferSlots : BoundedSemaphore
+            free places in the buffer of the worker
+        blockOnFullBuffer : bool
+            if True sending waits for a free slot, otherwise the data is dropped
+        droppedUpdates : Value
+            shared counter of dropped data updates
+        '''
+
+        self._bufferSlots = bufferSlots
+        self._blockOnFullBuffer = blockOnFullBuffer
+        self._droppedUpdates = droppedUpdates
+
     def sendDataUpdate(self, data):
         '''
 
@@ -88,7 +203,7 @@ class DataScheduler(baseClass, Process):
             the data to be send to the worker. It is most likely a tuple of numpy arrays
         Returns
         -------
-        None
+        bool - False if the data was dropped because the buffer of the worker was full
 
         Exception
         ---------
@@ -98,9 +213,18 @@ class DataScheduler(baseClass, Process):
             self.error("No workerConnection is set")
             raise AttributeError("No workerConnection is set")
 
+        if not self._bufferSlots is None and not self._bufferSlots.acquire(block = self._blockOnFullBuffer):
+            with self._droppedUpdates.get_lock():
+                self._droppedUpdates.value += 1
+            return False
+
+        if not self._recorder is None:
+            self._recorder.record(data, self._batchSize)
+
         # preparing the msg send via pipe (should be smaller than 30 MiB according to Pipe documentation)
         msg = dumps(data)
         self._workerConnection.send(msg)
+        return True
 
     def setDataSource(self, source : DataSource):
         '''
@@ -148,4 +272,8 @@ class DataScheduler(baseClass, Process):
         if (self._workerConnection == None):
             raise AttributeError("workerConnection wasn't set for the dataScheduler!")
 
+        if not self._profiler is None:
+            # the name of the process replaces the one of the baseClass, see __init__
+            self._target = self._profiler.wrap(self._target, type(self).__name__)
+
         super().start()
@@ -1,6 +1,7 @@
 from DLplatform.baseClass import baseClass
 
 from abc import ABCMeta
+import numpy as np
 
 class DataSource(baseClass):
 
@@ -26,6 +27,13 @@ class DataSource(baseClass):
         '''
         raise NotImplementedError
 
+    def close(self):
+        '''
+        should release what prepare acquired, e.g., threads reading ahead
+        called by the DataScheduler when its process is terminated
+        '''
+        pass
+
     def getNext(self):
         '''
 
@@ -39,3 +47,22 @@ class DataSource(baseClass):
         tuple
         '''
         raise NotImplementedError
+
+
+    def getNextBatch(self, n : int) -> tuple:
+        '''
+
+        Returns the next n examples at once. This default implementation stacks
+        the results of getNext, sub-classes that can read many examples at once
+        should override it.
+
+        Parameters
+        ----------
+        n - amount of examples
+
+        Returns
+        -------
+        tuple - array of n examples and array of their labels
+        '''
+        examples = [self.getNext() for _ in range(n)]
+        return np.stack([e[0] for e in examples]), np.asarray([e[1] for e in examples])
@@ -3,8 +3,8 @@ from DLplatform.dataprovisioning import DataScheduler
 import time
 
 class IntervalDataScheduler(DataScheduler):
-    def __init__(self, interval = 0.004, name = "IntervalDataScheduler"):
-        DataScheduler.__init__(self, name = name)
+    def __init__(self, interval = 0.004, name = "IntervalDataScheduler", batchSize = None):
+        DataScheduler.__init__(self, name = name, batchSize = batchSize)
 
         self._interval = interval
 
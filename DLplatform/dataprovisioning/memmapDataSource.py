@@ -0,0 +1,172 @@
+from DLplatform.dataprovisioning.datasource import DataSource
+
+import numpy as np
+
+class MemmapDataSource(DataSource):
+    '''
+    Data source reading examples from numpy arrays stored on disk. The files are
+    memory-mapped in prepare(), so worker processes on one host share the page cache
+    instead of holding a copy of the dataset each. Both .npy files and raw binary files
+    (given dtype and shape) are supported.
+
+    Examples are provided either in the order of the file ("sequential") or in a new
+    random permutation for each pass over the data ("shuffle"). With numNodes > 1 each
+    node only iterates over its own contiguous shard of the examples. Alternatively the
+    indices of the examples of a node can be given explicitly, e.g., by a DataPartitioner.
+    At the end of the data the iteration starts from the beginning again.
+    '''
+
+    def __init__(self, xPath : str, yPath : str, order = "sequential", nodeId = 0, numNodes = 1, seed = 0,
+                 xDtype = None, xShape = None, yDtype = None, yShape = None, indices = None, name = "MemmapDataSource"):
+        '''
+        Initialize BaseClass parent with name MemmapDataSource
+
+        Parameters
+        ----------
+        xPath - path of the file with the examples, the first dimension indexes the examples
+        yPath - path of the file with the labels
+        order - "sequential" or "shuffle"
+        nodeId - index of the shard used by this data source
+        numNodes - amount of shards the examples are split into
+        seed - seed of the random permutations, is combined with nodeId
+        xDtype, xShape - dtype and shape of the examples for raw binary files, None for .npy files
+        yDtype, yShape - dtype and shape of the labels for raw binary files, None for .npy files
+        indices - indices of the examples to iterate over instead of the shard given by nodeId and numNodes
+
+        Returns
+        -------
+        None
+
+        Exception
+        ---------
+        ValueError
+            in case order is unknown or nodeId is not in [0, numNodes)
+        '''
+        DataSource.__init__(self, name = name)
+
+        if not order in ["sequential", "shuffle"]:
+            error_text = "The attribute order should be 'sequential' or 'shuffle', it is " + str(order)
+            self.error(error_text)
+            raise ValueError(error_text)
+        if not 0 <= nodeId < numNodes:
+            error_text = "The attribute nodeId should be in [0, " + str(numNodes) + "), it is " + str(nodeId)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._xPath         = xPath
+        self._yPath         = yPath
+        self._order         = order
+        self._nodeId        = nodeId
+        self._numNodes      = numNodes
+        self._seed          = seed
+        self._xDtype        = xDtype
+        self._xShape        = xShape
+        self._yDtype        = yDtype
+        self._yShape        = yShape
+        self._givenIndices  = indices
+        self._X             = None
+        self._y             = None
+        self._indices       = None
+        self._position      = 0
+        self._randomState   = None
+
+    def _openArray(self, path : str, dtype, shape) -> np.ndarray:
+        '''
+        Memory-maps a .npy file or, if dtype is given, a raw binary file read-only
+        '''
+        if dtype is None:
+            return np.load(path, mmap_mode = 'r')
+        return np.memmap(path, dtype = dtype, mode = 'r', shape = shape)
+
+    def _shardIndices(self, amount : int) -> np.ndarray:
+        '''
+        Indices of the examples belonging to the shard of this node
+        '''
+        start = (amount * self._nodeId) // self._numNodes
+        end = (amount * (self._nodeId + 1)) // self._numNodes
+        return np.arange(start, end)
+
+    def prepare(self):
+        '''
+        Opens the memory maps, has to be called in the process that reads the data
+
+        Exception
+        ---------
+        ValueError
+            in case examples and labels have a different length or the shard is empty
+        '''
+        self._X = self._openArray(self._xPath, self._xDtype, self._xShape)
+        self._y = self._openArray(self._yPath, self._yDtype, self._yShape)
+        if self._X.shape[0] != self._y.shape[0]:
+            error_text = "The amount of examples " + str(self._X.shape[0]) + " and labels " + str(self._y.shape[0]) + " differs"
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        if self._givenIndices is None:
+            self._indices = self._shardIndices(self._X.shape[0])
+        else:
+            # copied, since shuffling is done in place
+            self._indices = np.array(self._givenIndices)
+        if len(self._indices) == 0:
+            error_text = "The shard " + str(self._nodeId) + " of " + str(self._numNodes) + " is empty"
+            self.error(error_text)
+            raise ValueError(error_text)
+        self._randomState = np.random.RandomState([self._seed, self._nodeId])
+        self._position = 0
+        if self._order == "shuffle":
+            self._randomState.shuffle(self._indices)
+
+    def _nextIndices(self, n : int) -> np.ndarray:
+        '''
+        Takes the next n indices, starting a new pass over the shard when it is exhausted
+        '''
+        chunks = []
+        while n > 0:
+            if self._position == len(self._indices):
+                self._position = 0
+                if self._order == "shuffle":
+                    self._randomState.shuffle(self._indices)
+            take = min(n, len(self._indices) - self._position)
+            chunks.append(self._indices[self._position:self._position + take])
+            self._position += take
+            n -= take
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def getNext(self) -> tuple:
+        '''
+        Returns
+        -------
+        tuple - the next example and its label
+        '''
+        i = self._nextIndices(1)[0]
+        return np.array(self._X[i]), self._y[i]
+
+    def getNextBatch(self, n : int) -> tuple:
+        '''
+        Reads the next n examples at once. In sequential order a contiguous block is returned
+        as a view of the memory map without copying. In shuffled order the indices of the batch
+        are sorted before reading, so the order of the examples inside a batch follows the file.
+
+        Parameters
+        ----------
+        n - amount of examples
+
+        Returns
+        -------
+        tuple - array of n examples and array of their labels
+        '''
+        indices = self._nextIndices(n)
+        if self._order == "sequential" and self._givenIndices is None and indices[-1] - indices[0] == len(indices) - 1:
+            start, end = indices[0], indices[-1] + 1
+            return np.asarray(self._X[start:end]), np.asarray(self._y[start:end])
+        if self._order == "shuffle":
+            indices = np.sort(indices)
+        return np.asarray(self._X[indices]), np.asarray(self._y[indices])
+
+    def getSize(self) -> int:
+        '''
+        Returns
+        -------
+        int - amount of examples in the shard of this node, available after prepare()
+        '''
+        return len(self._indices)
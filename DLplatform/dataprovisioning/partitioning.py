@@ -0,0 +1,233 @@
+from DLplatform.baseClass import baseClass
+
+import numpy as np
+import os
+
+class DataPartitioner(baseClass):
+    '''
+    Splits the indices of a dataset among the nodes once for all of them.
+    Supported schemes are
+    - "iid": a random permutation cut into equally sized shards
+    - "dirichlet": label skewed shards, the examples of every class are distributed
+      among the nodes according to proportions drawn from a symmetric Dirichlet
+      distribution with concentration alpha (smaller alpha - more skew)
+    - "contiguous": consecutive blocks of the dataset
+    The partition is computed vectorized, i.e., only looping over classes, and is
+    deterministic for a given seed. Every node gets at least minShardSize examples,
+    with scheme "dirichlet" nodes with too few examples get random examples of the
+    largest shards. The indices of all nodes are stored in one array
+    ordered by node together with the offsets of the nodes, each node gets a view.
+    If an index file is given, the partition is written there, so data sources of the
+    workers can load it instead of computing it again.
+    '''
+
+    def __init__(self, numNodes : int, scheme = "iid", alpha = 0.5, seed = 0, indexFile = None, minShardSize = 1,
+                 name = "DataPartitioner"):
+        '''
+        Initialize BaseClass parent with name DataPartitioner
+
+        Parameters
+        ----------
+        numNodes - amount of nodes
+        scheme - "iid", "dirichlet" or "contiguous"
+        alpha - concentration of the Dirichlet distribution for scheme "dirichlet"
+        seed - seed of the partition
+        indexFile - path of the .npz file the partition is stored in, None for not storing it
+        minShardSize - minimal amount of examples of every node
+
+        Returns
+        -------
+        None
+
+        Exception
+        ---------
+        ValueError
+            in case numNodes or minShardSize are not positive or scheme is unknown
+        '''
+        baseClass.__init__(self, name = name)
+
+        if numNodes < 1:
+            error_text = "The attribute numNodes should be positive, it is " + str(numNodes)
+            self.error(error_text)
+            raise ValueError(error_text)
+        if minShardSize < 1:
+            error_text = "The attribute minShardSize should be positive, it is " + str(minShardSize)
+            self.error(error_text)
+            raise ValueError(error_text)
+        if not scheme in ["iid", "dirichlet", "contiguous"]:
+            error_text = "The attribute scheme should be 'iid', 'dirichlet' or 'contiguous', it is " + str(scheme)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._numNodes      = numNodes
+        self._scheme        = scheme
+        self._alpha         = alpha
+        self._seed          = seed
+        self._indexFile     = indexFile
+        self._minShardSize  = minShardSize
+        self._indices       = None
+        self._offsets       = None
+        self._storedSettings = None
+
+    def __getstate__(self):
+        '''
+        If the partition is stored in a file, it is not pickled but loaded again when needed
+        '''
+        d = baseClass.__getstate__(self)
+        if not d['_indexFile'] is None:
+            d['_indices'] = None
+            d['_offsets'] = None
+        return d
+
+    def partition(self, labels = None, amount = None):
+        '''
+        Computes the partition and stores it in the index file if one is given.
+        If the index file already holds a partition with the same settings,
+        it is loaded instead.
+
+        Parameters
+        ----------
+        labels - array of the labels of all examples, required for scheme "dirichlet"
+        amount - amount of examples, can be omitted if labels are given
+
+        Returns
+        -------
+        None
+
+        Exception
+        ---------
+        ValueError
+            in case neither labels nor amount are given, labels are missing for scheme "dirichlet"
+            or there are less than minShardSize examples for every node
+        '''
+        if amount is None:
+            if labels is None:
+                error_text = "Either labels or amount of examples should be given"
+                self.error(error_text)
+                raise ValueError(error_text)
+            amount = len(labels)
+        if self._scheme == "dirichlet" and labels is None:
+            error_text = "Labels are required for the dirichlet scheme"
+            self.error(error_text)
+            raise ValueError(error_text)
+        if amount < self._numNodes * self._minShardSize:
+            error_text = "There are " + str(amount) + " examples, less than minShardSize " + str(self._minShardSize) + \
+                " for each of the " + str(self._numNodes) + " nodes"
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        if not self._indexFile is None and os.path.exists(self._indexFile):
+            self._load()
+            if self._settings() == self._storedSettings and len(self._indices) == amount:
+                return
+            self.info("Index file " + self._indexFile + " holds a different partition, computing it again")
+
+        randomState = np.random.RandomState(self._seed)
+        if self._scheme == "dirichlet":
+            nodeOf = self._dirichletAssignment(np.asarray(labels), randomState)
+            # examples of a node in random order, nodes one after another
+            permutation = randomState.permutation(amount)
+            self._indices = permutation[np.argsort(nodeOf[permutation], kind = "mergesort")]
+            self._offsets = np.concatenate([[0], np.cumsum(np.bincount(nodeOf, minlength = self._numNodes))])
+        else:
+            if self._scheme == "iid":
+                self._indices = randomState.permutation(amount)
+            else:
+                self._indices = np.arange(amount)
+            self._offsets = (amount * np.arange(self._numNodes + 1)) // self._numNodes
+
+        if not self._indexFile is None:
+            self._save()
+
+    def _dirichletAssignment(self, labels : np.ndarray, randomState : np.random.RandomState) -> np.ndarray:
+        '''
+        Assigns every example to a node, the examples of every class are split
+        among the nodes in proportions drawn from the Dirichlet distribution.
+        Nodes with less than minShardSize examples then get random examples
+        of the largest shards.
+
+        Returns
+        -------
+        array with the node of every example
+        '''
+        nodeOf = np.empty(len(labels), dtype = np.int64)
+        # indices grouped by class, every group in the order of the dataset
+        byClass = np.argsort(labels, kind = "mergesort")
+        _, classSizes = np.unique(labels[byClass], return_counts = True)
+        start = 0
+        for classSize in classSizes:
+            members = byClass[start:start + classSize]
+            start += classSize
+            randomState.shuffle(members)
+            proportions = randomState.dirichlet(np.full(self._numNodes, self._alpha))
+            cuts = np.round(np.cumsum(proportions) * classSize).astype(np.int64)
+            cuts[-1] = classSize
+            nodeOf[members] = np.repeat(np.arange(self._numNodes), np.diff(np.concatenate([[0], cuts])))
+
+        # partition checks that there are enough examples, so the largest shard can always give some
+        counts = np.bincount(nodeOf, minlength = self._numNodes)
+        for node in np.flatnonzero(counts < self._minShardSize):
+            while counts[node] < self._minShardSize:
+                donor = np.argmax(counts)
+                amount = min(self._minShardSize - counts[node], counts[donor] - self._minShardSize)
+                moved = randomState.choice(np.flatnonzero(nodeOf == donor), amount, replace = False)
+                nodeOf[moved] = node
+                counts[donor] -= amount
+                counts[node] += amount
+        return nodeOf
+
+    def _settings(self) -> tuple:
+        '''
+        Settings the partition depends on, stored along with it
+        '''
+        return (float(self._numNodes), float(["iid", "dirichlet", "contiguous"].index(self._scheme)), float(self._alpha), float(self._seed), float(self._minShardSize))
+
+    def _save(self):
+        '''
+        Writes the partition to the index file. The file is written under a
+        temporary name and renamed, so that readers never see a partial file.
+        '''
+        tmpFile = self._indexFile + ".tmp"
+        with open(tmpFile, "wb") as f:
+            np.savez(f, indices = self._indices, offsets = self._offsets, settings = np.array(self._settings()))
+        os.replace(tmpFile, self._indexFile)
+
+    def _load(self):
+        with np.load(self._indexFile) as stored:
+            self._indices = stored["indices"]
+            self._offsets = stored["offsets"]
+            self._storedSettings = tuple(stored["settings"].tolist())
+
+    def getIndices(self, nodeId : int) -> np.ndarray:
+        '''
+        Indices of the examples of a node. If the partition was not computed in this
+        process, it is loaded from the index file.
+
+        Parameters
+        ----------
+        nodeId - index of the node in [0, numNodes)
+
+        Returns
+        -------
+        array of indices, a view on the partition
+
+        Exception
+        ---------
+        AttributeError
+            in case the partition was neither computed nor stored
+        ValueError
+            in case nodeId is not in [0, numNodes)
+        '''
+        if self._indices is None:
+            if self._indexFile is None or not os.path.exists(self._indexFile):
+                self.error("Partition is not computed")
+                raise AttributeError("Partition is not computed")
+            self._load()
+        if not 0 <= nodeId < self._numNodes:
+            error_text = "The attribute nodeId should be in [0, " + str(self._numNodes) + "), it is " + str(nodeId)
+            self.error(error_text)
+            raise ValueError(error_text)
+        return self._indices[self._offsets[nodeId]:self._offsets[nodeId + 1]]
+
+    def getNumNodes(self) -> int:
+        return self._numNodes
@@ -0,0 +1,212 @@
+from DLplatform.dataprovisioning.datasource import DataSource
+
+import queue
+import threading
+import time
+
+class PrefetchingDataSource(DataSource):
+    '''
+    Wraps another data source and reads examples ahead of consumption in several
+    reader threads, so that I/O and decoding do not stall the data scheduler.
+    Data sources are not thread-safe, so the wrapped source is accessed by one reader
+    at a time and its getNext runs serially. Only the decode function (e.g., decoding
+    an image or parsing a line) runs in the reader threads in parallel, hence the
+    wrapped source should only return the raw records (e.g., bytes or lines) and all
+    the decoding must be done in decode. Read examples are kept in a bounded queue.
+    Examples are returned in the order they were read from the wrapped source or,
+    if preserveOrder is False, in the order the readers finished them. To preserve the
+    order, readers hand over only examples less than queueSize behind the next one to
+    be returned, so at most queueSize examples are kept besides one per reader.
+    An exception raised by the wrapped source or decode in a reader is raised again
+    by getNext of the consumer for the example concerned, the readers go on reading.
+    '''
+
+    def __init__(self, dataSource : DataSource, queueSize = 64, numReaders = 2, preserveOrder = True,
+                 decode = None, name = "PrefetchingDataSource"):
+        '''
+        Initialize BaseClass parent with name PrefetchingDataSource
+
+        Parameters
+        ----------
+        dataSource - data source that is read ahead
+        queueSize - maximal amount of examples read ahead
+        numReaders - amount of reader threads
+        preserveOrder - if False examples are returned as soon as they are ready
+        decode - function applied to every raw record read from dataSource in the
+            reader threads, None if dataSource returns decoded examples
+
+        Returns
+        -------
+        None
+
+        Exception
+        ---------
+        ValueError
+            in case dataSource is not of type DataSource or queueSize or numReaders are not positive
+        '''
+        DataSource.__init__(self, name = name)
+
+        if not isinstance(dataSource, DataSource):
+            error_text = "The attribute dataSource is of type " + str(type(dataSource)) + " and not of type" + str(DataSource)
+            self.error(error_text)
+            raise ValueError(error_text)
+        if queueSize < 1 or numReaders < 1:
+            error_text = "The attributes queueSize and numReaders should be positive, they are " + str(queueSize) + " and " + str(numReaders)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._dataSource        = dataSource
+        self._queueSize         = queueSize
+        self._numReaders        = numReaders
+        self._preserveOrder     = preserveOrder
+        self._decode            = decode
+        # created in prepare, i.e., in the process reading the data
+        self._queue             = None
+        self._sourceLock        = None
+        self._stopEvent         = None
+        # readers wait on it for the window of examples that can be handed over with preserveOrder
+        self._window            = None
+        self._readers           = []
+        self._nextSequence      = 0
+        self._expectedSequence  = 0
+        self._reordered         = {}
+        self._consumed          = 0
+        self._takes             = 0
+        self._queueDepthSum     = 0
+        self._waits             = 0
+        self._waitTime          = 0.0
+
+    def prepare(self):
+        '''
+        Prepares the wrapped data source and starts the reader threads
+        '''
+        self._dataSource.prepare()
+        self._queue = queue.Queue(maxsize = self._queueSize)
+        self._sourceLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._window = threading.Condition()
+        self._readers = []
+        for i in range(self._numReaders):
+            reader = threading.Thread(target = self._read, name = self.getName() + "_reader_" + str(i))
+            reader.daemon = True
+            reader.start()
+            self._readers.append(reader)
+
+    def _read(self):
+        '''
+        Loop of a reader thread: takes the next raw record from the wrapped source,
+        decodes it and puts it into the queue together with its sequence number.
+        Exceptions are put into the queue instead of the example and passed to the consumer.
+        '''
+        while not self._stopEvent.is_set():
+            error = None
+            example = None
+            with self._sourceLock:
+                sequence = self._nextSequence
+                self._nextSequence += 1
+                try:
+                    example = self._dataSource.getNext()
+                except Exception as e:
+                    error = e
+            if error is None and not self._decode is None:
+                try:
+                    example = self._decode(example)
+                except Exception as e:
+                    error = e
+            if self._preserveOrder:
+                # examples far ahead would pile up in the consumer while it waits for an earlier one
+                with self._window:
+                    while sequence >= self._expectedSequence + self._queueSize and not self._stopEvent.is_set():
+                        self._window.wait(0.1)
+            while not self._stopEvent.is_set():
+                try:
+                    self._queue.put((sequence, example, error), timeout = 0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def _take(self) -> tuple:
+        '''
+        Takes the next finished item from the queue, measuring the time spent waiting
+        '''
+        self._takes += 1
+        self._queueDepthSum += self._queue.qsize()
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        waitStart = time.perf_counter()
+        item = self._queue.get()
+        self._waits += 1
+        self._waitTime += time.perf_counter() - waitStart
+        return item
+
+    def getNext(self) -> tuple:
+        '''
+        Returns
+        -------
+        tuple - the next example read ahead
+
+        Exception
+        ---------
+        AttributeError
+            in case prepare was not called
+        Exception
+            raised by the wrapped data source or decode
+        '''
+        if self._queue is None:
+            self.error("Data source is not prepared")
+            raise AttributeError("Data source is not prepared")
+
+        if self._preserveOrder:
+            while not self._expectedSequence in self._reordered:
+                sequence, example, error = self._take()
+                self._reordered[sequence] = (example, error)
+            example, error = self._reordered.pop(self._expectedSequence)
+            with self._window:
+                self._expectedSequence += 1
+                self._window.notify_all()
+        else:
+            _, example, error = self._take()
+        if not error is None:
+            raise error
+        self._consumed += 1
+        return example
+
+    def getQueueDepth(self) -> int:
+        '''
+        Returns
+        -------
+        int - amount of examples currently read ahead
+        '''
+        if self._queue is None:
+            return 0
+        return self._queue.qsize() + len(self._reordered)
+
+    def getStatistics(self) -> dict:
+        '''
+        Statistics of the consumption so far. If the consumer has to wait often,
+        reading is the bottleneck and more readers may help.
+
+        Returns
+        -------
+        dict - consumed: amount of returned examples, queueDepth: current queue depth,
+            meanQueueDepth: mean queue depth seen by the consumer, waits: amount of
+            times the consumer found the queue empty, waitTime: seconds spent waiting
+        '''
+        return {"consumed": self._consumed,
+                "queueDepth": self.getQueueDepth(),
+                "meanQueueDepth": self._queueDepthSum / max(self._takes, 1),
+                "waits": self._waits,
+                "waitTime": self._waitTime}
+
+    def close(self):
+        '''
+        Stops the reader threads and closes the wrapped data source
+        '''
+        if not self._stopEvent is None:
+            self._stopEvent.set()
+            for reader in self._readers:
+                reader.join()
+            self._readers = []
+        self._dataSource.close()
@@ -0,0 +1,90 @@
+from DLplatform.dataprovisioning import DataScheduler
+
+import math
+import time
+
+class RateControlledDataScheduler(DataScheduler):
+    '''
+    Provides examples with a given rate, paced by a token bucket on a monotonic clock.
+    Tokens accumulate with the target rate, every example sent consumes one. Time
+    spent in getData and oversleeping are compensated by the tokens accumulated in
+    the meantime, which are spent in a burst, so the long-run rate is exact as long
+    as the data source is fast enough. The burst size is bounded by maxBurst, tokens
+    beyond it are lost, i.e., the scheduler does not catch up after a long stall.
+    Without batchSize bursts are sent as single examples one after another, with
+    batchSize a batch is sent whenever batchSize tokens are available, which allows
+    rates far beyond what sleeping per example can achieve.
+    The achieved rate of examples delivered to the worker is reported every reportInterval
+    seconds to the log and, if set, to the learning logger, together with the amount of
+    examples dropped because the buffer of the worker was full.
+    '''
+
+    def __init__(self, rate : float, maxBurst = None, reportInterval = 10.0, name = "RateControlledDataScheduler", batchSize = None):
+        '''
+        Parameters
+        ----------
+        rate - target rate in examples per second
+        maxBurst - maximal amount of examples sent at once, by default the examples of 10 ms
+            but at least one message
+        reportInterval - seconds between reports of the achieved rate
+        batchSize - see DataScheduler
+
+        Exception
+        ---------
+        ValueError
+            in case rate is not positive or maxBurst is smaller than batchSize
+        '''
+        DataScheduler.__init__(self, name = name, batchSize = batchSize)
+
+        if not rate > 0:
+            error_text = "The attribute rate should be positive, it is " + str(rate)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        unit = 1 if batchSize is None else batchSize
+        if maxBurst is None:
+            maxBurst = max(unit, int(math.ceil(rate * 0.01)))
+        if maxBurst < unit:
+            error_text = "The attribute maxBurst should be at least " + str(unit) + ", it is " + str(maxBurst)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._rate              = rate
+        self._maxBurst          = maxBurst
+        self._reportInterval    = reportInterval
+
+    def generateSamples(self):
+        '''
+        Sends examples to the worker with the target rate
+        '''
+        DataScheduler.generateSamples(self)
+
+        unit = 1 if self._batchSize is None else self._batchSize
+        tokens = 0.0
+        sent = 0
+        dropped = 0
+        last = time.perf_counter()
+        reportStart = last
+        reportSent = 0
+        while True:
+            now = time.perf_counter()
+            tokens = min(self._maxBurst, tokens + (now - last) * self._rate)
+            last = now
+            if tokens < unit:
+                time.sleep((unit - tokens) / self._rate)
+                continue
+
+            while tokens >= unit:
+                if self.sendDataUpdate(self.getData()):
+                    sent += unit
+                else:
+                    dropped += unit
+                tokens -= unit
+
+            if now - reportStart >= self._reportInterval:
+                achievedRate = (sent - reportSent) / (now - reportStart)
+                self.info("Target rate " + str(self._rate) + ", achieved rate " + str(achievedRate) + ", dropped examples " + str(dropped))
+                if not self._learningLogger is None:
+                    self._learningLogger.logDataRate(self._rate, achievedRate, sent, dropped)
+                reportStart = now
+                reportSent = sent
@@ -0,0 +1,93 @@
+from DLplatform.dataprovisioning import DataScheduler
+from DLplatform.dataprovisioning.streamRecorder import StreamRecorder
+
+import json
+import numpy as np
+import os
+import time
+
+class ReplayDataScheduler(DataScheduler):
+    '''
+    Replays a stream recorded by a StreamRecorder. The recording is memory-mapped,
+    so replaying costs no decoding, and every run sees exactly the same data updates.
+    They are sent either as fast as possible ("full") or at the recorded times
+    ("recorded"). Examples are sent the same way they were recorded, i.e., single
+    or as batches of the batch size of the recording scheduler.
+    No data source is needed.
+    '''
+
+    def __init__(self, path : str, timing = "full", loop = False, name = "ReplayDataScheduler"):
+        '''
+        Parameters
+        ----------
+        path - directory of the recording
+        timing - "full" for sending as fast as possible, "recorded" for the recorded timing
+        loop - if True the recording is replayed again after its end, otherwise the
+            scheduler stops sending
+
+        Exception
+        ---------
+        ValueError
+            in case timing is unknown
+        '''
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        DataScheduler.__init__(self, name = name, batchSize = meta["batchSize"])
+
+        if not timing in ["full", "recorded"]:
+            error_text = "The attribute timing should be 'full' or 'recorded', it is " + str(timing)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._path      = path
+        self._meta      = meta
+        self._timing    = timing
+        self._loop      = loop
+
+    def _openRecording(self) -> tuple:
+        '''
+        Memory-maps the recording, ignoring data updates that were not completely written
+
+        Returns
+        -------
+        tuple - index, examples and labels
+        '''
+        index = np.fromfile(os.path.join(self._path, "index.bin"), dtype = StreamRecorder.indexDtype)
+        xDtype, xShape = np.dtype(self._meta["xDtype"]), tuple(self._meta["xShape"])
+        yDtype, yShape = np.dtype(self._meta["yDtype"]), tuple(self._meta["yShape"])
+        xSize = os.path.getsize(os.path.join(self._path, "X.bin")) // (xDtype.itemsize * int(np.prod(xShape)))
+        ySize = os.path.getsize(os.path.join(self._path, "y.bin")) // (yDtype.itemsize * int(np.prod(yShape)))
+        ends = np.cumsum(index['count'])
+        complete = np.searchsorted(ends, min(xSize, ySize), side = 'right')
+        index = index[:complete]
+        amount = int(ends[complete - 1]) if complete > 0 else 0
+        if amount == 0:
+            error_text = "The recording in " + self._path + " is empty"
+            self.error(error_text)
+            raise ValueError(error_text)
+        X = np.memmap(os.path.join(self._path, "X.bin"), dtype = xDtype, mode = 'r', shape = (amount,) + xShape)
+        y = np.memmap(os.path.join(self._path, "y.bin"), dtype = yDtype, mode = 'r', shape = (amount,) + yShape)
+        return index, X, y
+
+    def generateSamples(self):
+        '''
+        Sends the recorded data updates to the worker
+        '''
+        index, X, y = self._openRecording()
+        offsets = np.concatenate([[0], np.cumsum(index['count'])])
+        while True:
+            start = time.perf_counter()
+            for i in range(len(index)):
+                if self._timing == "recorded":
+                    wait = start + index['time'][i] - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                begin, end = offsets[i], offsets[i + 1]
+                if self._batchSize is None:
+                    label = y[begin]
+                    self.sendDataUpdate((np.array(X[begin]), label.item() if label.ndim == 0 else np.array(label)))
+                else:
+                    self.sendDataUpdate((np.asarray(X[begin:end]), np.asarray(y[begin:end])))
+            if not self._loop:
+                self.info("Replay of " + self._path + " finished")
+                return
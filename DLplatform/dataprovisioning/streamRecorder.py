@@ -0,0 +1,118 @@
+from DLplatform.baseClass import baseClass
+
+import json
+import numpy as np
+import os
+import time
+
+class StreamRecorder(baseClass):
+    '''
+    Records the data updates a data scheduler sends to its worker, so that the
+    same stream can be replayed by a ReplayDataScheduler. Examples and labels are
+    appended as raw binary to X.bin and y.bin, for every data update the time since
+    the first one and the amount of examples are appended to index.bin. Dtypes and
+    shapes are written to meta.json. Files are opened on the first record, i.e., in
+    the process of the data scheduler, and flushed every flushInterval updates, so
+    a recording stays readable if the scheduler crashes. The data scheduler closes
+    the recorder when it ends or is terminated, which writes all the updates.
+    '''
+
+    indexDtype = np.dtype([('time', np.float64), ('count', np.int64)])
+
+    def __init__(self, path : str, flushInterval = 100, name = "StreamRecorder"):
+        '''
+        Initialize BaseClass parent with name StreamRecorder
+
+        Parameters
+        ----------
+        path - directory of the recording, created if it does not exist
+        flushInterval - amount of data updates after which the files are flushed
+
+        Returns
+        -------
+        None
+        '''
+        baseClass.__init__(self, name = name)
+
+        self._path          = path
+        self._flushInterval = flushInterval
+        self._files         = None
+        self._meta          = None
+        self._start         = None
+        self._unflushed     = 0
+
+    def _open(self, examples : np.ndarray, labels : np.ndarray, batchSize):
+        '''
+        Creates the files of the recording and writes the meta data taken from the first data update
+        '''
+        os.makedirs(self._path, exist_ok = True)
+        self._meta = {"xDtype": examples.dtype.str, "xShape": list(examples.shape[1:]),
+                      "yDtype": labels.dtype.str, "yShape": list(labels.shape[1:]),
+                      "batchSize": batchSize}
+        with open(os.path.join(self._path, "meta.json"), "w") as f:
+            json.dump(self._meta, f)
+        self._files = [open(os.path.join(self._path, fileName), "wb") for fileName in ["X.bin", "y.bin", "index.bin"]]
+        self._start = time.perf_counter()
+
+    def record(self, data, batchSize = None):
+        '''
+        Appends a data update to the recording
+
+        Parameters
+        ----------
+        data - a tuple of an example and its label or, if batchSize is set,
+            a tuple of an array of examples and an array of labels
+        batchSize - batch size of the data scheduler, None if it sends single examples
+
+        Returns
+        -------
+        None
+
+        Exception
+        ---------
+        ValueError
+            in case dtype or shape of the data differ from the first data update
+        '''
+        if batchSize is None:
+            examples = np.asarray(data[0])[np.newaxis]
+            labels = np.asarray(data[1])[np.newaxis]
+        else:
+            examples = np.asarray(data[0])
+            labels = np.asarray(data[1])
+
+        if self._files is None:
+            self._open(examples, labels, batchSize)
+        elif examples.dtype.str != self._meta["xDtype"] or list(examples.shape[1:]) != self._meta["xShape"] or \
+                labels.dtype.str != self._meta["yDtype"] or list(labels.shape[1:]) != self._meta["yShape"]:
+            error_text = "Data update of dtypes " + str((examples.dtype, labels.dtype)) + " and shapes " + \
+                str((examples.shape, labels.shape)) + " does not match the recording " + str(self._meta)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        xFile, yFile, indexFile = self._files
+        xFile.write(np.ascontiguousarray(examples).tobytes())
+        yFile.write(np.ascontiguousarray(labels).tobytes())
+        indexFile.write(np.array([(time.perf_counter() - self._start, len(labels))], dtype = self.indexDtype).tobytes())
+        self._unflushed += 1
+        if self._unflushed >= self._flushInterval:
+            self.flush()
+
+    def flush(self):
+        '''
+        Flushes the files, examples and labels before the index, so that the index
+        never refers to data that was not written
+        '''
+        if not self._files is None:
+            for f in self._files:
+                f.flush()
+        self._unflushed = 0
+
+    def close(self):
+        '''
+        Flushes and closes the files of the recording
+        '''
+        if not self._files is None:
+            self.flush()
+            for f in self._files:
+                f.close()
+            self._files = None
@@ -16,11 +16,11 @@ class LogisticRegression(BatchLearner):
         self.model.intercept_ = np.array([0.0])
         #self.weights = np.zeros(dim)
         
-    def setModel(self, param: VectorParameter, setReference: bool):
-        super(LogisticRegression, self).setModel(param, setReference)
+    def setModel(self, param: VectorParameter, flags: dict):
+        super(LogisticRegression, self).setModel(param, flags)
         
         #self.info('STARTTIME_setReference: '+str(time.time()))
-        if setReference:
+        if flags.get("setReference", False):
             self._flattenReferenceParams = param.get()
         #self.info('ENDTIME_setReference: '+str(time.time()))
 
@@ -12,18 +12,22 @@ class KerasNN(IncrementalLearner):
         self._core          = None
 
         self._flattenReferenceParams    = None
+        # flattened parameters when the divergence sketch was last updated, only with sketched synchronizers
+        self._sketchedParameters        = None
         self._session = session
 
     def setCore(self, network):
         self._core = network
 
-    def setModel(self, param: KerasNNParameters, setReference: bool):
-        super(KerasNN, self).setModel(param, setReference)
+    def setModel(self, param: KerasNNParameters, flags: dict):
+        super(KerasNN, self).setModel(param, flags)
         
-        #self.info('STARTTIME_setReference: '+str(time.time()))
-        if setReference:
-            self._flattenReferenceParams = self._flattenParameters(param)
-        #self.info('ENDTIME_setReference: '+str(time.time()))
+        if flags.get("setReference", False):
+            with self._phaseTimer.measure("setReference"):
+                self._flattenReferenceParams = self._flattenParameters(param)
+            if not self._synchronizer is None and self._synchronizer.isSketched():
+                self._sketchedParameters = self._flattenReferenceParams
+                self._synchronizer.resetSketch(len(self._sketchedParameters))
 
     def checkLocalConditionHolds(self) -> (float, bool):
         '''
@@ -38,7 +42,15 @@ class KerasNN(IncrementalLearner):
         localConditionHolds = True
         self._syncCounter += 1
         if self._syncCounter == self._syncPeriod:
-            msg, localConditionHolds = self._synchronizer.evaluateLocal(self._flattenParameters(self.getParameters()), self._flattenReferenceParams)
+            currentParameters = self._flattenParameters(self.getParameters())
+            if self._synchronizer.isSketched():
+                # the changes since the last check, i.e., of training steps and received models, are added to the sketch
+                self._synchronizer.updateSketch(currentParameters - self._sketchedParameters)
+                self._sketchedParameters = currentParameters
+                msg, localConditionHolds = self._synchronizer.evaluateLocalSketch(
+                    lambda: float(np.dot(currentParameters - self._flattenReferenceParams, currentParameters - self._flattenReferenceParams)))
+            else:
+                msg, localConditionHolds = self._synchronizer.evaluateLocal(currentParameters, self._flattenReferenceParams)
             self._syncCounter = 0
 
         return msg, localConditionHolds
@@ -50,7 +62,7 @@ class KerasNN(IncrementalLearner):
 
         Parameters
         ----------
-        data
+        data - list of tuples of example and label or tuple of an array of examples and an array of labels
 
         Returns
         -------
@@ -61,22 +73,26 @@ class KerasNN(IncrementalLearner):
         AttributeError
             in case core is not set
         ValueError
-            in case that data is not an numpy array
+            in case that data is neither a list nor a tuple of arrays
         '''
         if self._core is None:
             self.error("No core is set")
             raise AttributeError("No core is set")
 
-        if not isinstance(data, List):
-            error_text = "The argument data is not of type" + str(List) + "it is of type " + str(type(data))
+        if isinstance(data, tuple):
+            examples, labels = data
+        elif isinstance(data, List):
+            with self._phaseTimer.measure("collate"):
+                examples = np.asarray([record[0] for record in data])
+                labels = np.asarray([record[1] for record in data])
+        else:
+            error_text = "The argument data is not of type" + str(List) + " or tuple, it is of type " + str(type(data))
             self.error(error_text)
             raise ValueError(error_text)
 
-        #self.info('STARTTIME_train_on_batch: '+str(time.time()))
         with self._session.as_default():
             with self._session.graph.as_default():
-                metrics = self._core.train_on_batch(np.asarray([record[0] for record in data]), np.asarray([record[1] for record in data]))
-        #self.info('ENDTIME_train_on_batch: '+str(time.time()))
+                metrics = self._core.train_on_batch(examples, labels)
         return metrics
 
     def setParameters(self, param : KerasNNParameters):
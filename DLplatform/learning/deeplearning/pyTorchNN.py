@@ -13,18 +13,87 @@ class PyTorchNN(IncrementalLearner):
         IncrementalLearner.__init__(self, batchSize = batchSize, syncPeriod = syncPeriod, name = name)
 
         self._core          		= None
-        self._flattenReferenceParams    = None
         self._mode			= mode
         self._device			= device
+        # reference model and scratch buffers for its distance to the current model,
+        # allocated once on the device of the core
+        self._referenceState            = None
+        self._distanceBuffers           = None
+        # flattened parameters when the divergence sketch was last updated, only with sketched synchronizers
+        self._sketchedParameters        = None
+        # reusable batch tensors filled by _collate
+        self._exampleBuffer             = None
+        self._labelBuffer               = None
 
     def setCore(self, network):
         self._core = network
 
-    def setModel(self, param: PyTorchNNParameters, setReference: bool):
-        super(PyTorchNN, self).setModel(param, setReference)
+    def setModel(self, param: PyTorchNNParameters, flags: dict):
+        super(PyTorchNN, self).setModel(param, flags)
         
-        if setReference:
-            self._flattenReferenceParams = self._flattenParameters(param)
+        if flags.get("setReference", False):
+            self._setReferenceState(param)
+            if not self._synchronizer is None and self._synchronizer.isSketched():
+                self._sketchedParameters = self._flatParameters(param)
+                self._synchronizer.resetSketch(len(self._sketchedParameters))
+
+    def _flatParameters(self, param: PyTorchNNParameters) -> np.ndarray:
+        '''
+        Concatenates the flattened tensors of param in the order of the state dictionary
+        '''
+        return np.concatenate([np.ravel(v) for v in param.get().values()]).astype(np.float64)
+
+    def _setReferenceState(self, param: PyTorchNNParameters):
+        '''
+        Copies the reference parameters into preallocated tensors next to the core,
+        so that the divergence can be computed without leaving the device.
+
+        Parameters
+        ----------
+        param - parameters of the new reference model
+        '''
+        state = self._core.state_dict()
+        if self._referenceState is None:
+            self._referenceState = OrderedDict()
+            self._distanceBuffers = OrderedDict()
+            for k, v in state.items():
+                self._referenceState[k] = torch.empty_like(v)
+                if v.is_floating_point():
+                    self._distanceBuffers[k] = torch.empty_like(v)
+        with torch.no_grad():
+            for k, v in param.get().items():
+                self._referenceState[k].copy_(torch.as_tensor(np.asarray(v)))
+
+    def _squaredDistanceToReference(self) -> float:
+        '''
+        Squared euclidean distance between current and reference model over the whole
+        state dictionary (same as for the flattened parameters), computed in the
+        preallocated buffers without copying the state dictionary.
+
+        Returns
+        -------
+        float - squared distance
+
+        Exception
+        ---------
+        ValueError
+            in case no reference model was set yet
+        '''
+        if self._referenceState is None:
+            error_text = "No reference model is set, the divergence can only be computed after a model with setReference was received"
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        squaredDistance = 0.0
+        with torch.no_grad():
+            for k, v in self._core.state_dict().items():
+                if k in self._distanceBuffers:
+                    diff = torch.sub(v, self._referenceState[k], out=self._distanceBuffers[k]).view(-1)
+                    squaredDistance += torch.dot(diff, diff).item()
+                else:
+                    # integer buffers, e.g., num_batches_tracked of batch norm, are tiny
+                    squaredDistance += (v - self._referenceState[k]).double().pow(2).sum().item()
+        return squaredDistance
 
     def setLoss(self, lossFunction):
         self._loss = eval("nn." + lossFunction + "()")
@@ -43,9 +112,17 @@ class PyTorchNN(IncrementalLearner):
         bool
         '''
         localConditionHolds = True
+        msg = ""
         self._syncCounter += 1
         if self._syncCounter == self._syncPeriod:
-            msg, localConditionHolds = self._synchronizer.evaluateLocal(self._flattenParameters(self.getParameters()), self._flattenReferenceParams)
+            if self._synchronizer.isSketched():
+                # the changes since the last check, i.e., of training steps and received models, are added to the sketch
+                currentParameters = self._flatParameters(self.getParameters())
+                self._synchronizer.updateSketch(currentParameters - self._sketchedParameters)
+                self._sketchedParameters = currentParameters
+                msg, localConditionHolds = self._synchronizer.evaluateLocalSketch(self._squaredDistanceToReference)
+            else:
+                msg, localConditionHolds = self._synchronizer.evaluateLocalDistance(self._squaredDistanceToReference())
             self._syncCounter = 0
 
         return msg, localConditionHolds
@@ -55,7 +132,7 @@ class PyTorchNN(IncrementalLearner):
 
         Parameters
         ----------
-        data
+        data - list of tuples of example and label or tuple of an array of examples and an array of labels
 
         Returns
         -------
@@ -65,40 +142,125 @@ class PyTorchNN(IncrementalLearner):
         AttributeError
             in case core is not set
         ValueError
-            in case that data is not an numpy array
+            in case that data is neither a list nor a tuple of arrays
         '''
         if self._core is None:
             self.error("No core is set")
             raise AttributeError("No core is set")
 
-        if not isinstance(data, List):
-            error_text = "The argument data is not of type" + str(List) + "it is of type " + str(type(data))
+        if isinstance(data, tuple):
+            with self._phaseTimer.measure("collate"):
+                exampleTensor, labelTensor = self._collateArrays(data[0], data[1])
+        elif isinstance(data, List):
+            with self._phaseTimer.measure("collate"):
+                exampleTensor, labelTensor = self._collate(data)
+        else:
+            error_text = "The argument data is not of type" + str(List) + " or tuple, it is of type " + str(type(data))
             self.error(error_text)
             raise ValueError(error_text)
-       
-        example = np.asarray([record[0] for record in data])
-        label = np.asarray([record[1] for record in data])
+
         self._updateRule.zero_grad()   # zero the gradient buffers
-        if self._mode == 'gpu':
-            exampleTensor = torch.cuda.FloatTensor(example, device=self._device)
-            if type(self._loss) is nn.MSELoss or type(self._loss) is nn.L1Loss:
-                labelTensor = torch.cuda.FloatTensor(label, device=self._device)
-            else:
-                labelTensor = torch.cuda.LongTensor(label, device=self._device)
-        else:
-            exampleTensor = torch.FloatTensor(example)
-            if type(self._loss) is nn.MSELoss or type(self._loss) is nn.L1Loss:
-                labelTensor = torch.FloatTensor(label)
-            else:
-                labelTensor = torch.LongTensor(label)
         output = self._core(exampleTensor)
         loss = self._loss(output, labelTensor)
         loss.backward()
         self._updateRule.step()    # Does the update
-        return [loss.data.cpu().numpy(), output.data.cpu().numpy()]
+        predictions = None
+        if self._logPredictions:
+            predictions = output.detach().cpu().numpy()
+        return [loss.item(), predictions]
+
+    def _collate(self, data: List):
+        '''
+        Writes the examples and labels of a batch directly into reusable
+        preallocated tensors (pinned host memory when training on gpu)
+        and returns views of them of the batch length.
+
+        Parameters
+        ----------
+        data - list of tuples of example and label
+
+        Returns
+        -------
+        example tensor and label tensor on the device of the core
+        '''
+        n = len(data)
+        exampleShape = np.shape(data[0][0])
+        labelShape = np.shape(data[0][1])
+        if self._exampleBuffer is None or self._exampleBuffer.shape[0] < n or \
+                tuple(self._exampleBuffer.shape[1:]) != exampleShape or tuple(self._labelBuffer.shape[1:]) != labelShape:
+            self._allocateBatchBuffers(max(n, self._batchSize), exampleShape, labelShape)
+
+        np.stack([record[0] for record in data], out=self._exampleBufferArray[:n])
+        self._labelBufferArray[:n] = [record[1] for record in data]
+        return self._buffersOnDevice(n)
+
+    def _collateArrays(self, examples: np.ndarray, labels: np.ndarray):
+        '''
+        Converts a batch given as arrays into tensors. On cpu arrays of the right
+        dtype are wrapped without copying, otherwise they are copied into the
+        preallocated tensors used by _collate.
+
+        Parameters
+        ----------
+        examples - array of examples
+        labels - array of labels
+
+        Returns
+        -------
+        example tensor and label tensor on the device of the core
+        '''
+        n = len(labels)
+        if self._mode != 'gpu' and examples.dtype == np.float32 and labels.dtype == self._labelDtype():
+            return torch.from_numpy(np.ascontiguousarray(examples)), torch.from_numpy(np.ascontiguousarray(labels))
+        exampleShape = examples.shape[1:]
+        labelShape = labels.shape[1:]
+        if self._exampleBuffer is None or self._exampleBuffer.shape[0] < n or \
+                tuple(self._exampleBuffer.shape[1:]) != exampleShape or tuple(self._labelBuffer.shape[1:]) != labelShape:
+            self._allocateBatchBuffers(max(n, self._batchSize), exampleShape, labelShape)
+        np.copyto(self._exampleBufferArray[:n], examples, casting='unsafe')
+        np.copyto(self._labelBufferArray[:n], labels, casting='unsafe')
+        return self._buffersOnDevice(n)
+
+    def _buffersOnDevice(self, n: int):
+        '''
+        Returns the first n entries of the batch tensors, transferred to the gpu in gpu mode
+        '''
+        if self._mode == 'gpu':
+            exampleTensor = self._exampleDeviceBuffer[:n]
+            exampleTensor.copy_(self._exampleBuffer[:n], non_blocking=True)
+            labelTensor = self._labelDeviceBuffer[:n]
+            labelTensor.copy_(self._labelBuffer[:n], non_blocking=True)
+            return exampleTensor, labelTensor
+        return self._exampleBuffer[:n], self._labelBuffer[:n]
+
+    def _allocateBatchBuffers(self, batchSize: int, exampleShape: tuple, labelShape: tuple):
+        '''
+        Allocates the batch tensors used by _collate together with numpy views on them.
+        '''
+        labelType = torch.from_numpy(np.empty(0, dtype=self._labelDtype())).dtype
+        pinMemory = self._mode == 'gpu'
+        self._exampleBuffer = torch.empty((batchSize,) + tuple(exampleShape), dtype=torch.float32, pin_memory=pinMemory)
+        self._labelBuffer = torch.empty((batchSize,) + tuple(labelShape), dtype=labelType, pin_memory=pinMemory)
+        self._exampleBufferArray = self._exampleBuffer.numpy()
+        self._labelBufferArray = self._labelBuffer.numpy()
+        if self._mode == 'gpu':
+            self._exampleDeviceBuffer = torch.empty_like(self._exampleBuffer, device=self._device)
+            self._labelDeviceBuffer = torch.empty_like(self._labelBuffer, device=self._device)
+
+    def _labelDtype(self):
+        '''
+        Labels are float for regression losses (MSELoss, L1Loss) and long otherwise.
+        '''
+        if type(self._loss) is nn.MSELoss or type(self._loss) is nn.L1Loss:
+            return np.float32
+        return np.int64
 
     def setParameters(self, param : PyTorchNNParameters):
         '''
+        Copies the given values in place into the tensors of the core. The tensors
+        keep their dtype and device, e.g., integer buffers of batch norm stay integers.
+        On cpu the numpy arrays are wrapped without copying, so setting a model costs
+        one copy per tensor, on gpu one transfer per tensor.
 
         Parameters
         ----------
@@ -111,6 +273,7 @@ class PyTorchNN(IncrementalLearner):
         ---------
         ValueError
             in case that param is not of type Parameters
+            in case that param does not have the same keys and shapes as the state dictionary of the core
         '''
 
         if not isinstance(param, PyTorchNNParameters):
@@ -118,22 +281,28 @@ class PyTorchNN(IncrementalLearner):
             self.error(error_text)
             raise ValueError(error_text)
 
-        state_dict = OrderedDict()
-        for k,v in param.get().items():
-            if self._mode == 'gpu':
-                if v.shape == ():
-                    state_dict[k] = torch.tensor(v, device=self._device)
-                else:
-                    state_dict[k] = torch.cuda.FloatTensor(v, device=self._device)
-            else:
-                if v.shape == ():
-                    state_dict[k] = torch.tensor(v)
-                else:
-                    state_dict[k] = torch.FloatTensor(v)
-        self._core.load_state_dict(state_dict)
+        state = self._core.state_dict()
+        if set(state.keys()) != set(param.get().keys()):
+            error_text = "The argument param has different keys than the state dictionary of the core. Param: " + str(set(param.get().keys())) + ", core: " + str(set(state.keys()))
+            self.error(error_text)
+            raise ValueError(error_text)
+        # copy_ broadcasts, so shapes have to be checked, e.g., a single value would fill a whole bias
+        wrongShapes = [k for k, v in param.get().items() if tuple(np.shape(v)) != tuple(state[k].shape)]
+        if len(wrongShapes) > 0:
+            error_text = "The argument param has different shapes than the state dictionary of the core for " + \
+                ", ".join(k + ": " + str(np.shape(param.get()[k])) + " instead of " + str(tuple(state[k].shape)) for k in wrongShapes)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        with torch.no_grad():
+            for k,v in param.get().items():
+                state[k].copy_(torch.as_tensor(np.asarray(v)))
 
     def getParameters(self) -> PyTorchNNParameters:
         '''
+        On cpu the returned arrays share memory with the tensors of the core,
+        so no copy is made - use getCopy of the result if it should outlive the next
+        training step. On gpu every tensor is copied to the host once.
 
         Returns
         -------
@@ -142,12 +311,9 @@ class PyTorchNN(IncrementalLearner):
         '''
         state_dict = OrderedDict()
         for k, v in self._core.state_dict().items():
-            state_dict[k] = v.data.cpu().numpy()
+            if self._mode == 'gpu':
+                state_dict[k] = v.cpu().numpy()
+            else:
+                state_dict[k] = v.numpy()
         return PyTorchNNParameters(state_dict)
 
-    def _flattenParameters(self, param):
-        flatParam = []
-        for k,v in param.get().items():
-            flatParam += np.ravel(v).tolist()
-        return np.asarray(flatParam)
-
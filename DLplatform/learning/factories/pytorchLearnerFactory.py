@@ -1,18 +1,16 @@
-from DLplatform.learning.deeplearning.pyTorchNN import PyTorchNN
-
-import numpy as np
-import random
-
-import torch.nn as nn
-import torch
-import torch.nn.functional as F
-import torch.optim as optim
-import torch.nn.init as init
 from DLplatform.learning.factories import LearnerFactory
 
 class PytorchLearnerFactory(LearnerFactory):
-    
-    def __init__(self, network : nn.Module, updateRule, learningRate, lossFunction, batchSize, learningParams = None, syncPeriod = 1):
+
+    '''
+
+    Provides a factory method that sets up a PyTorchNN learner for a network, a torch.nn.Module.
+
+    Torch and PyTorchNN are imported when a learner is created, so importing this module,
+    e.g., to list the available factories, does not import torch.
+
+    '''
+    def __init__(self, network, updateRule, learningRate, lossFunction, batchSize, learningParams = None, syncPeriod = 1):
         self.network        = network
         self.updateRule     = updateRule
         self.learningRate   = learningRate
@@ -22,6 +20,9 @@ class PytorchLearnerFactory(LearnerFactory):
         self.syncPeriod     = syncPeriod
         
     def getLearner(self):
+        from DLplatform.learning.deeplearning.pyTorchNN import PyTorchNN
+        import torch
+
         device = torch.device("cuda:0" if torch.cuda.is_available() else None)
         if device is None:
             mode = 'cpu'
@@ -35,6 +36,8 @@ class PytorchLearnerFactory(LearnerFactory):
         return learner
 
     def getLearnerOnDevice(self, mode, device):
+        from DLplatform.learning.deeplearning.pyTorchNN import PyTorchNN
+
         torchNetwork = self.network
         if mode == 'gpu':
             torchNetwork = torchNetwork.cuda(device)
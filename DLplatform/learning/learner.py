@@ -1,12 +1,20 @@
 from DLplatform.baseClass import baseClass
 from DLplatform.parameters import Parameters
 from DLplatform.communicating import Communicator
+from DLplatform.phaseTimer import PhaseTimer
+from DLplatform.metrics import MetricsRegistry
 
 from abc import ABCMeta
+from collections import deque
 from typing import List
+import numpy as np
+import threading
 import time
 import sys
 
+# upper bounds of the buckets of the loss histogram
+LOSS_BUCKETS = (1e-4, 1e-3, 1e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 100.0, 1e3, 1e4)
+
 class Learner(baseClass):
     '''
     Abstract class defining the structure of a learner. This is the basis for batch and incremental learners.
@@ -26,7 +34,38 @@ class Learner(baseClass):
         self._communicator              = None
         self._synchronizer              = None
         self._stop                      = False
+        self._asynchronous              = False
+        self._syncSnapshot              = None
+        # handshake between training steps and parameter requests coming from another thread
+        self._trainingCondition         = threading.Condition()
+        self._pendingRequests           = 0
+        self._lastRequestWaitTime       = 0.0
+        self._totalRequestWaitTime      = 0.0
+        # chunks of examples and labels received by obtainBatch and not yet consumed
+        self._pendingChunks             = deque()
+        self._pendingCount              = 0
+        # timing of the phases of the learning loop, disabled unless a timer is set
+        self._phaseTimer                = PhaseTimer()
+        # start of waiting for a model from the coordinator
+        self._waitForModelStart         = None
+        # live metrics, only collected if a registry is set
+        self._metrics                   = None
         
+    '''
+    The condition variable cannot be pickled, so it is dropped when the
+    learner is sent to another process and created anew there.
+    '''
+    def __getstate__(self):
+        d = baseClass.__getstate__(self)
+        if '_trainingCondition' in d:
+            d['_trainingCondition'] = None
+        return d
+
+    def __setstate__(self, d):
+        if '_trainingCondition' in d:
+            d['_trainingCondition'] = threading.Condition()
+        baseClass.__setstate__(self, d)
+
     def setIdentifier(self, identifier):
         '''
         Setter for identifier
@@ -77,6 +116,43 @@ class Learner(baseClass):
 
         '''
         self._learningLogger = logger
+
+    def setPhaseTimer(self, phaseTimer : PhaseTimer):
+        '''
+        Setter for the PhaseTimer measuring training steps, local condition checks,
+        logging, getting and setting parameters and waiting for models
+
+        Parameters
+        ----------
+        phaseTimer - instance of PhaseTimer class
+
+        Returns
+        -------
+        None
+
+        '''
+        self._phaseTimer = phaseTimer
+
+    def setMetricsRegistry(self, registry : MetricsRegistry):
+        '''
+        Setter for the MetricsRegistry collecting examples, updates, losses,
+        violations and received models of the learner
+
+        Parameters
+        ----------
+        registry - instance of MetricsRegistry class
+
+        Returns
+        -------
+        None
+
+        '''
+        self._metrics = registry
+        registry.counter("dlplatform_examples_total", "Examples trained on")
+        registry.counter("dlplatform_updates_total", "Training steps performed")
+        registry.histogram("dlplatform_loss", "Loss of the training steps", buckets = LOSS_BUCKETS)
+        registry.counter("dlplatform_violations_total", "Violations reported to the coordinator")
+        registry.counter("dlplatform_models_received_total", "Models received from the coordinator, by kind of synchronization")
         
     def stopExecution(self):
         '''
@@ -100,7 +176,7 @@ class Learner(baseClass):
         boolean - true if the learner is running and continues operating, false if stopExecution has been called
         
         '''
-        return not self_stop
+        return not self._stop
     
     def setModel(self, param : Parameters, flags: dict):
         '''
@@ -130,20 +206,81 @@ class Learner(baseClass):
             raise ValueError(error_text)
 
         self.info("received a model update")
-        self.setParameters(param)
+        if not self._metrics is None:
+            self._metrics.counter("dlplatform_models_received_total").inc(labels = {"sync": "full" if flags.get("setReference", False) else "partial"})
+        if not self._waitForModelStart is None:
+            self._phaseTimer.record("waitForModel", time.perf_counter() - self._waitForModelStart)
+            self._waitForModelStart = None
+        with self._phaseTimer.measure("setParameters"):
+            if self._syncSnapshot is None:
+                self.setParameters(param)
+            else:
+                # training continued while the model was aggregated, so the local
+                # progress made since the snapshot is applied on top of the new model
+                self.setParameters(self._mergeLocalProgress(param))
         self.info("replacing current model with updated one")
         self._waitingForAModel = False
         if "setReference" in flags and flags["setReference"] == True:
             self._referenceModel = param
+        # dynamic protocols with adaptive threshold send the new delta along with the model
+        if "delta" in flags and not self._synchronizer is None:
+            self._synchronizer.setDelta(flags["delta"])
         #self.info('ENDTIME_setModel: '+str(time.time()))
+
+    def _mergeLocalProgress(self, param : Parameters) -> Parameters:
+        '''
+        Combines the model received from coordinator with the local progress
+        made since the snapshot that was sent for synchronization, i.e.,
+        returns param + (current - snapshot). Used in asynchronous mode only.
+
+        Parameters
+        ----------
+        param - parameters received from coordinator
+
+        Returns
+        -------
+        Parameters - aggregated model with local delta applied
+        '''
+        localDelta = self.getParameters().getCopy()
+        self._syncSnapshot.scalarMultiply(-1.0)
+        localDelta.add(self._syncSnapshot)
+        self._syncSnapshot = None
+        mergedParam = param.getCopy()
+        mergedParam.add(localDelta)
+        return mergedParam
+
+    def _getParametersForSync(self) -> Parameters:
+        '''
+        Returns current parameters to be sent to coordinator. In asynchronous
+        mode a copy of them is kept as a snapshot, so that the local progress
+        made while waiting for the aggregated model can be merged into it.
+
+        Returns
+        -------
+        Parameters - current parameters of a learner
+        '''
+        with self._phaseTimer.measure("getParameters"):
+            param = self.getParameters()
+            if self._asynchronous:
+                self._syncSnapshot = param.getCopy()
+        # in asynchronous mode training goes on until the model arrives, so it is no waiting time
+        if not self._asynchronous:
+            self._waitForModelStart = time.perf_counter()
+        return param
     
-    def answerParameterRequest(self):
+    def answerParameterRequest(self, roundId = None):
         '''
         Function called when balancing request from coordinator is received
         Switches the state of the learner to waiting, i.e., training is not
         happening and calls communicator method for sending the current parameters.
-        Will not return parameters until the training is happening. Will not
-        return params if waiting for the updated model already.
+        If a training step is running in another thread, the request waits for it
+        to finish and the next step does not start before the parameters are sent.
+        The time spent waiting is available via getParameterRequestWaitTime.
+        Will not return params if waiting for the updated model already.
+
+        Parameters
+        ----------
+        roundId - synchronization round of the request, sent back with the parameters
 
         Returns
         -------
@@ -161,13 +298,107 @@ class Learner(baseClass):
             raise AttributeError("No communicator is set")
 
         self.info("received a request for parameters")
-        while self._isTraining:
-            time.sleep(1)
-        # in the case we are already waiting for a new model we sent a violation report - so we do not need to send parameters again
-        if not self._waitingForAModel:
-            self._waitingForAModel = True
-            self._communicator.sendParameters(self._identifier, self.getParameters())
+        waitStart = time.perf_counter()
+        with self._trainingCondition:
+            self._pendingRequests += 1
+            while self._isTraining:
+                self._trainingCondition.wait()
+        self._lastRequestWaitTime = time.perf_counter() - waitStart
+        self._totalRequestWaitTime += self._lastRequestWaitTime
+        try:
+            # in the case we are already waiting for a new model we sent a violation report - so we do not need to send parameters again
+            if not self._waitingForAModel:
+                self._waitingForAModel = True
+                self._communicator.sendParameters(self._identifier, self._getParametersForSync(), roundId)
+        finally:
+            with self._trainingCondition:
+                self._pendingRequests -= 1
+                self._trainingCondition.notify_all()
         #self.info('ENDTIME_answerBalancingRequest: '+str(time.time()))
+
+    def getParameterRequestWaitTime(self) -> (float, float):
+        '''
+        Time parameter requests had to wait for a running training step.
+
+        Returns
+        -------
+        float - waiting time of the last request in seconds
+        float - total waiting time of all the requests in seconds
+        '''
+        return self._lastRequestWaitTime, self._totalRequestWaitTime
+
+    def obtainBatch(self, batch: tuple):
+        '''
+        Obtains many examples at once, e.g., from a data scheduler with a batchSize.
+        This default implementation hands the examples to obtainData one by one as
+        long as the learner can obtain data. Examples that cannot be obtained yet
+        are kept and handed over first with the next batch.
+
+        Parameters
+        ----------
+        batch - tuple of an array of examples and an array of their labels
+
+        Returns
+        -------
+        None
+
+        '''
+        self._addPendingChunk(batch)
+        while self._pendingCount > 0 and not self._stop and self.canObtainData():
+            examples, labels = self._takePending(1)
+            self.obtainData((examples[0], labels[0]))
+
+    def _addPendingChunk(self, batch: tuple):
+        '''
+        Appends a chunk of examples and labels to the pending ones
+        '''
+        examples, labels = batch
+        if len(labels) > 0:
+            self._pendingChunks.append((examples, labels))
+            self._pendingCount += len(labels)
+
+    def _takePending(self, n: int) -> tuple:
+        '''
+        Removes the first n pending examples. If they are the beginning of one
+        chunk, views of the chunk are returned, otherwise chunks are concatenated.
+
+        Returns
+        -------
+        tuple - array of examples and array of their labels
+        '''
+        examplesParts, labelsParts = [], []
+        while n > 0:
+            examples, labels = self._pendingChunks[0]
+            take = min(n, len(labels))
+            examplesParts.append(examples[:take])
+            labelsParts.append(labels[:take])
+            if take == len(labels):
+                self._pendingChunks.popleft()
+            else:
+                self._pendingChunks[0] = (examples[take:], labels[take:])
+            self._pendingCount -= take
+            n -= take
+        if len(labelsParts) == 1:
+            return examplesParts[0], labelsParts[0]
+        return np.concatenate(examplesParts), np.concatenate(labelsParts)
+
+    def _startTraining(self):
+        '''
+        Marks the beginning of a training step. Waits if a parameter request
+        is being answered, so that it gets the parameters before this step.
+        '''
+        with self._trainingCondition:
+            while self._pendingRequests > 0:
+                self._trainingCondition.wait()
+            self._isTraining = True
+
+    def _finishTraining(self):
+        '''
+        Marks the end of a training step and wakes up waiting parameter requests.
+        '''
+        with self._trainingCondition:
+            self._isTraining = False
+            self._trainingCondition.notify_all()
     
     def setStoppingCriterion(self, stoppingCriterion):
         self._stoppingCriterion = stoppingCriterion
@@ -199,7 +430,10 @@ class Learner(baseClass):
             raise AttributeError("No communicator is set")
 
         self.info("Requesting the initial/current model")
-        self._communicator.sendRegistration(self._identifier, self.getParameters())
+        with self._phaseTimer.measure("getParameters"):
+            param = self.getParameters()
+        self._communicator.sendRegistration(self._identifier, param)
+        self._waitForModelStart = time.perf_counter()
         self._waitingForAModel = True
         self._readyToTrain = False
         
@@ -225,7 +459,9 @@ class Learner(baseClass):
             raise AttributeError("No communicator is set")
 
         self.info("Reporting a violation")
-        self._communicator.sendViolation(self._identifier, self.getParameters())
+        self._communicator.sendViolation(self._identifier, self._getParametersForSync())
+        if not self._metrics is None:
+            self._metrics.counter("dlplatform_violations_total").inc()
         self._waitingForAModel = True
         #self.info('ENDTIME_reportViolation: '+str(time.time()))
                     
@@ -246,7 +482,10 @@ class Learner(baseClass):
     def getParameters(self) -> Parameters:
         '''
         Get current parameters of a learner
-        Implemented in a specific implementation of a learner
+        Implemented in a specific implementation of a learner.
+        Implementations may return parameters that share memory with the model,
+        e.g., PyTorchNN on cpu, so they change with the next training step or
+        setParameters. Callers keeping them longer have to use getCopy of the result.
 
         Returns
         -------
@@ -296,8 +535,55 @@ class IncrementalLearner(Learner):
         self._trainingBatch             = []
         self._syncCounter		        = 0
         self._seenExamples              = 0
+        self._predictionsInterval       = 1
+        self._updatesCounter            = 0
+        # tells update if predictions of the current batch will be logged
+        self._logPredictions            = True
+
+    def getBatchSize(self) -> int:
+        '''
+        Getter for the amount of examples of one training step
+
+        Returns
+        -------
+        int
+        '''
+        return self._batchSize
+
+    def setAsynchronous(self, asynchronous : bool):
+        '''
+        Switches asynchronous synchronization on or off. In asynchronous mode the
+        learner keeps training on incoming data after reporting a violation or
+        answering a balancing request. When the aggregated model arrives, the local
+        progress made in the meantime is added to it instead of being discarded.
 
+        Parameters
+        ----------
+        asynchronous - if True training is not blocked while synchronization is in flight
 
+        Returns
+        -------
+        None
+
+        '''
+        self._asynchronous = asynchronous
+
+    def setPredictionsLogging(self, interval : int):
+        '''
+        Defines how often predictions are logged along with the labels. Logging
+        predictions of every batch is expensive for small models, so it can be
+        sampled or switched off. Loss is logged for every batch in any case.
+
+        Parameters
+        ----------
+        interval - predictions are logged for every interval-th batch, 0 switches logging off
+
+        Returns
+        -------
+        None
+
+        '''
+        self._predictionsInterval = interval
 
     def obtainData(self, example: tuple):
         '''
@@ -323,38 +609,96 @@ class IncrementalLearner(Learner):
         if len(self._trainingBatch) >= self._batchSize:
             currentBatch = self._trainingBatch[:self._batchSize]
             self._trainingBatch = self._trainingBatch[self._batchSize:]
-            self._isTraining = True
-            metrics = self.update(currentBatch)
-            self._seenExamples += len(currentBatch)
-            # first element of metrics is loss value
-            self._learningLogger.logLearnerLoss(metrics[0])
-            # second element of metrics is an array with predictions
-            self._learningLogger.logPredictionsLabels(metrics[1], [t[1] for t in currentBatch])
-            #self.info('STARTTIME_checkLocalCondition: '+str(time.time()))
-            localEvaluateMsg, localConditionHolds = self.checkLocalConditionHolds()
-            #self.info('ENDTIME_checkLocalCondition: '+str(time.time()))
-            self._learningLogger.logViolation(localEvaluateMsg, localConditionHolds)
+            self._trainStep(currentBatch)
+        #self.info('ENDTIME_obtainData: '+str(time.time()))
+
+    def obtainBatch(self, batch: tuple):
+        '''
+        Obtains many examples at once as arrays. The examples are cut into training
+        batches of batchSize without going through single examples, so the arrays
+        are passed to update directly. Training stops as soon as the learner cannot
+        obtain data anymore, e.g., after a violation was reported, the remaining
+        examples are trained on when the next batch arrives.
+
+        Parameters
+        ----------
+        batch - tuple of an array of examples and an array of their labels
+
+        Returns
+        -------
+        None
+
+        '''
+        self._addPendingChunk(batch)
+        while self._pendingCount >= self._batchSize and not self._stop and self.canObtainData():
+            with self._phaseTimer.measure("collate"):
+                currentBatch = self._takePending(self._batchSize)
+            self._trainStep(currentBatch)
+
+    def _trainStep(self, currentBatch):
+        '''
+        Performs one training step followed by logging and checking the local condition.
+        While training and checking condition is happening the flag isTraining set to True,
+        so the model parameters cannot be requested.
+
+        Parameters
+        ----------
+        currentBatch - list of tuples of an example and its label or tuple
+            of an array of examples and an array of their labels
+
+        Returns
+        -------
+        None
+
+        '''
+        self._startTraining()
+        try:
+            self._logPredictions = self._predictionsInterval > 0 and self._updatesCounter % self._predictionsInterval == 0
+            self._updatesCounter += 1
+            with self._phaseTimer.measure("update"):
+                metrics = self.update(currentBatch)
+            if isinstance(currentBatch, tuple):
+                labels = currentBatch[1]
+            else:
+                labels = [t[1] for t in currentBatch]
+            self._seenExamples += len(labels)
+            with self._phaseTimer.measure("logging"):
+                # first element of metrics is loss value
+                self._learningLogger.logLearnerLoss(metrics[0])
+                # second element of metrics is an array with predictions, learners may skip computing it if not logged
+                if self._logPredictions and not metrics[1] is None:
+                    self._learningLogger.logPredictionsLabels(metrics[1], labels)
+            if not self._metrics is None:
+                self._metrics.counter("dlplatform_examples_total").inc(len(labels))
+                self._metrics.counter("dlplatform_updates_total").inc()
+                self._metrics.histogram("dlplatform_loss").observe(metrics[0])
+            with self._phaseTimer.measure("localCondition"):
+                localEvaluateMsg, localConditionHolds = self.checkLocalConditionHolds()
+            with self._phaseTimer.measure("logging"):
+                self._learningLogger.logViolation(localEvaluateMsg, localConditionHolds)
             if not self._stoppingCriterion is None and self._stoppingCriterion(self._seenExamples, time.time()):
                 self.stopExecution()
-            if not localConditionHolds:
+            # in asynchronous mode training goes on while waiting, so a violation must not be reported twice
+            if not localConditionHolds and not self._waitingForAModel:
                 self.reportViolation()
-            # @TODO where does it make more sense - before or after checking local condition
-            self._isTraining = False
-        #self.info('ENDTIME_obtainData: '+str(time.time()))
-
+        finally:
+            self._finishTraining()
 
     def canObtainData(self) -> bool:
         '''
         Obtains the state of the learner
         Requested by the worker before sending the next example for training.
         Returns False if the parameters should be updated or the model is 
-        training currently
+        training currently. In asynchronous mode waiting for an aggregated
+        model does not block training, waiting for the initial model does.
 
         Returns
         -------
         boolean value, defining allowance to accept the next training example
 
         '''
+        if self._syncSnapshot is not None:
+            return not self._isTraining
         return not self._waitingForAModel and not self._isTraining
 
 
@@ -380,12 +724,15 @@ class IncrementalLearner(Learner):
 
         Parameters
         ----------
-        data - training batch
+        data - training batch, either a list of tuples of an example and its label
+            or, if examples are obtained by obtainBatch, a tuple of an array of
+            examples and an array of labels
 
         Returns
         -------
         list - first element is loss suffered on this training step
-                second element are predictions for the batch
+                second element are predictions for the batch, can be None
+                if self._logPredictions is False
 
         '''
 
@@ -439,17 +786,25 @@ class BatchLearner(Learner):
         self._seenExamples = len(self._trainingBatch)
         if not self._stoppingCriterion is None and self._stoppingCriterion(self._seenExamples, time.time()):
             self._parametersRequested = False #the new parameters after training have not yet been sent
-            self._isTraining = True
-            metrics = self.train(self._trainingBatch)
-            # first element of metrics is loss value
-            self._learningLogger.logLearnerLoss(metrics[0])
-            # second element of metrics is an array with predictions
-            self._learningLogger.logPredictionsLabels(metrics[1], [t[1] for t in self._trainingBatch])
-            #batch learners report a violation whenever they finished training. 
-            #The model is send once, aggregated and redistributed, then the learner stops.
-            self.reportViolation()
-            self._batchTrainingCompleted = True
-            self._isTraining = False
+            self._startTraining()
+            try:
+                with self._phaseTimer.measure("update"):
+                    metrics = self.train(self._trainingBatch)
+                with self._phaseTimer.measure("logging"):
+                    # first element of metrics is loss value
+                    self._learningLogger.logLearnerLoss(metrics[0])
+                    # second element of metrics is an array with predictions
+                    self._learningLogger.logPredictionsLabels(metrics[1], [t[1] for t in self._trainingBatch])
+                if not self._metrics is None:
+                    self._metrics.counter("dlplatform_examples_total").inc(len(self._trainingBatch))
+                    self._metrics.counter("dlplatform_updates_total").inc()
+                    self._metrics.histogram("dlplatform_loss").observe(metrics[0])
+                #batch learners report a violation whenever they finished training. 
+                #The model is send once, aggregated and redistributed, then the learner stops.
+                self.reportViolation()
+                self._batchTrainingCompleted = True
+            finally:
+                self._finishTraining()
             
     def isAlive(self):
         '''
@@ -485,13 +840,13 @@ class BatchLearner(Learner):
 
         raise NotImplementedError    
         
-    def answerParameterRequest(self):
+    def answerParameterRequest(self, roundId = None):
         '''
         This function extends the super class "Learner"'s answerParameterRequest to include a stopping condition. 
         If in a BatchLearner a single batch has been processed for training and the parameters have been requested,
         then the execution can be stopped.
         '''
-        Learner.answerParameterRequest(self)
+        Learner.answerParameterRequest(self, roundId)
         self._parametersRequested = True
         if self._batchTrainingCompleted and not self._waitingForAModel:
             self.stopExecution()
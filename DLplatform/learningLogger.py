@@ -18,6 +18,10 @@ class LearningLogger():
     _learnerRegistrationsFile = 'registrations.txt'
     _learnerBalancingRequestFile = 'balancing_requests.txt'
     _learnerSendModelFile = 'send_model.txt'
+    _dataRateFile = 'data_rate.txt'
+    _dataBufferFile = 'data_buffer.txt'
+    _phaseTimingsFile = 'phase_timings.txt'
+    _roundsFile = 'rounds.txt'
     
     def __init__(self, path: str, id, level='NORMAL'):
         '''
@@ -40,6 +44,14 @@ class LearningLogger():
         if not os.path.isdir(self._logpath):
             os.mkdir(self._logpath)
 
+    def getLogPath(self) -> str:
+        '''
+        Returns
+        -------
+        str - directory the logging files are written to, i.e., path/id
+        '''
+        return self._logpath
+
     def logLearnerLoss(self, lossValue: float):
         '''
         Logs loss suffered by a worker
@@ -65,15 +77,16 @@ class LearningLogger():
         logFilePath = os.path.join(self._logpath, self._learnerPredLabelFile)
         with open(logFilePath, 'a') as output:
             for i in range(len(predictions)):
-                if isinstance(labels[i], int) and isinstance(predictions[i], int):
-                    output.write('%.3f\t%s\t%s\n' % (time.time(), str(predictions[i]), str(labels[i])))
-                elif isinstance(labels[i], float) and isinstance(predictions[i], float):
-                    output.write('%.3f\t%s\t%s\n' % (time.time(), str(predictions[i]), str(labels[i])))
-                elif isinstance(labels[i], int) and not isinstance(predictions[i], int):
-                    output.write('%.3f\t%s\t%s\n' % (time.time(), ','.join(map(str, predictions[i])), str(labels[i])))
+                # labels and predictions are scalars or vectors, python or numpy types
+                if np.ndim(predictions[i]) == 0:
+                    prediction = str(predictions[i])
+                else:
+                    prediction = ','.join(map(str, predictions[i]))
+                if np.ndim(labels[i]) == 0:
+                    label = str(labels[i])
                 else:
-                    output.write('%.3f\t%s\t%s\n' % (time.time(),
-                        ','.join(map(str, predictions[i])), ','.join(map(str, labels[i]))))
+                    label = ','.join(map(str, labels[i]))
+                output.write('%.3f\t%s\t%s\n' % (time.time(), prediction, label))
 
     def logViolation(self, localConditionMsg: str, localConditionHolds: bool):
         '''
@@ -262,3 +275,68 @@ class LearningLogger():
             else:
                 output.write('%.3f\t%s\t%s\t%s\t%s\t%s\n' % (time.time(), exchange, topic, str(message_size), direction, workerId))
 
+    def logDataRate(self, targetRate: float, achievedRate: float, sentExamples: int, droppedExamples: int = 0):
+        '''
+        Logs the rate examples are provided with by a data scheduler
+
+        Parameters
+        ----------
+        targetRate in examples per second
+        achievedRate in examples per second delivered to the worker since the last log entry
+        sentExamples - total amount of examples delivered so far
+        droppedExamples - total amount of examples dropped because the buffer of the worker was full
+        '''
+        logFilePath = os.path.join(self._logpath, self._dataRateFile)
+        with open(logFilePath, 'a') as output:
+            output.write('%.3f\t%.3f\t%.3f\t%d\t%d\n' % (time.time(), targetRate, achievedRate, sentExamples, droppedExamples))
+
+    def logDataBuffer(self, occupancy: int, maxBufferSize: int, droppedUpdates: int):
+        '''
+        Logs the state of the data buffer of a worker
+
+        Parameters
+        ----------
+        occupancy - amount of buffered data updates
+        maxBufferSize - limit of the buffer, 0 if there is none
+        droppedUpdates - total amount of data updates dropped by the data scheduler
+        '''
+        logFilePath = os.path.join(self._logpath, self._dataBufferFile)
+        with open(logFilePath, 'a') as output:
+            output.write('%.3f\t%d\t%d\t%d\n' % (time.time(), occupancy, maxBufferSize, droppedUpdates))
+
+    def logRoundEvent(self, roundId: int, event: str, nodes = '', timestamp = None):
+        '''
+        Logs an event of a synchronization round. The coordinator logs receiving
+        violations and replies, balancing requests, aggregation and publishing of
+        the model, workers log receiving requests and models of a round.
+
+        Parameters
+        ----------
+        roundId - identifier of the round
+        event - what happened, e.g., "violation" or "aggregationEnd"
+        nodes - identifier of the node concerned or comma-separated identifiers
+        timestamp - time of the event if it is not now, e.g., when a message was received
+        '''
+        if timestamp is None:
+            timestamp = time.time()
+        logFilePath = os.path.join(self._logpath, self._roundsFile)
+        with open(logFilePath, 'a') as output:
+            output.write('%.6f\t%s\t%s\t%s\n' % (timestamp, str(roundId), event, str(nodes)))
+
+    def logPhaseTimings(self, phase: str, amount: int, total: float, maximum: float, histogram: list):
+        '''
+        Logs the durations of a phase of the learning loop aggregated by a PhaseTimer
+
+        Parameters
+        ----------
+        phase - name of the phase
+        amount - how often the phase was measured
+        total - sum of the durations in seconds
+        maximum - longest duration in seconds
+        histogram - amounts of durations per bucket, bucket b counts durations
+            below 2^b microseconds; only non-empty buckets are written as bucket:amount
+        '''
+        logFilePath = os.path.join(self._logpath, self._phaseTimingsFile)
+        buckets = ','.join('%d:%d' % (b, n) for b, n in enumerate(histogram) if n > 0)
+        with open(logFilePath, 'a') as output:
+            output.write('%.3f\t%s\t%d\t%.6f\t%.6f\t%s\n' % (time.time(), phase, amount, total, maximum, buckets))
@@ -0,0 +1,258 @@
+import bisect
+import math
+import os
+import threading
+import time
+
+def _formatValue(value) -> str:
+    if value is None or math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def _formatLabels(labels) -> str:
+    if len(labels) == 0:
+        return ""
+    escaped = ['%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels]
+    return "{" + ",".join(escaped) + "}"
+
+class Counter():
+    '''
+    Monotonically increasing value, e.g., examples trained on or bytes received.
+    Rates such as examples/s are derived from it by the monitoring system.
+    Instead of being increased, a counter can be given a function that is called
+    when the metrics are exposed, e.g., to read a counter shared with another process.
+    '''
+
+    metricType = "counter"
+
+    def __init__(self, name : str, help : str, lock, function = None):
+        self.name       = name
+        self.help       = help
+        self._lock      = lock
+        self._values    = {}
+        self._function  = function
+
+    def inc(self, amount = 1, labels = None):
+        '''
+        Parameters
+        ----------
+        amount - value to add, has to be non-negative
+        labels - dict of additional labels, e.g., {"kind": "violation"}
+        '''
+        key = () if labels is None else tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self, constantLabels : tuple) -> list:
+        if not self._function is None:
+            try:
+                return [(self.name, constantLabels, self._function())]
+            except NotImplementedError:
+                # e.g., qsize of multiprocessing queues is not available on all platforms
+                return []
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, constantLabels + key, value) for key, value in sorted(values)]
+
+class Gauge(Counter):
+    '''
+    Value that can go up and down, e.g., the depth of a queue. Instead of being set,
+    a gauge can be given a function that is called when the metrics are exposed,
+    which costs nothing on the hot path.
+    '''
+
+    metricType = "gauge"
+
+    def set(self, value, labels = None):
+        key = () if labels is None else tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+class Histogram():
+    '''
+    Distribution of observed values, e.g., losses or durations, as cumulative
+    counts per upper bound of the buckets together with sum and amount.
+    '''
+
+    metricType = "histogram"
+    defaultBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name : str, help : str, lock, buckets = None):
+        self.name       = name
+        self.help       = help
+        self._lock      = lock
+        self._buckets   = tuple(sorted(self.defaultBuckets if buckets is None else buckets))
+        self._counts    = [0] * (len(self._buckets) + 1)
+        self._sum       = 0.0
+
+    def observe(self, value : float):
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def samples(self, constantLabels : tuple) -> list:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += count
+            samples.append((self.name + "_bucket", constantLabels + (("le", _formatValue(bound)),), cumulative))
+        samples.append((self.name + "_sum", constantLabels, total))
+        samples.append((self.name + "_count", constantLabels, cumulative))
+        return samples
+
+class MetricsRegistry():
+    '''
+    Metrics of one process, e.g., a worker or the coordinator, exposed in the
+    Prometheus text format while the process is running, either by a local HTTP
+    endpoint (startHttpServer) or by periodically writing a file (startFileDump).
+    Metrics are created on first use and returned on later calls with the same name,
+    so components can look them up by name on the hot path. All the metrics of a
+    registry carry its constant labels, e.g., {"node": "3"}.
+    '''
+
+    def __init__(self, labels = None):
+        '''
+        Parameters
+        ----------
+        labels - dict of labels added to all the metrics, e.g., the identifier of the node
+
+        Returns
+        -------
+        None
+        '''
+        self._labels    = () if labels is None else tuple(sorted(labels.items()))
+        self._metrics   = {}
+        self._lock      = threading.Lock()
+        self._server    = None
+
+    '''
+    Lock, server and the functions of metrics cannot be pickled, so they are dropped
+    when the registry is sent to another process. Metrics are recreated there on first use.
+    '''
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d['_lock'] = None
+        d['_server'] = None
+        d['_metrics'] = {}
+        return d
+
+    def __setstate__(self, d):
+        d['_lock'] = threading.Lock()
+        self.__dict__.update(d)
+
+    def _getOrCreate(self, cls, name : str, help : str, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, cls(name, help, self._lock, **kwargs))
+        if type(metric) != cls:
+            raise ValueError("Metric " + name + " is a " + metric.metricType + ", not a " + cls.metricType)
+        return metric
+
+    def counter(self, name : str, help = "", function = None) -> Counter:
+        '''
+        Parameters
+        ----------
+        name - name of the metric, ending with _total
+        help - description of the metric
+        function - if given, called for the monotonically increasing value whenever the metrics are exposed
+        '''
+        return self._getOrCreate(Counter, name, help, function = function)
+
+    def gauge(self, name : str, help = "", function = None) -> Gauge:
+        '''
+        Parameters
+        ----------
+        name - name of the metric
+        help - description of the metric
+        function - if given, called for the value whenever the metrics are exposed
+        '''
+        return self._getOrCreate(Gauge, name, help, function = function)
+
+    def histogram(self, name : str, help = "", buckets = None) -> Histogram:
+        return self._getOrCreate(Histogram, name, help, buckets = buckets)
+
+    def expose(self) -> str:
+        '''
+        Returns
+        -------
+        str - all the metrics in the Prometheus text format
+        '''
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            lines.append("# HELP " + name + " " + metric.help.replace('\\', '\\\\').replace('\n', '\\n'))
+            lines.append("# TYPE " + name + " " + metric.metricType)
+            for sampleName, labels, value in metric.samples(self._labels):
+                lines.append(sampleName + _formatLabels(labels) + " " + _formatValue(value))
+        return "\n".join(lines) + "\n"
+
+    def writeFile(self, path : str):
+        '''
+        Writes the metrics to a file, replacing it atomically, so readers never see a partial file
+        '''
+        tmpPath = path + ".tmp"
+        with open(tmpPath, "w") as f:
+            f.write(self.expose())
+        os.replace(tmpPath, path)
+
+    def startFileDump(self, path : str, interval = 10.0):
+        '''
+        Writes the metrics every interval seconds from a daemon thread. Several processes,
+        e.g., all workers of a host, can write their files into one shared directory,
+        which is read by the textfile collector of the Prometheus node exporter.
+
+        Parameters
+        ----------
+        path - file to write, should end with .prom for the textfile collector
+        interval - seconds between writes
+        '''
+        def dump():
+            while True:
+                self.writeFile(path)
+                time.sleep(interval)
+        thread = threading.Thread(target = dump, name = "MetricsFileDump", daemon = True)
+        thread.start()
+
+    def startHttpServer(self, port : int, host = "127.0.0.1"):
+        '''
+        Serves the metrics via HTTP from a daemon thread, e.g., on http://127.0.0.1:port/metrics.
+        Has to be called in the process whose metrics should be served.
+
+        Parameters
+        ----------
+        port - port to listen on, 0 for any free port
+        host - address to listen on, by default only local connections are accepted
+
+        Returns
+        -------
+        int - port the server listens on
+        '''
+        # imported here, since http.server takes long to import and most processes do not serve metrics
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = HTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target = self._server.serve_forever, name = "MetricsHttpServer", daemon = True)
+        thread.start()
+        return self._server.server_address[1]
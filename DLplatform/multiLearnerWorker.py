@@ -0,0 +1,290 @@
+from DLplatform.baseClass import baseClass
+from DLplatform.learning.learner import Learner, IncrementalLearner
+from DLplatform.communicating import Communicator
+from DLplatform.dataprovisioning import DataSource
+from DLplatform.metrics import MetricsRegistry
+
+from collections import OrderedDict
+from multiprocessing import Queue
+import pickle
+import sys
+import time
+
+class MultiLearnerWorker(baseClass):
+    '''
+    Worker that hosts many learners in one process, e.g., for simulating hundreds of nodes on one host.
+    Each learner has its own identifier, data source and protocol state, so for the coordinator
+    it is not different from a learner running in its own Worker. All the learners share one
+    communicator, i.e., one connection and one consuming process, and data is taken directly
+    from the data sources in the worker process instead of separate DataScheduler processes.
+    So a whole group of nodes costs two processes instead of three per node.
+    Examples are provided as fast as the learners consume them, the learners are stepped
+    in turns. Incremental learners get a training batch at once from getNextBatch of their
+    data source and train on it by obtainBatch. Every learner trains its own model, models
+    of identical learners are not stacked and trained together.
+    '''
+
+    def __init__(self, identifier : str):
+        '''
+
+        Initialize a multi learner worker.
+
+        Parameters
+        ----------
+        identifier : str - identifier of the worker itself, used for logging only,
+            learners get their own identifiers in addLearner
+
+        '''
+
+        super().__init__(name = "multiLearnerWorker_" + str(identifier))
+
+        self._identifier            = identifier
+        self._communicator          = None
+        self._learners              = OrderedDict()
+        self._dataSources           = {}
+        self._metrics               = None
+
+        # initializing communication with process of communicator
+        self._communicatorMsgQueue  = Queue()
+
+    def addLearner(self, identifier : str, learner : Learner, dataSource : DataSource):
+        '''
+
+        Adds a learner together with the data source it is trained on.
+
+        Parameters
+        ----------
+        identifier : str - identifier of the node the learner represents, has to be unique among all workers
+        learner
+        dataSource - source of examples for this learner, prepared in the worker process
+
+        Exception
+        --------
+        ValueError
+            in case that identifier is not a string or already used
+            in case that learner is not of type Learner
+            in case that dataSource is not of type DataSource
+        '''
+
+        if not isinstance(identifier, str):
+            error_text = "The attribute identifier is of type " + str(type(identifier)) + " and not of type" + str(str)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        if identifier in self._learners:
+            error_text = "A learner with identifier " + identifier + " was already added"
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        if not isinstance(learner, Learner):
+            error_text = "The attribute learner is of type " + str(type(learner)) + " and not of type" + str(Learner)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        if not isinstance(dataSource, DataSource):
+            error_text = "The attribute dataSource is of type " + str(type(dataSource)) + " and not of type" + str(DataSource)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        learner.setIdentifier(identifier)
+        self._learners[identifier] = learner
+        self._dataSources[identifier] = dataSource
+
+    def getLearners(self) -> OrderedDict:
+        '''
+
+        Get the learners of the worker.
+
+        Returns
+        -------
+        OrderedDict - node identifiers as keys and learners as values
+
+        '''
+
+        return self._learners
+
+    def setCommunicator(self, comm : Communicator):
+        '''
+
+        Set the communicator shared by all the learners of the worker.
+
+        Parameters
+        ----------
+        comm
+
+        Exception
+        --------
+        ValueError
+            in case that comm is not of type Communicator
+        '''
+
+        if not isinstance(comm, Communicator):
+            error_text = "The attribute comm is of type " + str(type(comm)) + " and not of type" + str(Communicator)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._communicator = comm
+
+    def getCommunicator(self) -> Communicator:
+        '''
+
+        Get the communicator of the worker.
+
+        Returns
+        -------
+        Communicator
+
+        '''
+
+        return self._communicator
+
+    def setMetricsRegistry(self, registry : MetricsRegistry):
+        '''
+
+        Sets the MetricsRegistry of the worker process. The queue depth is read when the
+        metrics are exposed, received messages are counted. The registry is handed to all
+        the learners and the communicator when the worker is run, so the metrics of the
+        learners are summed up over the hosted nodes. Exposing the metrics, e.g., by
+        registry.startHttpServer, has to be started in the process running the worker.
+
+        Parameters
+        ----------
+        registry
+
+        '''
+
+        self._metrics = registry
+        registry.gauge("dlplatform_communicator_queue_depth", "Messages from the communicator waiting for the worker",
+                       function = lambda: self._communicatorMsgQueue.qsize())
+        registry.counter("dlplatform_messages_received_total", "Messages received from the coordinator, by kind")
+        registry.counter("dlplatform_message_bytes_received_total", "Bytes of the messages received from the coordinator, by kind")
+
+    def onCommunicatorMessageReceived(self, routing_key, exchange, body):
+        '''
+        Dispatches an incoming message from the coordinator to the learners it is addressed to.
+        The routing key consists of the message type and the identifiers of the receiving nodes,
+        e.g., "newModel.0.3.7" or "request.3". A model sent to several hosted learners is
+        unpickled once, every learner gets its own copy.
+
+        Parameters
+        ----------
+        default parameters from RabbitMQ for callback; body contains the message itself
+
+        Returns
+        -------
+        None
+        '''
+
+        words = routing_key.split('.')
+        if not self._metrics is None:
+            labels = {"kind": words[0]}
+            self._metrics.counter("dlplatform_messages_received_total").inc(labels = labels)
+            self._metrics.counter("dlplatform_message_bytes_received_total").inc(len(body), labels = labels)
+        identifiers = [identifier for identifier in words[1:] if identifier in self._learners]
+
+        if 'newModel' == words[0]:
+            body_size = sys.getsizeof(body)
+            message = pickle.loads(body)
+            param = message['param']
+            flags = message['flags']
+            for i, identifier in enumerate(identifiers):
+                self._communicator.learningLogger.logSendModelMessage(exchange, routing_key, body_size, 'receive', identifier)
+                if 'round' in flags:
+                    self._communicator.learningLogger.logRoundEvent(flags['round'], 'modelReceived', identifier)
+                self._learners[identifier].setModel(param if i == 0 else param.getCopy(), flags)
+        if 'request' == words[0]:
+            # the body is the round of the coordinator, empty for senders without rounds
+            roundId = int(body) if len(body) > 0 else None
+            for identifier in identifiers:
+                self._communicator.learningLogger.logBalancingRequestMessage(exchange, routing_key, 0, 'receive', identifier)
+                if not roundId is None:
+                    self._communicator.learningLogger.logRoundEvent(roundId, 'requestReceived', identifier)
+                self._learners[identifier].answerParameterRequest(roundId)
+        if 'exit' == words[0]:
+            for identifier in identifiers:
+                self.info("Coordinator stops the execution of " + identifier)
+                self._learners[identifier].stopExecution()
+
+    def checkInterProcessCommunication(self):
+        '''
+        Processes all the messages from communicator that arrived since the last check
+
+        Exceptions
+        ----------
+        ValueError
+            in case that the received message doesn't fit with the expected type
+        '''
+
+        while not self._communicatorMsgQueue.empty():
+            recvObj = self._communicatorMsgQueue.get()
+
+            if not isinstance(recvObj, tuple):
+                raise ValueError("worker received recvObj that is not a tuple")
+            elif not len(recvObj) == 3:
+                raise ValueError("worker received recvObj which has length different from 3")
+
+            routing_key, exchange, body = recvObj
+            self.onCommunicatorMessageReceived(routing_key, exchange, body)
+
+    def run(self):
+        '''
+        Starts the communicator consuming messages for all the hosted nodes, prepares
+        the data sources and registers all the learners at the coordinator. Then trains
+        the learners in turns until all of them stopped.
+
+        Exception
+        ---------
+        AttributeError
+            In case that no communicator or no learner is set
+        '''
+
+        if self._communicator is None:
+            self.error("Communicator not set!")
+            raise AttributeError("Communicator not set!")
+
+        if len(self._learners) == 0:
+            self.error("No learner added!")
+            raise AttributeError("No learner added!")
+
+        topics = []
+        for identifier, learner in self._learners.items():
+            learner.setCommunicator(self._communicator)
+            if not self._metrics is None:
+                learner.setMetricsRegistry(self._metrics)
+            topics += ["#." + identifier + ".#", "#." + identifier]
+
+        self._communicator.initiate(exchange = self._communicator._exchangeNodes, topics = topics)
+        self._communicator.daemon = True
+        if not self._metrics is None:
+            self._communicator.setMetricsRegistry(self._metrics)
+        self._communicator.setConnection(consumerConnection = self._communicatorMsgQueue)
+        self._communicator.start()
+
+        for dataSource in self._dataSources.values():
+            dataSource.prepare()
+
+        # initializing of consumer of the communicator takes time...
+        time.sleep(5)
+        for learner in self._learners.values():
+            learner.requestInitialModel()
+
+        # isAlive of some learners stops them as a side effect, so it is asked until it returns False once
+        runningLearners = list(self._learners.keys())
+        while len(runningLearners) > 0:
+            self.checkInterProcessCommunication()
+            for identifier in list(runningLearners):
+                learner = self._learners[identifier]
+                if not learner.isAlive():
+                    runningLearners.remove(identifier)
+                elif learner.canObtainData():
+                    if isinstance(learner, IncrementalLearner):
+                        # examples left over from a batch are kept by the learner and trained on with the next one
+                        learner.obtainBatch(self._dataSources[identifier].getNextBatch(learner.getBatchSize()))
+                    else:
+                        learner.obtainData(self._dataSources[identifier].getNext())
+
+        for dataSource in self._dataSources.values():
+            dataSource.close()
+        self._communicator.terminate()
+        self._communicator.join()
+        print('multi learner worker ', self._identifier, ' shut down.')
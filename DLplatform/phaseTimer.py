@@ -0,0 +1,150 @@
+import threading
+import time
+
+class _DisabledPhase():
+    '''
+    Context manager of a disabled PhaseTimer, does nothing
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+_DISABLED_PHASE = _DisabledPhase()
+
+class _Phase():
+    '''
+    Context manager measuring one execution of a phase
+    '''
+
+    __slots__ = ('_timer', '_phase', '_start')
+
+    def __init__(self, timer, phase : str):
+        self._timer = timer
+        self._phase = phase
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self._timer.record(self._phase, time.perf_counter() - self._start)
+        return False
+
+class PhaseTimer():
+    '''
+    Measures how long the phases of the learning loop take, e.g., receiving data,
+    update, checking the local condition or publishing a message. Durations are
+    aggregated per phase into amount, total, maximum and a histogram with buckets
+    of powers of two microseconds; bucket b counts durations below 2^b microseconds
+    and at least 2^(b-1). Every flushInterval seconds the aggregates are written via
+    LearningLogger.logPhaseTimings and reset.
+    When the timer is disabled, measure returns a shared context manager that does
+    nothing and record returns immediately, so the instrumentation can stay in the
+    code. Phases may be nested, e.g., "collate" is measured within "update".
+    '''
+
+    numBuckets = 32
+
+    def __init__(self, enabled = False, flushInterval = 10.0, learningLogger = None):
+        '''
+        Parameters
+        ----------
+        enabled - if False nothing is measured
+        flushInterval - seconds between writing the aggregates to the learning logger
+        learningLogger - LearningLogger to write to, can be set later
+
+        Returns
+        -------
+        None
+        '''
+        self._enabled           = enabled
+        self._flushInterval     = flushInterval
+        self._learningLogger    = learningLogger
+        # phase -> [amount, total seconds, maximal seconds, histogram]
+        self._statistics        = {}
+        self._lastFlush         = time.perf_counter()
+        # the main loop of the worker and the learner thread may record at the same time
+        self._lock              = threading.Lock()
+
+    '''
+    The lock cannot be pickled, so it is dropped when the timer is sent
+    to another process and created anew there.
+    '''
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d['_lock'] = None
+        return d
+
+    def __setstate__(self, d):
+        d['_lock'] = threading.Lock()
+        self.__dict__.update(d)
+
+    def isEnabled(self) -> bool:
+        return self._enabled
+
+    def setLearningLogger(self, learningLogger):
+        self._learningLogger = learningLogger
+
+    def getLearningLogger(self):
+        return self._learningLogger
+
+    def measure(self, phase : str):
+        '''
+        Context manager measuring the duration of its body, e.g.,
+        with timer.measure("update"): ...
+
+        Parameters
+        ----------
+        phase - name of the phase
+
+        Returns
+        -------
+        context manager
+        '''
+        if not self._enabled:
+            return _DISABLED_PHASE
+        return _Phase(self, phase)
+
+    def record(self, phase : str, duration : float):
+        '''
+        Adds a duration to the aggregates of a phase and writes the aggregates
+        if flushInterval seconds passed since the last time
+
+        Parameters
+        ----------
+        phase - name of the phase
+        duration - seconds
+        '''
+        if not self._enabled:
+            return
+        bucket = min(int(duration * 1e6).bit_length(), self.numBuckets - 1)
+        with self._lock:
+            statistics = self._statistics.get(phase)
+            if statistics is None:
+                statistics = [0, 0.0, 0.0, [0] * self.numBuckets]
+                self._statistics[phase] = statistics
+            statistics[0] += 1
+            statistics[1] += duration
+            if duration > statistics[2]:
+                statistics[2] = duration
+            statistics[3][bucket] += 1
+        if time.perf_counter() - self._lastFlush >= self._flushInterval:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the aggregates of all the phases measured since the last flush
+        to the learning logger and resets them
+        '''
+        with self._lock:
+            statistics = self._statistics
+            self._statistics = {}
+            self._lastFlush = time.perf_counter()
+        if self._learningLogger is None:
+            return
+        for phase in sorted(statistics.keys()):
+            amount, total, maximum, histogram = statistics[phase]
+            self._learningLogger.logPhaseTimings(phase, amount, total, maximum, histogram)
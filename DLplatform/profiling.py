@@ -0,0 +1,238 @@
+'''
+Profiling of the processes of DLplatform.
+
+A Profiler set on a Worker or Coordinator (and handed by them to the data scheduler
+and communicator) runs the main function of each of these processes either under
+cProfile or under a sampling profiler and writes one profile per process when the
+process ends, also when it is terminated. Profiles of several processes are merged by
+
+    python -m DLplatform.profiling <directory or profile files> --output merged
+
+which writes merged.prof from all cProfile profiles (e.g., for snakeviz or pstats)
+and merged.folded from all sampled profiles, a flame graph of all the processes
+in the collapsed stack format of flamegraph.pl and speedscope.
+'''
+
+import argparse
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+
+class _ProfiledCall():
+    '''
+    Picklable callable running a function under a profiler, used to replace
+    the run method of processes
+    '''
+
+    def __init__(self, profiler, function, name : str):
+        self._profiler = profiler
+        self._function = function
+        self._name = name
+
+    def __call__(self):
+        return self._profiler.profile(self._function, self._name)
+
+class _StackSampler():
+    '''
+    Records the stacks of all the threads of the process every interval seconds
+    '''
+
+    def __init__(self, interval : float):
+        self._interval  = interval
+        self._stacks    = {}
+        self._stop      = threading.Event()
+        self._thread    = threading.Thread(target = self._sample, name = "StackSampler", daemon = True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return self._stacks
+
+    def _sample(self):
+        ownId = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for threadId, frame in sys._current_frames().items():
+                if threadId == ownId:
+                    continue
+                stack = []
+                while not frame is None:
+                    code = frame.f_code
+                    stack.append(code.co_name + " (" + os.path.basename(code.co_filename) + ")")
+                    frame = frame.f_back
+                stack.append(names.get(threadId, str(threadId)))
+                key = ";".join(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+
+class Profiler():
+    '''
+    Profiles the run methods of workers, coordinator, data schedulers and communicators.
+    In mode "cprofile" every function call is recorded deterministically, which is exact
+    but slows down python code noticeably. In mode "sampling" the stacks of all the threads
+    are recorded every interval seconds, which costs little and shows where the time goes,
+    including waiting. Profiles are written to the output directory as
+    <name>_<pid>.prof (cprofile) or <name>_<pid>.folded (sampling). Without output directory
+    workers and coordinator use the directory of their learning logger.
+    '''
+
+    def __init__(self, mode = "cprofile", interval = 0.005, outputDir = None):
+        '''
+        Parameters
+        ----------
+        mode - "cprofile" or "sampling"
+        interval - seconds between samples in mode "sampling"
+        outputDir - directory of the profiles
+
+        Exception
+        ---------
+        ValueError
+            in case mode is unknown
+        '''
+        if not mode in ["cprofile", "sampling"]:
+            raise ValueError("The attribute mode should be 'cprofile' or 'sampling', it is " + str(mode))
+
+        self._mode          = mode
+        self._interval      = interval
+        self._outputDir     = outputDir
+
+    def getOutputDir(self) -> str:
+        return self._outputDir
+
+    def setOutputDir(self, outputDir : str):
+        self._outputDir = outputDir
+
+    def wrap(self, function, name : str):
+        '''
+        Returns
+        -------
+        callable running function under this profiler, e.g., to replace the run method of a process
+        '''
+        return _ProfiledCall(self, function, name)
+
+    def profile(self, function, name : str):
+        '''
+        Runs function under the profiler and writes the profile when it returns or raises.
+        In the main thread SIGTERM is handled during the run by writing the profile and
+        exiting right away, as without handler, so that terminated processes, e.g., data
+        schedulers and communicators, write their profiles as well.
+
+        Parameters
+        ----------
+        function - function without arguments, e.g., the run method of a worker
+        name - name of the profile, e.g., "worker_3"
+
+        Returns
+        -------
+        the result of function
+        '''
+        if self._mode == "cprofile":
+            profile = cProfile.Profile()
+        else:
+            sampler = _StackSampler(self._interval)
+        written = []
+
+        def write():
+            if len(written) > 0:
+                return
+            written.append(True)
+            if self._mode == "cprofile":
+                profile.disable()
+                profile.dump_stats(self._profilePath(name, ".prof"))
+            else:
+                self._writeStacks(sampler.stop(), self._profilePath(name, ".folded"))
+
+        def onTerminate(signum, frame):
+            # raising an exception instead could leave blocking calls, e.g., on manager
+            # proxies, in a state in which cleanup code hangs
+            write()
+            os._exit(128 + signum)
+
+        previousHandler = None
+        if threading.current_thread() is threading.main_thread():
+            previousHandler = signal.signal(signal.SIGTERM, onTerminate)
+        if self._mode == "cprofile":
+            profile.enable()
+        else:
+            sampler.start()
+        try:
+            return function()
+        finally:
+            write()
+            if not previousHandler is None:
+                signal.signal(signal.SIGTERM, previousHandler)
+
+    def _profilePath(self, name : str, extension : str) -> str:
+        outputDir = "." if self._outputDir is None else self._outputDir
+        return os.path.join(outputDir, name + "_" + str(os.getpid()) + extension)
+
+    def _writeStacks(self, stacks : dict, path : str):
+        with open(path, "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(stack + " " + str(count) + "\n")
+
+def mergeProfiles(paths : list, output : str) -> list:
+    '''
+    Merges cProfile profiles (.prof) into output.prof and sampled profiles (.folded)
+    into output.folded. In the merged flame graph the stacks of every process
+    start with the name of its profile.
+
+    Parameters
+    ----------
+    paths - profile files or directories searched recursively for them
+    output - path of the merged profiles without extension
+
+    Returns
+    -------
+    list - paths of the written files
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names)]
+        else:
+            files.append(path)
+    cProfiles = [f for f in files if f.endswith(".prof") and os.path.abspath(f) != os.path.abspath(output + ".prof")]
+    sampled = [f for f in files if f.endswith(".folded") and os.path.abspath(f) != os.path.abspath(output + ".folded")]
+
+    written = []
+    if len(cProfiles) > 0:
+        stats = pstats.Stats(cProfiles[0])
+        for f in cProfiles[1:]:
+            stats.add(f)
+        stats.dump_stats(output + ".prof")
+        written.append(output + ".prof")
+    if len(sampled) > 0:
+        stacks = {}
+        for f in sampled:
+            process = os.path.splitext(os.path.relpath(f, os.path.commonpath(sampled) if len(sampled) > 1 else os.path.dirname(f)))[0]
+            with open(f) as lines:
+                for line in lines:
+                    stack, count = line.rstrip("\n").rsplit(" ", 1)
+                    key = process.replace(";", "_") + ";" + stack
+                    stacks[key] = stacks.get(key, 0) + int(count)
+        with open(output + ".folded", "w") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(stack + " " + str(count) + "\n")
+        written.append(output + ".folded")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description = "Merges the profiles of DLplatform processes")
+    parser.add_argument("paths", nargs = "+", help = "profile files or directories containing them, e.g., the log directory of a run")
+    parser.add_argument("--output", default = "merged", help = "path of the merged profiles without extension")
+    args = parser.parse_args()
+    written = mergeProfiles(args.paths, args.output)
+    if len(written) == 0:
+        print("no profiles found")
+    for path in written:
+        print("written " + path)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from DLplatform.synchronizing.synchronizer import Synchronizer
+from DLplatform.synchronizing.deltaController import AdaptiveDeltaController
 from DLplatform.synchronizing.dynamic import DynamicHedgeSync, DynamicSync
-from DLplatform.synchronizing.periodic import PeriodicSync
+from DLplatform.synchronizing.periodic import PeriodicSync, BoundedStalenessPeriodicSync
 from DLplatform.synchronizing.nosync import NoSync
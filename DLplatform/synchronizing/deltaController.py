@@ -0,0 +1,145 @@
+from DLplatform.baseClass import baseClass
+from DLplatform.parameters import Parameters
+
+from collections import deque
+from typing import List
+import numpy as np
+import pickle
+import time
+
+class AdaptiveDeltaController(baseClass):
+    '''
+    Adapts the divergence threshold delta of dynamic synchronization protocols
+    to a communication budget. The controller runs on the coordinator and is
+    called by the synchronizer every time an averaged model is computed.
+    It keeps a smoothed estimate of the observed communication rate (synchronizations
+    or bytes per second) and moves delta multiplicatively towards the value that
+    meets the budget: delta is increased when communication is above the budget and
+    decreased when it is below. The distribution of the divergences of the
+    synchronized models from the averaged model is tracked as well.
+    The synchronizer pushes the new threshold to the workers in the flags of
+    the averaged model message.
+    '''
+
+    def __init__(self, targetRate : float, unit = "syncs", gain = 0.5, smoothing = 0.3, maxStep = 2.0,
+                 minDelta = 0.0, maxDelta = float("inf"), historySize = 1000, name = "AdaptiveDeltaController"):
+        '''
+        Initialize BaseClass parent with name AdaptiveDeltaController
+
+        Parameters
+        ----------
+        targetRate - communication budget per second, measured in unit
+        unit - "syncs" for the amount of synchronizations or "bytes" for the amount
+            of bytes sent and received by the coordinator while synchronizing
+        gain - exponent of the multiplicative update, larger values adapt faster
+        smoothing - weight of the newest observation in the moving average of the rate
+        maxStep - maximal factor by which delta is changed in one update
+        minDelta, maxDelta - bounds for the threshold
+        historySize - amount of last observed divergences kept
+
+        Returns
+        -------
+        None
+
+        Exception
+        ---------
+        ValueError
+            in case targetRate is not positive or unit is unknown
+        '''
+        baseClass.__init__(self, name = name)
+
+        if not targetRate > 0:
+            error_text = "The attribute targetRate should be positive, it is " + str(targetRate)
+            self.error(error_text)
+            raise ValueError(error_text)
+        if not unit in ["syncs", "bytes"]:
+            error_text = "The attribute unit should be 'syncs' or 'bytes', it is " + str(unit)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._targetRate        = targetRate
+        self._unit              = unit
+        self._gain              = gain
+        self._smoothing         = smoothing
+        self._maxStep           = maxStep
+        self._minDelta          = minDelta
+        self._maxDelta          = maxDelta
+        self._observedRate      = None
+        self._lastUpdateTime    = None
+        self._modelSize         = None
+        self._divergences       = deque(maxlen = historySize)
+
+    def update(self, delta : float, params : List[Parameters], newModel : Parameters, amountReceivers : int) -> float:
+        '''
+        Registers a synchronization and returns the adapted threshold.
+
+        Parameters
+        ----------
+        delta - current threshold
+        params - parameters of the nodes that took part in the synchronization
+        newModel - averaged model
+        amountReceivers - amount of nodes the averaged model is sent to
+
+        Returns
+        -------
+        float - new threshold
+        '''
+        for param in params:
+            self._divergences.append(param.distance(newModel)**2)
+
+        if self._unit == "bytes":
+            if self._modelSize is None:
+                # all models have the same structure, so their size is measured once
+                self._modelSize = len(pickle.dumps(newModel))
+            cost = self._modelSize * (len(params) + amountReceivers)
+        else:
+            cost = 1
+
+        now = time.time()
+        if self._lastUpdateTime is None:
+            # the first synchronization gives no rate yet
+            self._lastUpdateTime = now
+            return delta
+        elapsed = max(now - self._lastUpdateTime, 1e-6)
+        self._lastUpdateTime = now
+
+        rate = cost / elapsed
+        if self._observedRate is None:
+            self._observedRate = rate
+        else:
+            self._observedRate = self._smoothing * rate + (1.0 - self._smoothing) * self._observedRate
+
+        factor = (self._observedRate / self._targetRate)**self._gain
+        factor = min(max(factor, 1.0 / self._maxStep), self._maxStep)
+        newDelta = float(delta * factor)
+        newDelta = min(max(newDelta, self._minDelta), self._maxDelta)
+        self.info("Adapted delta from " + str(delta) + " to " + str(newDelta) + ", observed rate " + str(self._observedRate))
+        return newDelta
+
+    def getObservedRate(self) -> float:
+        '''
+        Returns
+        -------
+        float - smoothed communication rate in unit per second, None before the second synchronization
+        '''
+        return self._observedRate
+
+    def getDivergenceQuantiles(self, quantiles = (0.5, 0.9, 0.99)) -> dict:
+        '''
+        Quantiles of the squared distances of the synchronized models from the averaged ones.
+
+        Parameters
+        ----------
+        quantiles - quantiles to compute
+
+        Returns
+        -------
+        dict - quantile as key and squared distance as value, empty if nothing was observed
+        '''
+        if len(self._divergences) == 0:
+            return {}
+        values = np.quantile(np.asarray(self._divergences), quantiles)
+        return dict(zip(quantiles, values))
+
+    def __str__(self):
+        return "Adaptive delta controller, target " + str(self._targetRate) + " " + self._unit + "/s"
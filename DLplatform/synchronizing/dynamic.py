@@ -1,6 +1,8 @@
 
 from DLplatform.synchronizing.synchronizer import Synchronizer
 from DLplatform.parameters import Parameters
+from DLplatform.synchronizing.deltaController import AdaptiveDeltaController
+from DLplatform.synchronizing.sketching import RandomProjectionSketch
 
 from typing import List
 import numpy as np
@@ -14,13 +16,20 @@ class DynamicSync(Synchronizer):
     a violation occurs. This is the most basic form of resolution protocol.
     '''
 
-    def __init__(self, delta: float, name = "DynamicSync"):
+    def __init__(self, delta: float, sketchDim = None, sketchTolerance = 0.1, name = "DynamicSync"):
         '''
         Initialize BaseClass parent with name DynamicSync
 
         Parameters
         ----------
         delta - sets the maximum divergence threshold
+        sketchDim - if set, the local condition is checked approximately on a random
+            projection of this dimension of the difference between current and reference
+            model, which the learner keeps up to date (PyTorchNN and KerasNN add the changes
+            of their model since the last check), see evaluateLocalSketch. Exact
+            divergence is only computed when the estimate is within sketchTolerance * delta
+            from the threshold
+        sketchTolerance - relative margin around delta in which the estimate is verified exactly
 
         Returns
         -------
@@ -28,10 +37,178 @@ class DynamicSync(Synchronizer):
         '''
         Synchronizer.__init__(self, name = name)
         self._delta = delta
+        self._deltaController = None
+        self._initSketch(sketchDim, sketchTolerance)
+
+    def _initSketch(self, sketchDim, sketchTolerance):
+        '''
+        Sets up the optional random projection used for approximate local condition checks
+        '''
+        self._sketch = None if sketchDim is None else RandomProjectionSketch(sketchDim)
+        self._sketchTolerance = sketchTolerance
+        # sketch of current minus reference model, None until the learner reset it
+        self._divergenceSketch = None
+
+    def isSketched(self) -> bool:
+        '''
+        Returns
+        -------
+        bool - True if the local condition is checked on sketches, see evaluateLocalSketch
+        '''
+        return not self._sketch is None
+
+    def resetSketch(self, dim : int):
+        '''
+        Called by the learner when its model became the reference model, i.e., their
+        difference is zero, before it reports the changes of its model by updateSketch.
+
+        Parameters
+        ----------
+        dim - amount of parameters of the model
+        '''
+        if self._sketch is None:
+            return
+        self._sketch.prepare(dim)
+        self._divergenceSketch = np.zeros(self._sketch.getSketchDim())
+
+    def updateSketch(self, delta : np.ndarray, indices : np.ndarray = None):
+        '''
+        Adds a change of the flattened model, e.g., of one training step, to the sketch
+        of the difference from the reference model. Costs one pass over the changed
+        coordinates, so learners with sparse updates pass only those.
+
+        Parameters
+        ----------
+        delta - change of the parameters, dense or the changes of the coordinates in indices
+        indices - changed coordinates, None for a dense change
+        '''
+        if not self._divergenceSketch is None:
+            self._sketch.accumulate(self._divergenceSketch, delta, indices)
+
+    def _checkNotSketched(self):
+        '''
+        Sketches of full models are not cheaper than the exact divergence, so with
+        sketchDim the learner has to keep the sketch up to date and use evaluateLocalSketch
+        '''
+        if not self._sketch is None:
+            error_text = "The synchronizer is set up with sketchDim, the learner has to report its changes by updateSketch and check the local condition with evaluateLocalSketch"
+            self.error(error_text)
+            raise ValueError(error_text)
+
+    def setDelta(self, delta: float):
+        '''
+        Setter for the divergence threshold. Called on the workers
+        when coordinator pushes an adapted threshold.
+
+        Parameters
+        ----------
+        delta - maximum divergence threshold
+
+        Returns
+        -------
+        None
+        '''
+        self._delta = delta
+        self._adaptedDelta = delta
+
+    def getDelta(self) -> float:
+        '''
+        Getter for the divergence threshold
+
+        Returns
+        -------
+        float - maximum divergence threshold currently used
+        '''
+        return self._delta
+
+    def setDeltaController(self, controller : AdaptiveDeltaController):
+        '''
+        Setter for a controller that adapts delta to a communication budget.
+        Used on the coordinator only, adapted threshold is sent to the workers
+        in the flags of the averaged model with key "delta" on full synchronizations.
+
+        Parameters
+        ----------
+        controller - AdaptiveDeltaController
+
+        Returns
+        -------
+        None
+
+        Exception
+        --------
+        ValueError
+            in case that controller is not an AdaptiveDeltaController
+        '''
+        if not isinstance(controller, AdaptiveDeltaController):
+            error_text = "The attribute controller is of type " + str(type(controller)) + " and not of type" + str(AdaptiveDeltaController)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._deltaController = controller
+        # threshold proposed by the controller, taken into use with the next full synchronization
+        self._adaptedDelta = self._delta
+
+    def _adaptDelta(self, params: List[Parameters], newModel: Parameters, amountReceivers: int, flags: dict) -> dict:
+        '''
+        Lets the delta controller, if set, adapt the threshold after a synchronization.
+        Every synchronization is registered with the controller, but the adapted threshold
+        is only used from a full synchronization on, when it is added to the flags sent
+        along with the averaged model to all the nodes. After a local balancing only some
+        nodes receive a model, so coordinator and workers keep the old threshold until then.
+
+        Returns
+        -------
+        flags dictionary
+        '''
+        if not self._deltaController is None:
+            self._adaptedDelta = self._deltaController.update(self._adaptedDelta, params, newModel, amountReceivers)
+            if flags.get("setReference", False):
+                self._delta = self._adaptedDelta
+                flags["delta"] = self._delta
+        return flags
 
     def evaluateLocal(self, modelParam, refParam):
+        self._checkNotSketched()
         currentDivergence = self._aggregator.calculateDivergence(modelParam, refParam)
         return str(currentDivergence) + "<=" + str(self._delta), currentDivergence <= self._delta
+
+    def evaluateLocalDistance(self, squaredDistance: float):
+        self._checkNotSketched()
+        currentDivergence = self._aggregator.calculateDivergenceFromSquaredDistance(squaredDistance)
+        return str(currentDivergence) + "<=" + str(self._delta), currentDivergence <= self._delta
+
+    def evaluateLocalSketch(self, exactSquaredDistance):
+        '''
+        Checks the local condition on the sketch of the difference between current and
+        reference model kept up to date by updateSketch, which costs O(sketchDim).
+        Only if the estimate is within sketchTolerance * delta from the threshold, the
+        exact distance is computed.
+
+        Parameters
+        ----------
+        exactSquaredDistance - function without arguments returning the exact squared
+            euclidean distance between current and reference model
+
+        Returns
+        -------
+        message for logging and if local condition holds
+
+        Exception
+        ---------
+        ValueError
+            in case sketchDim is not set or resetSketch was not called yet
+        '''
+        if self._divergenceSketch is None:
+            error_text = "No sketch of the divergence available, sketchDim has to be set and resetSketch called with the reference model"
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        currentDivergence = self._aggregator.calculateDivergenceFromSquaredDistance(float(np.dot(self._divergenceSketch, self._divergenceSketch)))
+        if abs(currentDivergence - self._delta) <= self._sketchTolerance * self._delta:
+            # estimate is too close to the threshold to decide on it
+            currentDivergence = self._aggregator.calculateDivergenceFromSquaredDistance(exactSquaredDistance())
+        return str(currentDivergence) + "<=" + str(self._delta), currentDivergence <= self._delta
     
     def evaluate(self, nodesDict, activeNodes: List[str]) -> (List[str], Parameters):
         '''
@@ -70,7 +247,8 @@ class DynamicSync(Synchronizer):
                     # not all nodes for which parameters have been requested have answered. Thus, we wait.
                     return [], None, {}
             newModel = self._aggregator(list(nodesDict.values()))
-            return activeNodes, newModel, {"setReference":True}
+            flags = self._adaptDelta(list(nodesDict.values()), newModel, len(activeNodes), {"setReference":True})
+            return activeNodes, newModel, flags
         else:
             # there is a violation and we are not waiting for requested models. Thus we trigger a full synchronization.
             return activeNodes, None, {}
@@ -90,7 +268,7 @@ class DynamicHedgeSync(DynamicSync):
             If that still is unsuccessful, a full synchronization is triggered.
     '''
 
-    def __init__(self, delta: float, refPoint = None, name = "DynamicHedgeSync"):
+    def __init__(self, delta: float, refPoint = None, sketchDim = None, sketchTolerance = 0.1, name = "DynamicHedgeSync"):
         '''
         Initialize BaseClass parent with name DynamicHedgeSync
         Sets delta and refPoint
@@ -100,6 +278,7 @@ class DynamicHedgeSync(DynamicSync):
         delta - sets the maximum divergence threshold
         refPoint - sets the reference model against which the averaged parameters
             are checked - if violation still occurs
+        sketchDim, sketchTolerance - approximate local condition checks, see DynamicSync
 
         Returns
         -------
@@ -108,10 +287,8 @@ class DynamicHedgeSync(DynamicSync):
         Synchronizer.__init__(self, name = name)
         self._delta = delta
         self._refPoint = refPoint
-
-    def evaluateLocal(self, modelParam, refParam):
-        currentDivergence = self._aggregator.calculateDivergence(modelParam, refParam)
-        return str(currentDivergence) + "<=" + str(self._delta), currentDivergence <= self._delta
+        self._deltaController = None
+        self._initSketch(sketchDim, sketchTolerance)
 
     def evaluate(self, nodesDict, activeNodes: List[str]) -> (List[str], Parameters):
         '''
@@ -150,7 +327,8 @@ class DynamicHedgeSync(DynamicSync):
             #i.e., a full sync was triggered and we have received all models.
             newModel = self._aggregator(list(nodesDict.values()))
             self._refPoint = newModel.getCopy()
-            return activeNodes, newModel, {"setReference":True}
+            flags = self._adaptDelta(list(nodesDict.values()), newModel, len(activeNodes), {"setReference":True})
+            return activeNodes, newModel, flags
         else:
             #first, try local balancing:
             newModel = self._aggregator(list(nodesDict.values()))
@@ -161,7 +339,8 @@ class DynamicHedgeSync(DynamicSync):
             if dist <= self._delta:
                 # updating only active nodes
                 updateNodes = list(set(list(nodesDict.keys())).intersection(set(activeNodes)))
-                return updateNodes, newModel, {}
+                flags = self._adaptDelta(list(nodesDict.values()), newModel, len(updateNodes), {})
+                return updateNodes, newModel, flags
             else:
                 # allow to request for balancing even inactive nodes
                 requestSet = self.augmentBalancingSet(list(nodesDict.keys()), activeNodes)
@@ -193,7 +372,7 @@ class DynamicHedgeSync(DynamicSync):
         if len(potentialNodes) <= requiredAmount:
             newNodes = potentialNodes
         else:
-            newNodes = random.sample(potentialNodes, requiredAmount)
+            newNodes = random.sample(sorted(potentialNodes), requiredAmount)
         return newNodes
     
     def __str__(self):
@@ -1,6 +1,8 @@
 from DLplatform.synchronizing.synchronizer import Synchronizer
 from DLplatform.parameters import Parameters
+from DLplatform.aggregating import Aggregator, Average
 from typing import List
+import math
 
 class PeriodicSync(Synchronizer):
     '''
@@ -47,3 +49,122 @@ class PeriodicSync(Synchronizer):
 
     def __str__(self):
         return "Periodic synchronization"
+
+class BoundedStalenessPeriodicSync(PeriodicSync):
+    '''
+
+    Periodic synchronization that does not wait for the slowest node. Aggregation is performed
+    as soon as a quorum of the active nodes reported their models, only these nodes receive the
+    averaged model. Nodes that report late are folded into a later round. The staleness of a
+    model is the amount of aggregations performed since its node received its last model.
+    Models that are more than maxStaleness rounds old are dropped from the aggregation. With
+    stalePolicy "discount" the remaining models are additionally weighted by 1/(1+staleness).
+    If all the reported models are too old, nothing is aggregated and their nodes receive
+    the latest averaged model instead, so that they catch up without waiting for fresh models.
+
+    '''
+    def __init__(self, quorum = 1.0, maxStaleness = None, stalePolicy = "drop", name = "BoundedStalenessPeriodicSync"):
+        '''
+
+        Parameters
+        ----------
+        quorum - fraction of the active nodes that have to report before aggregation is performed
+        maxStaleness - maximal amount of rounds a model can lag behind to be aggregated, None for no bound
+        stalePolicy - "drop" to aggregate all the models uniformly, "discount" to weight them down by staleness
+
+        Exception
+        ---------
+        ValueError
+            in case quorum is not in (0, 1] or stalePolicy is unknown
+        '''
+        PeriodicSync.__init__(self, name = name)
+
+        if not (0.0 < quorum <= 1.0):
+            error_text = "The attribute quorum should be in (0, 1], it is " + str(quorum)
+            self.error(error_text)
+            raise ValueError(error_text)
+        if not stalePolicy in ["drop", "discount"]:
+            error_text = "The attribute stalePolicy should be 'drop' or 'discount', it is " + str(stalePolicy)
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        self._quorum        = quorum
+        self._maxStaleness  = maxStaleness
+        self._stalePolicy   = stalePolicy
+        # amount of aggregations performed so far and the round in which each node got its last model
+        self._round         = 0
+        self._nodesRound    = {}
+        # latest averaged model, sent to nodes that only reported too old models
+        self._lastModel     = None
+
+    def setAggregator(self, agg : Aggregator):
+        '''
+        Setter for an aggregator. Discounting stale models requires
+        an aggregator that supports weights, i.e., Average.
+
+        Exception
+        --------
+        ValueError
+            in case that agg does not support weighted aggregation, but stalePolicy is "discount"
+        '''
+        if self._stalePolicy == "discount" and not isinstance(agg, Average):
+            error_text = "Stale policy 'discount' requires aggregator of type " + str(Average) + ", not " + str(type(agg))
+            self.error(error_text)
+            raise ValueError(error_text)
+
+        PeriodicSync.setAggregator(self, agg)
+
+    def evaluate(self, nodesDict, activeNodes: List[str]) -> (List[str], Parameters):
+        '''
+
+        Bounded staleness synchronization mechanism. This method is called by the coordinator during the balancing process.
+
+        Parameters
+        ----------
+        nodesDict - dictionary of node identifiers as keys and their parameters as values that are in violation or requested for balancing
+        activeNodes - list of nodes' identifiers that are active currently
+
+        Returns
+        -------
+        list of node identifiers that receive the averaged model after aggregation is performed
+        parameters of the averaged model
+
+        '''
+
+        if self._aggregator is None:
+            self.error("No aggregator is set")
+            raise AttributeError("No aggregator is set")
+
+        if len(nodesDict) < max(1, math.ceil(self._quorum * len(activeNodes))):
+            return [], None, {}
+
+        params = []
+        weights = []
+        for nodeId, param in nodesDict.items():
+            # nodes that did not receive an averaged model yet are still training on the initial one
+            staleness = self._round - self._nodesRound.get(nodeId, 0)
+            if self._maxStaleness is not None and staleness > self._maxStaleness:
+                continue
+            params.append(param)
+            weights.append(1.0 / (1.0 + staleness))
+        nodes = list(nodesDict.keys())
+        if len(params) == 0:
+            # all the reported models are too old to be aggregated, there was an aggregation
+            # since they are older than maxStaleness rounds, so the nodes get its model
+            for nodeId in nodes:
+                self._nodesRound[nodeId] = self._round
+            return nodes, self._lastModel, {}
+
+        if self._stalePolicy == "discount":
+            newModel = self._aggregator(params, weights)
+        else:
+            newModel = self._aggregator(params)
+
+        self._round += 1
+        self._lastModel = newModel
+        for nodeId in nodes:
+            self._nodesRound[nodeId] = self._round
+        return nodes, newModel, {}
+
+    def __str__(self):
+        return "Bounded staleness periodic synchronization, quorum=" + str(self._quorum) + ", maxStaleness=" + str(self._maxStaleness) + ", stalePolicy=" + self._stalePolicy
@@ -0,0 +1,85 @@
+import numpy as np
+
+class RandomProjectionSketch():
+    '''
+    Sparse Johnson-Lindenstrauss projection (count sketch) of flattened model parameters.
+    Every coordinate of a vector is multiplied by a random sign and added to one of
+    sketchDim buckets. The projection is linear and, since the signs are independent,
+    the squared norm of the sketch is an unbiased estimate of the squared norm of the
+    vector - also when coordinates are assigned to buckets by position instead of a
+    random hash. So distances between models can be estimated from the distances of
+    their sketches, and the sketch of a model can be kept up to date from the changes
+    of its parameters. The signs are drawn once per dimension and stored as int8.
+    '''
+
+    def __init__(self, sketchDim : int = 4096, seed : int = 0):
+        '''
+        Parameters
+        ----------
+        sketchDim - dimension of the sketch
+        seed - seed of the random projection, sketches are only comparable for the same seed
+
+        Returns
+        -------
+        None
+        '''
+        self._sketchDim     = sketchDim
+        self._seed          = seed
+        self._dim           = None
+        self._signs         = None
+
+    def prepare(self, dim : int):
+        '''
+        Draws the signs for vectors of dimension dim, if not done yet
+        '''
+        if self._dim == dim:
+            return
+        randomState = np.random.RandomState(self._seed)
+        self._signs = (randomState.randint(0, 2, size = dim) * 2 - 1).astype(np.int8)
+        self._dim = dim
+
+    def __call__(self, v : np.ndarray) -> np.ndarray:
+        '''
+        Computes the sketch of a flat vector
+
+        Parameters
+        ----------
+        v - 1D numpy array
+
+        Returns
+        -------
+        1D numpy array of length sketchDim
+        '''
+        sketch = np.zeros(self._sketchDim)
+        self.accumulate(sketch, v)
+        return sketch
+
+    def accumulate(self, sketch : np.ndarray, delta : np.ndarray, indices : np.ndarray = None):
+        '''
+        Adds the sketch of a change of a vector to the sketch of the vector, which by
+        linearity gives the sketch of the changed vector. A dense change costs one pass
+        over its coordinates, a sparse change only over the changed ones.
+
+        Parameters
+        ----------
+        sketch - sketch to update in place
+        delta - change of the vector, either dense or, if indices are given, the
+            changes of the coordinates in indices
+        indices - 1D integer array of the changed coordinates, None for a dense change
+
+        Returns
+        -------
+        None
+        '''
+        if indices is None:
+            self.prepare(delta.shape[0])
+            signed = self._signs * delta
+            # coordinate i goes to bucket i mod sketchDim
+            fullRows = (self._dim // self._sketchDim) * self._sketchDim
+            sketch += signed[:fullRows].reshape(-1, self._sketchDim).sum(axis = 0)
+            sketch[:self._dim - fullRows] += signed[fullRows:]
+        else:
+            np.add.at(sketch, indices % self._sketchDim, self._signs[indices] * delta)
+
+    def getSketchDim(self) -> int:
+        return self._sketchDim
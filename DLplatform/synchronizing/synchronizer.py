@@ -76,6 +76,33 @@ class Synchronizer(baseClass):
 
         raise NotImplementedError
 
+    def isSketched(self) -> bool:
+        '''
+        Returns
+        -------
+        bool - True if learners have to check the local condition on sketches, see DynamicSync.evaluateLocalSketch
+        '''
+
+        return False
+
+    def evaluateLocalDistance(self, squaredDistance : float):
+        '''
+        Same as evaluateLocal, but called by learners that keep track of the
+        squared euclidean distance between their model and the reference model
+        themselves instead of handing over both flattened models.
+        Protocols that do not depend on the divergence just ignore the distance.
+
+        Parameters
+        ----------
+        squaredDistance - squared euclidean distance between current and reference model
+
+        Returns
+        -------
+        message for logging and if local condition holds
+        '''
+
+        return self.evaluateLocal(None, None)
+
     def evaluate(self, nodesDict, activeNodes: List[str]) -> (List[int], Parameters):
         '''
         Main method that should be implemented by a particular
@@ -2,10 +2,15 @@ from DLplatform.baseClass import baseClass
 from DLplatform.learning.learner import Learner
 from DLplatform.communicating import Communicator
 from DLplatform.dataprovisioning import DataScheduler
+from DLplatform.phaseTimer import PhaseTimer
+from DLplatform.metrics import MetricsRegistry
+from DLplatform.profiling import Profiler
 
 import time
 import pickle
-from multiprocessing import Pipe, Queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing import BoundedSemaphore, Pipe, Queue, Value
 from pickle import loads
 import sys
 
@@ -14,7 +19,8 @@ class Worker(baseClass):
 
     '''
 
-    def __init__(self, identifier : str):
+    def __init__(self, identifier : str, threadedTraining = False, maxBufferSize = None, bufferPolicy = "block",
+                 bufferReportInterval = 10.0):
         '''
 
         Initialize a worker.
@@ -22,11 +28,22 @@ class Worker(baseClass):
         Parameters
         ----------
         identifier : str
+        threadedTraining : bool - if True, the learner is run on a dedicated thread: training steps
+            and handling of coordinator messages are executed there one after another, while
+            the main loop keeps receiving data and messages. A balancing request is then answered
+            right after the current training step instead of after the next poll of the main loop.
+        maxBufferSize : int - maximal amount of data updates sent by the data scheduler and not yet
+            handed to the learner, None for no limit. Counts messages, i.e., batches if the data
+            scheduler has a batchSize.
+        bufferPolicy : str - what the data scheduler does when the buffer is full: "block" waits until
+            the worker consumed data, "drop" discards the data update
+        bufferReportInterval : float - seconds between logging buffer occupancy and amount of dropped updates
 
         Exception
         --------
         ValueError
             in case that identifier is not a string
+            in case that bufferPolicy is neither "block" nor "drop"
         '''
 
         super().__init__(name = "worker_" + str(identifier))
@@ -35,7 +52,35 @@ class Worker(baseClass):
         self._communicator          = None
         self._dataScheduler         = None
         self._identifier            = identifier
-        self._dataBuffer            = []
+        self._dataBuffer            = deque()
+        self._threadedTraining      = threadedTraining
+        # executor is created in the worker process, see run
+        self._learnerExecutor       = None
+        self._trainingTask          = None
+        self._learnerTasks          = []
+        self._learnerAlive          = True
+        # set by the learner thread after every task, so the main loop knows if training can go on
+        self._learnerReady          = False
+        # set in run: True if the data scheduler sends batches instead of single examples
+        self._batchedData           = False
+
+        if not bufferPolicy in ["block", "drop"]:
+            error_text = "The attribute bufferPolicy should be 'block' or 'drop', it is " + str(bufferPolicy)
+            self.error(error_text)
+            raise ValueError(error_text)
+        # slots of the bounded buffer are acquired by the data scheduler and released when data is consumed
+        self._maxBufferSize         = maxBufferSize
+        self._bufferPolicy          = bufferPolicy
+        self._bufferSlots           = None if maxBufferSize is None else BoundedSemaphore(maxBufferSize)
+        self._droppedUpdates        = Value('l', 0)
+        self._bufferReportInterval  = bufferReportInterval
+        self._lastBufferReport      = None
+        # timing of the phases of the learning loop, disabled unless a timer is set
+        self._phaseTimer            = PhaseTimer()
+        # live metrics, only collected if a registry is set
+        self._metrics               = None
+        # profiling of the processes of the worker, only if a profiler is set
+        self._profiler              = None
 
         # initializing communication with processes of communicator and dataScheduler
         self._communicatorMsgQueue  = Queue()
@@ -190,6 +235,63 @@ class Worker(baseClass):
 
         return self._dataScheduler
 
+    def setPhaseTimer(self, phaseTimer : PhaseTimer):
+        '''
+
+        Sets the PhaseTimer of the worker. If it is enabled, it is handed to learner and
+        communicator when the worker is run, so that all the phases of the learning loop
+        of this worker are aggregated together. Without a learning logger of its own the
+        timer writes to the learning logger of the learner.
+
+        Parameters
+        ----------
+        phaseTimer
+
+        '''
+
+        self._phaseTimer = phaseTimer
+
+    def setMetricsRegistry(self, registry : MetricsRegistry):
+        '''
+
+        Sets the MetricsRegistry of the worker process. Queue depths are read when the
+        metrics are exposed, received messages are counted. The registry is handed to
+        learner and communicator when the worker is run. Exposing the metrics, e.g., by
+        registry.startHttpServer, has to be started in the process running the worker.
+
+        Parameters
+        ----------
+        registry
+
+        '''
+
+        self._metrics = registry
+        registry.gauge("dlplatform_data_buffer_depth", "Data updates waiting for the learner",
+                       function = lambda: len(self._dataBuffer))
+        registry.gauge("dlplatform_communicator_queue_depth", "Messages from the communicator waiting for the worker",
+                       function = lambda: self._communicatorMsgQueue.qsize())
+        registry.counter("dlplatform_dropped_updates_total", "Data updates dropped by the data scheduler because the buffer was full",
+                         function = lambda: self._droppedUpdates.value)
+        registry.counter("dlplatform_messages_received_total", "Messages received from the coordinator, by kind")
+        registry.counter("dlplatform_message_bytes_received_total", "Bytes of the messages received from the coordinator, by kind")
+
+    def setProfiler(self, profiler : Profiler):
+        '''
+
+        Sets the Profiler of the worker. The worker process is run under the profiler
+        and the profiler is handed to data scheduler and communicator, so that every
+        process of the worker writes its profile when it ends. Without an output
+        directory of its own the profiles are written to the directory of the learning
+        logger of the learner.
+
+        Parameters
+        ----------
+        profiler
+
+        '''
+
+        self._profiler = profiler
+
     def onDataUpdate(self, data: tuple):
         '''
 
@@ -227,20 +329,31 @@ class Worker(baseClass):
         '''
 
         self.info('Got message in the worker queue')
+        if not self._metrics is None:
+            labels = {"kind": routing_key.split('.')[0]}
+            self._metrics.counter("dlplatform_messages_received_total").inc(labels = labels)
+            self._metrics.counter("dlplatform_message_bytes_received_total").inc(len(body), labels = labels)
 
         if 'newModel' in routing_key:
             body_size = sys.getsizeof(body)
             self._communicator.learningLogger.logSendModelMessage(exchange, routing_key, body_size, 'receive', self.getIdentifier())
             self.info("The learner received initial setup or averaged model, with or without reference model")
-            message = pickle.loads(body)
+            with self._phaseTimer.measure("deserialization"):
+                message = pickle.loads(body)
             param = message['param']
             flags = message['flags']
+            if 'round' in flags:
+                self._communicator.learningLogger.logRoundEvent(flags['round'], 'modelReceived', self.getIdentifier())
             self._learner.setModel(param, flags)
         if 'request' in routing_key:
             body_size = 0
             self._communicator.learningLogger.logBalancingRequestMessage(exchange, routing_key,body_size, 'receive', self.getIdentifier())
             self.info("Coordinator asks for parameters to balance violation")
-            self._learner.answerParameterRequest()
+            # the body is the round of the coordinator, empty for senders without rounds
+            roundId = int(body) if len(body) > 0 else None
+            if not roundId is None:
+                self._communicator.learningLogger.logRoundEvent(roundId, 'requestReceived', self.getIdentifier())
+            self._learner.answerParameterRequest(roundId)
         if 'exit' in routing_key:
             body_size = 0
             self.info("Coordinator stops the execution")
@@ -269,14 +382,42 @@ class Worker(baseClass):
 
             # we know exactly the structure of the message from communicator
             routing_key, exchange, body = recvObj
-            self.onCommunicatorMessageReceived(routing_key, exchange, body)
+            if self._threadedTraining:
+                self._submitLearnerTask(self.onCommunicatorMessageReceived, routing_key, exchange, body)
+            else:
+                self.onCommunicatorMessageReceived(routing_key, exchange, body)
 
         if self._dataSchedulerRetriever.poll():
             # receive next training example
-            recvObj = self._dataSchedulerRetriever.recv()
-            value = loads(recvObj)
+            with self._phaseTimer.measure("receiveData"):
+                recvObj = self._dataSchedulerRetriever.recv()
+                value = loads(recvObj)
             self._dataBuffer.append(value)
 
+        self._reportBuffer()
+
+    def _reportBuffer(self):
+        '''
+        Logs occupancy of the data buffer and the amount of data updates dropped by the
+        data scheduler every bufferReportInterval seconds
+        '''
+        now = time.time()
+        if self._lastBufferReport is None:
+            self._lastBufferReport = now
+        elif now - self._lastBufferReport >= self._bufferReportInterval:
+            self._lastBufferReport = now
+            maxBufferSize = 0 if self._maxBufferSize is None else self._maxBufferSize
+            self._communicator.learningLogger.logDataBuffer(len(self._dataBuffer), maxBufferSize, self._droppedUpdates.value)
+
+    def _takeFromBuffer(self):
+        '''
+        Removes the oldest data update from the buffer and frees its slot for the data scheduler
+        '''
+        data = self._dataBuffer.popleft()
+        if not self._bufferSlots is None:
+            self._bufferSlots.release()
+        return data
+
     def _setConnectionsToComponents(self):
         '''
 
@@ -304,6 +445,58 @@ class Worker(baseClass):
 
         self._communicator.setConnection(consumerConnection = self._communicatorMsgQueue)
         self._dataScheduler.setConnection(workerConnection = self._dataSchedulerPipe[1])
+        if not self._bufferSlots is None:
+            self._dataScheduler.setBufferSlots(self._bufferSlots, self._bufferPolicy == "block", self._droppedUpdates)
+
+    def _runLearnerTask(self, func, *args):
+        '''
+        Runs a function accessing the learner on the learner thread and
+        afterwards records if the learner is still alive and can obtain data,
+        so that the main loop never has to touch the learner itself.
+        '''
+        try:
+            func(*args)
+        finally:
+            self._learnerReady = self._learner.canObtainData()
+            self._learnerAlive = self._learner.isAlive()
+
+    def _submitLearnerTask(self, func, *args):
+        '''
+        Queues a function accessing the learner for the learner thread.
+        All the tasks are executed one after another in the order of submission.
+
+        Returns
+        -------
+        Future of the task
+        '''
+        task = self._learnerExecutor.submit(self._runLearnerTask, func, *args)
+        self._learnerTasks.append(task)
+        return task
+
+    def _checkLearnerTasks(self):
+        '''
+        Removes finished tasks of the learner thread and re-raises their exceptions in the main loop.
+        '''
+        while len(self._learnerTasks) > 0 and self._learnerTasks[0].done():
+            self._learnerTasks.pop(0).result()
+
+    def _trainOnBufferedData(self):
+        '''
+        Hands the next buffered example to the learner if it can obtain data.
+        Executed on the learner thread.
+        '''
+        if len(self._dataBuffer) > 0 and self._learner.canObtainData():
+            self._passToLearner(self._takeFromBuffer())
+
+    def _passToLearner(self, data):
+        '''
+        Hands data from the buffer to the learner, either a single example or,
+        if the data scheduler has a batchSize, a batch of examples as arrays.
+        '''
+        if self._batchedData:
+            self._learner.obtainBatch(data)
+        else:
+            self._learner.obtainData(data)
 
     def run(self):
         '''
@@ -323,6 +516,16 @@ class Worker(baseClass):
             case that the connection from dataScheduler or to the communicator aren't set.
         '''
 
+        if self._profiler is None:
+            self._run()
+        else:
+            self._profiler.profile(self._run, self.getName())
+
+    def _run(self):
+        '''
+        Operation logic of the worker, see run
+        '''
+
         if self._dataScheduler is None:
             self.error("DataScheduler not set!")
             raise AttributeError("DataScheduler not set!")
@@ -338,6 +541,19 @@ class Worker(baseClass):
         # learner needs an communicator object to publish detailed messages, that worker cannot do
         # e.g., only learner knows what exact class of parameters it has, worker knows only virtual class
         self._learner.setCommunicator(self._communicator)
+        if self._phaseTimer.isEnabled():
+            if self._phaseTimer.getLearningLogger() is None:
+                self._phaseTimer.setLearningLogger(self._learner._learningLogger)
+            self._learner.setPhaseTimer(self._phaseTimer)
+            self._communicator.setPhaseTimer(self._phaseTimer)
+        if not self._metrics is None:
+            self._learner.setMetricsRegistry(self._metrics)
+            self._communicator.setMetricsRegistry(self._metrics)
+        if not self._profiler is None:
+            if self._profiler.getOutputDir() is None:
+                self._profiler.setOutputDir(self._learner._learningLogger.getLogPath())
+            self._dataScheduler.setProfiler(self._profiler)
+            self._communicator.setProfiler(self._profiler)
 
         # dataScheduler is for individual setup of giving data to the worker
         # it is running in its own process since the data is constantly generated, independent from the learner
@@ -349,6 +565,7 @@ class Worker(baseClass):
         self._communicator.daemon = True
 
         self._setConnectionsToComponents()
+        self._batchedData = not self._dataScheduler.getBatchSize() is None
 
         self._dataScheduler.start()
         self._communicator.start()
@@ -361,15 +578,51 @@ class Worker(baseClass):
         # only now we should request for initial model - or we will not be able to receive the answer
         self._learner.requestInitialModel()
 
-        while self._learner.isAlive():
-            self.checkInterProcessCommunication()
-            if len(self._dataBuffer) > 0:
-                if self._learner.canObtainData():
-                    self._learner.obtainData(self._dataBuffer[0])
-                    del(self._dataBuffer[0])
+        if self._threadedTraining:
+            self._runThreaded()
+        else:
+            while self._learner.isAlive():
+                self.checkInterProcessCommunication()
+                if len(self._dataBuffer) > 0:
+                    if self._learner.canObtainData():
+                        self._passToLearner(self._takeFromBuffer())
 
         self._dataScheduler.terminate()
         self._dataScheduler.join()
         self._communicator.terminate()
         self._communicator.join()
+        self._phaseTimer.flush()
         print('worker ',self._identifier,' shut down.')
+
+    def _runThreaded(self):
+        '''
+        Main loop of the worker when the learner runs on its own thread.
+        The main loop only receives data and messages and queues tasks for the
+        learner thread: at most one training step is queued at a time, messages
+        are queued immediately and so handled right after the current step. Messages
+        are not served concurrently to a training step, e.g., a balancing request waits
+        for the current step, but not for the data buffer to be trained on.
+        When idle, the main loop waits for the current step, new data or, while the
+        learner waits for a model, a message with a timeout of a millisecond instead
+        of spinning, so it does not compete with the learner thread.
+        '''
+        self._learnerExecutor = ThreadPoolExecutor(max_workers = 1)
+        self._learnerReady = self._learner.canObtainData()
+        self._learnerAlive = self._learner.isAlive()
+        while self._learnerAlive:
+            self.checkInterProcessCommunication()
+            self._checkLearnerTasks()
+            trainingDone = self._trainingTask is None or self._trainingTask.done()
+            if len(self._dataBuffer) > 0 and trainingDone and self._learnerReady:
+                self._trainingTask = self._submitLearnerTask(self._trainOnBufferedData)
+            elif not trainingDone:
+                # returns as soon as the step is done, messages are checked at least every millisecond
+                wait([self._trainingTask], timeout = 0.001)
+            elif self._learnerReady:
+                # returns as soon as new data arrives
+                self._dataSchedulerRetriever.poll(0.001)
+            else:
+                # the learner waits for a model, which can only arrive as a message
+                time.sleep(0.001)
+        self._learnerExecutor.shutdown(wait = True)
+        self._checkLearnerTasks()
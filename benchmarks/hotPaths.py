@@ -0,0 +1,196 @@
+'''
+Benchmarks of the communication and aggregation hot paths of DLplatform.
+
+Measures, without a message broker,
+- Average and GeometricMedian aggregation for different model sizes and amounts of nodes
+- add, distance, flatten and fromVector of every parameters class
+- pickling and unpickling of model messages as sent between workers and coordinator
+- evaluate of DynamicSync (full synchronization) and DynamicHedgeSync (local balancing)
+- the write paths of LearningLogger
+
+Results are written as JSON, so they can be compared across versions, e.g.
+
+    python benchmarks/hotPaths.py --sizes 1000 1000000 --nodes 2 64 --output results.json
+
+Combinations needing more memory than --memory-limit are skipped.
+'''
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from DLplatform.aggregating import Average, GeometricMedian
+from DLplatform.learningLogger import LearningLogger
+from DLplatform.parameters.kerasNNParameters import KerasNNParameters
+from DLplatform.parameters.pyTorchNNParameters import PyTorchNNParameters
+from DLplatform.parameters.vectorParameters import VectorParameter
+from DLplatform.synchronizing import DynamicHedgeSync, DynamicSync
+
+# share of the parameters per layer of the synthetic networks
+LAYER_SHARES = [0.6, 0.01, 0.38, 0.01]
+
+def layerShapes(size):
+    sizes = [max(1, int(size * share)) for share in LAYER_SHARES]
+    sizes[0] += size - sum(sizes)
+    return sizes
+
+def makeVector(size, randomState):
+    return VectorParameter(randomState.randn(size))
+
+def makePyTorch(size, randomState):
+    stateDict = OrderedDict()
+    for i, layerSize in enumerate(layerShapes(size)):
+        stateDict["layer" + str(i)] = randomState.randn(layerSize).astype(np.float32)
+    return PyTorchNNParameters(stateDict)
+
+def makeKeras(size, randomState):
+    return KerasNNParameters([randomState.randn(layerSize).astype(np.float32) for layerSize in layerShapes(size)])
+
+PARAMETER_CLASSES = OrderedDict([("VectorParameter", (makeVector, 8)),
+                                 ("PyTorchNNParameters", (makePyTorch, 4)),
+                                 ("KerasNNParameters", (makeKeras, 4))])
+
+def measure(function, repeat, setup = None):
+    '''
+    Runs function repeat times and returns statistics of the durations in seconds.
+    If setup is given, it is called before every run outside the timing and
+    function is called with its result, e.g., a fresh copy of an input that
+    function changes in place.
+    '''
+    durations = []
+    for _ in range(repeat):
+        arguments = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        function(*arguments)
+        durations.append(time.perf_counter() - start)
+    return {"min": min(durations), "median": float(np.median(durations)), "mean": float(np.mean(durations)), "repeat": repeat}
+
+class Runner():
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        self.randomState = np.random.RandomState(0)
+
+    def fits(self, bytesNeeded):
+        return bytesNeeded <= self.args.memory_limit * 2**30
+
+    def selected(self, benchmark):
+        return self.args.only is None or any(name in benchmark for name in self.args.only)
+
+    def record(self, benchmark, statistics, **settings):
+        result = OrderedDict([("benchmark", benchmark)])
+        result.update(settings)
+        result.update(statistics)
+        self.results.append(result)
+        print("%-36s %-52s median %.6f s" % (benchmark, str(settings), statistics["median"]), flush = True)
+
+    def parameters(self):
+        for className, (make, itemSize) in PARAMETER_CLASSES.items():
+            for size in self.args.sizes:
+                if not self.fits(4 * size * itemSize):
+                    continue
+                a = make(size, self.randomState)
+                b = make(size, self.randomState)
+                vector = a.toVector()
+                if self.selected("parameters.add"):
+                    self.record("parameters.add", measure(lambda c: c.add(b), self.args.repeat, setup = a.getCopy), parameters = className, size = size)
+                if self.selected("parameters.distance"):
+                    self.record("parameters.distance", measure(lambda: a.distance(b), self.args.repeat), parameters = className, size = size)
+                # VectorParameter is flat already and has no flatten
+                if self.selected("parameters.flatten") and hasattr(a, "flatten"):
+                    self.record("parameters.flatten", measure(lambda: a.flatten(), self.args.repeat), parameters = className, size = size)
+                if self.selected("parameters.fromVector"):
+                    self.record("parameters.fromVector", measure(lambda: a.fromVector(vector), self.args.repeat), parameters = className, size = size)
+                if self.selected("pickle"):
+                    message = {"param": a, "flags": {"setReference": True}}
+                    self.record("pickle.dumps", measure(lambda: pickle.dumps(message), self.args.repeat), parameters = className, size = size)
+                    body = pickle.dumps(message)
+                    self.record("pickle.loads", measure(lambda: pickle.loads(body), self.args.repeat), parameters = className, size = size, bytes = len(body))
+
+    def models(self, size, nodes):
+        return [makeVector(size, self.randomState) for _ in range(nodes)]
+
+    def aggregation(self):
+        for size in self.args.sizes:
+            for nodes in self.args.nodes:
+                # models, copies made by the aggregators and the matrix of the geometric median
+                if not self.fits(8 * size * (2 * nodes + 2)):
+                    continue
+                params = self.models(size, nodes)
+                if self.selected("Average"):
+                    self.record("Average", measure(lambda: Average()(params), self.args.repeat), size = size, nodes = nodes)
+                if self.selected("GeometricMedian"):
+                    self.record("GeometricMedian", measure(lambda: GeometricMedian()(params), self.args.repeat), size = size, nodes = nodes)
+                if self.selected("DynamicSync.evaluate"):
+                    sync = DynamicSync(delta = 1.0)
+                    sync.setAggregator(Average())
+                    nodesDict = {str(i): param for i, param in enumerate(params)}
+                    activeNodes = list(nodesDict.keys())
+                    self.record("DynamicSync.evaluate", measure(lambda: sync.evaluate(nodesDict, activeNodes), self.args.repeat),
+                                size = size, nodes = nodes)
+                if self.selected("DynamicHedgeSync.evaluate") and nodes >= 4:
+                    # local balancing of a quarter of the nodes, which fails and augments the balancing set
+                    sync = DynamicHedgeSync(delta = 0.0, refPoint = makeVector(size, self.randomState))
+                    sync.setAggregator(Average())
+                    activeNodes = [str(i) for i in range(nodes)]
+                    nodesDict = {str(i): params[i] for i in range(nodes // 4)}
+                    self.record("DynamicHedgeSync.evaluate", measure(lambda: sync.evaluate(nodesDict, activeNodes), self.args.repeat),
+                                size = size, nodes = nodes)
+
+    def logging(self):
+        path = tempfile.mkdtemp()
+        try:
+            logger = LearningLogger(path, "worker0")
+            calls = self.args.log_calls
+            predictions = self.randomState.randn(64, 10)
+            labels = list(self.randomState.randint(0, 10, size = 64))
+            writes = [("LearningLogger.logLearnerLoss", lambda: [logger.logLearnerLoss(0.5) for _ in range(calls)]),
+                      ("LearningLogger.logViolation", lambda: [logger.logViolation("0.1<=1.0", True) for _ in range(calls)]),
+                      ("LearningLogger.logPredictionsLabels", lambda: [logger.logPredictionsLabels(predictions, labels) for _ in range(calls)]),
+                      ("LearningLogger.logSendModelMessage", lambda: [logger.logSendModelMessage("nodes", "newModel.0", 1000, "receive", "0") for _ in range(calls)])]
+            for benchmark, function in writes:
+                if self.selected(benchmark):
+                    statistics = measure(function, self.args.repeat)
+                    for key in ["min", "median", "mean"]:
+                        statistics[key] /= calls
+                    self.record(benchmark, statistics, calls = calls)
+        finally:
+            shutil.rmtree(path)
+
+    def environment(self):
+        return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "arguments": vars(self.args)}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks of the communication and aggregation hot paths")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 100000, 1000000, 10000000, 50000000],
+                        help = "model sizes in parameters")
+    parser.add_argument("--nodes", type = int, nargs = "+", default = [2, 8, 32, 128, 512], help = "amounts of nodes")
+    parser.add_argument("--repeat", type = int, default = 5, help = "runs per measurement")
+    parser.add_argument("--log-calls", type = int, default = 1000, help = "calls per run of the logger benchmarks")
+    parser.add_argument("--memory-limit", type = float, default = 4.0, help = "GiB, larger combinations are skipped")
+    parser.add_argument("--only", nargs = "+", default = None, help = "run only benchmarks whose names contain one of these strings")
+    parser.add_argument("--output", default = "benchmark_results.json", help = "path of the JSON results")
+    args = parser.parse_args()
+
+    runner = Runner(args)
+    runner.parameters()
+    runner.aggregation()
+    runner.logging()
+    with open(args.output, "w") as f:
+        json.dump({"environment": runner.environment(), "results": runner.results}, f, indent = 2)
+    print("results written to " + args.output)
+
+if __name__ == "__main__":
+    main()
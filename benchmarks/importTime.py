@@ -0,0 +1,103 @@
+'''
+Import times of the modules of DLplatform and guard against heavy imports.
+
+Every process of an experiment (coordinator, workers, their data schedulers and
+communicators) imports DLplatform, so slow imports multiply with the amount of processes.
+Each module is imported in fresh interpreters, which reports
+- seconds of the import, the minimum and median over --repeat interpreters
+- heavy frameworks (torch, tensorflow, keras, scipy, sklearn, pika, http.server)
+  that were imported although the module does not need them
+
+    python benchmarks/importTime.py --output import_times.json
+
+The exit status is 1 if a module imported a heavy framework or, with --max-seconds,
+took longer than that to import, so the script can guard regressions, e.g., in CI.
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# frameworks that are loaded only in the processes and code paths using them
+HEAVY_MODULES = ["torch", "tensorflow", "keras", "scipy", "sklearn", "pika", "http.server"]
+
+# modules needed by every coordinator or worker process, none of them may import a heavy module
+MODULES = ["DLplatform.coordinator",
+           "DLplatform.worker",
+           "DLplatform.aggregating",
+           "DLplatform.synchronizing",
+           "DLplatform.communicating",
+           "DLplatform.dataprovisioning",
+           "DLplatform.learning",
+           "DLplatform.learning.factories.pytorchLearnerFactory",
+           "DLplatform.learning.factories.kerasLearnerFactory",
+           "DLplatform.metrics",
+           "DLplatform.profiling"]
+
+MEASUREMENT = '''
+import json, sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+import %s
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "heavy": [m for m in %r if m in sys.modules]}))
+'''
+
+def measure(module : str, repeat : int) -> OrderedDict:
+    '''
+    Imports module in repeat fresh interpreters
+
+    Returns
+    -------
+    OrderedDict - minimal and median seconds of the import and the heavy modules imported
+    '''
+    seconds = []
+    heavy = set()
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", MEASUREMENT % (ROOT, module, HEAVY_MODULES)],
+                                         cwd = ROOT, universal_newlines = True)
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return OrderedDict([("minSeconds", min(seconds)), ("medianSeconds", statistics.median(seconds)),
+                        ("heavyModules", sorted(heavy))])
+
+def main():
+    parser = argparse.ArgumentParser(description = "Import times of DLplatform modules and guard against heavy imports")
+    parser.add_argument("--modules", nargs = "+", default = MODULES, help = "modules to import")
+    parser.add_argument("--repeat", type = int, default = 5, help = "fresh interpreters per module")
+    parser.add_argument("--max-seconds", type = float, default = None,
+                        help = "fail if the minimal import time of a module exceeds this")
+    parser.add_argument("--output", default = "import_times.json", help = "path of the JSON results")
+    args = parser.parse_args()
+
+    results = OrderedDict()
+    failures = []
+    for module in args.modules:
+        results[module] = measure(module, args.repeat)
+        print("%-55s %8.1f ms  %s" % (module, 1000 * results[module]["minSeconds"], " ".join(results[module]["heavyModules"])))
+        if len(results[module]["heavyModules"]) > 0:
+            failures.append(module + " imports " + ", ".join(results[module]["heavyModules"]))
+        if not args.max_seconds is None and results[module]["minSeconds"] > args.max_seconds:
+            failures.append(module + " takes %.3f s to import" % results[module]["minSeconds"])
+
+    environment = {"python": platform.python_version(), "platform": platform.platform(),
+                   "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment, "results": results, "failures": failures}, f, indent = 2)
+    print("results written to " + args.output)
+
+    for failure in failures:
+        print("FAILED: " + failure)
+    sys.exit(1 if len(failures) > 0 else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+'''
+End-to-end benchmark of a whole DLplatform system on one host without RabbitMQ.
+
+Launches one Coordinator and --workers Workers, each in its own process as in a real
+experiment, connected by LocalComm through a LocalBroker. The workers train a linear
+regression model with plain numpy on synthetic data, so the measured costs are the ones
+of the platform: data scheduling, training loop, synchronization, aggregation, messaging
+and logging. After all the workers reached --examples examples it reports
+- examples/s per worker, taken from the timestamps of the losses they logged
+- latency of synchronizations, from sending a violation to receiving the new model
+- duration of the synchronization rounds of the coordinator and their parts: waiting
+  for stragglers, aggregation and delivery of the model
+- amount and bytes of the messages published, per kind of message
+- CPU seconds used by the coordinator process
+
+With --profile every process (coordinator, workers, their data schedulers and
+communicators) is profiled and the profiles are merged into <output>_profile.prof
+or, with --profile sampling, into the flame graph <output>_profile.folded.
+
+    python benchmarks/localCluster.py --workers 8 --sync dynamic --delta 0.5 --dim 10000 --output cluster.json
+
+Workers wait 5 seconds after starting before they register, which is included in the
+wall time but not in the examples/s.
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from multiprocessing import Process, Queue
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from DLplatform.aggregating import Average, GeometricMedian
+from DLplatform.communicating import LocalBroker, LocalComm
+from DLplatform.coordinator import Coordinator
+from DLplatform.dataprovisioning import DataSource
+from DLplatform.dataprovisioning.batchDataScheduler import BatchDataScheduler
+from DLplatform.learning.learner import IncrementalLearner
+from DLplatform.learningLogger import LearningLogger
+from DLplatform.metrics import MetricsRegistry
+from DLplatform.parameters.vectorParameters import VectorParameter
+from DLplatform.phaseTimer import PhaseTimer
+from DLplatform.profiling import Profiler, mergeProfiles
+from DLplatform.stopping import MaxAmountExamples
+from DLplatform.synchronizing import DynamicHedgeSync, DynamicSync, NoSync, PeriodicSync
+from DLplatform.worker import Worker
+
+class SyntheticDataSource(DataSource):
+    '''
+    Examples drawn from a standard normal distribution, labels from a fixed
+    linear model with gaussian noise. Every worker gets its own seed.
+    '''
+
+    def __init__(self, dim, seed, noise = 0.1, name = "SyntheticDataSource"):
+        DataSource.__init__(self, name = name)
+
+        self._dim           = dim
+        self._seed          = seed
+        self._noise         = noise
+
+    def prepare(self):
+        self._trueWeights = np.random.RandomState(0).randn(self._dim)
+        self._randomState = np.random.RandomState(self._seed)
+
+    def getNext(self):
+        X, y = self.getNextBatch(1)
+        return X[0], y[0]
+
+    def getNextBatch(self, n):
+        X = self._randomState.randn(n, self._dim)
+        y = X.dot(self._trueWeights) + self._noise * self._randomState.randn(n)
+        return X, y
+
+class LinearRegressionLearner(IncrementalLearner):
+    '''
+    Linear regression trained by mini-batch gradient descent on the squared loss
+    '''
+
+    def __init__(self, dim, batchSize, syncPeriod, learningRate = 0.01, name = "LinearRegressionLearner"):
+        IncrementalLearner.__init__(self, batchSize = batchSize, syncPeriod = syncPeriod, name = name)
+
+        self._weights       = np.zeros(dim)
+        self._learningRate  = learningRate
+
+    def setParameters(self, param):
+        newWeights = param.get().copy()
+        if self._synchronizer.isSketched():
+            self._synchronizer.updateSketch(newWeights - self._weights)
+        self._weights = newWeights
+
+    def setModel(self, param, flags):
+        IncrementalLearner.setModel(self, param, flags)
+        if flags.get("setReference", False) and self._synchronizer.isSketched():
+            self._synchronizer.resetSketch(len(self._weights))
+
+    def getParameters(self):
+        return VectorParameter(self._weights.copy())
+
+    def checkLocalConditionHolds(self):
+        localConditionHolds = True
+        msg = ""
+        self._syncCounter += 1
+        if self._syncCounter == self._syncPeriod:
+            if self._synchronizer.isSketched():
+                msg, localConditionHolds = self._synchronizer.evaluateLocalSketch(
+                    lambda: float(np.sum((self._weights - self._referenceModel.get())**2)))
+            else:
+                msg, localConditionHolds = self._synchronizer.evaluateLocal(VectorParameter(self._weights), self._referenceModel)
+            self._syncCounter = 0
+
+        return msg, localConditionHolds
+
+    def update(self, data):
+        if isinstance(data, tuple):
+            X, y = data
+        else:
+            X = np.stack([t[0] for t in data])
+            y = np.array([t[1] for t in data])
+        predictions = X.dot(self._weights)
+        residuals = predictions - y
+        step = self._learningRate * X.T.dot(residuals) / len(y)
+        self._weights -= step
+        if self._synchronizer.isSketched():
+            self._synchronizer.updateSketch(-step)
+        return [float(np.mean(residuals ** 2)), predictions if self._logPredictions else None]
+
+def makeSynchronizer(args):
+    if args.sync == "periodic":
+        synchronizer = PeriodicSync()
+    elif args.sync == "dynamic":
+        synchronizer = DynamicSync(delta = args.delta, sketchDim = args.sketch_dim)
+    elif args.sync == "hedge":
+        synchronizer = DynamicHedgeSync(delta = args.delta, sketchDim = args.sketch_dim)
+    else:
+        synchronizer = NoSync()
+    synchronizer.setAggregator(GeometricMedian() if args.aggregator == "gm" else Average())
+    return synchronizer
+
+def runCoordinator(args, broker, logDir, results):
+    # communicators are processes, so they have to be created in the process starting them
+    communicator = LocalComm(broker)
+    coordinator = Coordinator(minStartNodes = args.workers)
+    logger = LearningLogger(logDir, "coordinator")
+    coordinator.setLearningLogger(logger)
+    communicator.setLearningLogger(logger)
+    coordinator.setCommunicator(communicator)
+    coordinator.setSynchronizer(makeSynchronizer(args))
+    if not args.metrics_port is None:
+        registry = MetricsRegistry({"node": "coordinator"})
+        registry.startHttpServer(args.metrics_port)
+        coordinator.setMetricsRegistry(registry)
+    if not args.profile is None:
+        coordinator.setProfiler(Profiler(mode = args.profile))
+    start = time.time()
+    cpuStart = time.process_time()
+    try:
+        coordinator.run()
+    except SystemExit:
+        # the coordinator exits when all the workers deregistered
+        pass
+    results.put({"cpuSeconds": time.process_time() - cpuStart, "wallSeconds": time.time() - start})
+
+def runWorker(args, identifier, broker, logDir):
+    communicator = LocalComm(broker)
+    logger = LearningLogger(logDir, "worker" + identifier)
+    learner = LinearRegressionLearner(dim = args.dim, batchSize = args.batch_size, syncPeriod = args.period,
+                                      learningRate = args.learning_rate)
+    learner.setLearningLogger(logger)
+    learner.setSynchronizer(makeSynchronizer(args))
+    learner.setStoppingCriterion(MaxAmountExamples(args.examples))
+    communicator.setLearningLogger(logger)
+    dataScheduler = BatchDataScheduler(batchSize = args.batch_size)
+    dataScheduler.setDataSource(SyntheticDataSource(dim = args.dim, seed = int(identifier) + 1))
+    worker = Worker(identifier, maxBufferSize = args.buffer_size)
+    worker.setLearner(learner)
+    worker.setCommunicator(communicator)
+    worker.setDataScheduler(dataScheduler)
+    if args.phase_timing:
+        worker.setPhaseTimer(PhaseTimer(enabled = True, learningLogger = logger))
+    if not args.metrics_port is None:
+        registry = MetricsRegistry({"node": identifier})
+        registry.startHttpServer(args.metrics_port + 1 + int(identifier))
+        worker.setMetricsRegistry(registry)
+    if not args.profile is None:
+        worker.setProfiler(Profiler(mode = args.profile))
+    worker.run()
+
+def readLog(logDir, node, fileName):
+    path = os.path.join(logDir, node, fileName)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [line.rstrip('\n').split('\t') for line in f if line.strip()]
+
+def percentiles(values):
+    if len(values) == 0:
+        return None
+    return OrderedDict([("p" + str(q), float(np.percentile(values, q))) for q in [50, 90, 99]] +
+                       [("max", float(np.max(values))), ("count", len(values))])
+
+def analyze(args, logDir):
+    '''
+    Computes throughput per worker and synchronization latencies from the logs of the workers
+    '''
+    workers = OrderedDict()
+    latencies = []
+    for i in range(args.workers):
+        node = "worker" + str(i)
+        losses = readLog(logDir, node, LearningLogger._learnerLossFile)
+        times = [float(line[0]) for line in losses]
+        # the first update starts with the first timestamp, so it is not counted
+        throughput = (len(times) - 1) * args.batch_size / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else None
+        workers[node] = {"updates": len(times), "examplesPerSecond": throughput}
+        if args.phase_timing:
+            phases = {}
+            for line in readLog(logDir, node, LearningLogger._phaseTimingsFile):
+                amount, total = phases.get(line[1], (0, 0.0))
+                phases[line[1]] = (amount + int(line[2]), total + float(line[3]))
+            workers[node]["phases"] = OrderedDict((phase, {"count": amount, "totalSeconds": total})
+                                                  for phase, (amount, total) in sorted(phases.items()))
+
+        # violation messages have six columns, the results of the local checks three
+        violationsSent = sorted(float(line[0]) for line in readLog(logDir, node, LearningLogger._learnerViolationsFile)
+                                if len(line) == 6 and line[5] == 'send')
+        modelsReceived = sorted(float(line[0]) for line in readLog(logDir, node, LearningLogger._learnerSendModelFile)
+                                if len(line) >= 5 and line[4] == 'receive')
+        received = np.array(modelsReceived)
+        for sent in violationsSent:
+            k = np.searchsorted(received, sent, side = 'left')
+            if k < len(received):
+                latencies.append(received[k] - sent)
+    return workers, percentiles(latencies)
+
+def analyzeRounds(args, logDir):
+    '''
+    Breaks the synchronization rounds traced by the coordinator and the workers down into
+    - round: from the first violation to publishing the model
+    - straggler: from the first balancing request to the last model arriving
+    - aggregation: aggregating the models
+    - delivery: from publishing the model to a worker receiving it
+    '''
+    events = {}
+    for line in readLog(logDir, "coordinator", LearningLogger._roundsFile):
+        events.setdefault(line[1], []).append((float(line[0]), line[2]))
+    published = {}
+    durations = OrderedDict((key, []) for key in ["round", "straggler", "aggregation", "delivery"])
+    for roundId, roundEvents in events.items():
+        times = {}
+        for timestamp, event in roundEvents:
+            times.setdefault(event, []).append(timestamp)
+        if not 'publish' in times:
+            continue
+        published[roundId] = times['publish'][0]
+        durations["round"].append(times['publish'][0] - min(t for t, _ in roundEvents))
+        if 'request' in times:
+            # requested nodes may have sent a violation instead of a reply in the meantime
+            arrivals = [t for t in times.get('reply', []) + times.get('violation', []) if t >= min(times['request'])]
+            if len(arrivals) > 0:
+                durations["straggler"].append(max(arrivals) - min(times['request']))
+        if 'aggregationStart' in times:
+            durations["aggregation"].append(times['aggregationEnd'][0] - times['aggregationStart'][0])
+    for i in range(args.workers):
+        for line in readLog(logDir, "worker" + str(i), LearningLogger._roundsFile):
+            if line[2] == 'modelReceived' and line[1] in published:
+                durations["delivery"].append(float(line[0]) - published[line[1]])
+    return OrderedDict((key, percentiles(values)) for key, values in durations.items())
+
+def main():
+    parser = argparse.ArgumentParser(description = "End-to-end benchmark of coordinator and workers on one host without a broker")
+    parser.add_argument("--workers", type = int, default = 4, help = "amount of workers")
+    parser.add_argument("--sync", choices = ["periodic", "dynamic", "hedge", "nosync"], default = "periodic", help = "synchronization protocol")
+    parser.add_argument("--delta", type = float, default = 1.0, help = "divergence threshold of the dynamic protocols")
+    parser.add_argument("--sketch-dim", type = int, default = None,
+                        help = "check the local condition of the dynamic protocols on sketches of this dimension")
+    parser.add_argument("--period", type = int, default = 10, help = "updates between local condition checks")
+    parser.add_argument("--aggregator", choices = ["average", "gm"], default = "average", help = "Average or GeometricMedian")
+    parser.add_argument("--dim", type = int, default = 1000, help = "amount of model parameters")
+    parser.add_argument("--batch-size", type = int, default = 10, help = "examples per update")
+    parser.add_argument("--learning-rate", type = float, default = 0.01, help = "learning rate of the workers")
+    parser.add_argument("--examples", type = int, default = 20000, help = "examples per worker before it deregisters")
+    parser.add_argument("--buffer-size", type = int, default = 16, help = "maximal amount of batches waiting at a worker")
+    parser.add_argument("--phase-timing", action = "store_true", help = "measure the phases of the learning loop of the workers")
+    parser.add_argument("--metrics-port", type = int, default = None,
+                        help = "serve live metrics of the coordinator on this port and of worker i on port + 1 + i")
+    parser.add_argument("--profile", choices = ["cprofile", "sampling"], default = None,
+                        help = "profile all the processes and merge the profiles next to the output")
+    parser.add_argument("--log-dir", default = None, help = "directory for the logs of the run, by default a temporary one that is removed")
+    parser.add_argument("--output", default = "cluster_results.json", help = "path of the JSON results")
+    args = parser.parse_args()
+
+    logDir = args.log_dir if not args.log_dir is None else tempfile.mkdtemp()
+    os.makedirs(logDir, exist_ok = True)
+    broker = LocalBroker()
+    try:
+        results = Queue()
+        start = time.time()
+        coordinator = Process(target = runCoordinator, args = (args, broker, logDir, results))
+        coordinator.start()
+        workers = [Process(target = runWorker, args = (args, str(i), broker, logDir)) for i in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        coordinatorUsage = results.get()
+        coordinator.join()
+        wallSeconds = time.time() - start
+
+        workerResults, latencies = analyze(args, logDir)
+        messages = OrderedDict((kind, {"messages": count, "bytes": size})
+                               for kind, (count, size) in sorted(broker.getStatistics().items()))
+        throughputs = [w["examplesPerSecond"] for w in workerResults.values() if not w["examplesPerSecond"] is None]
+        report = OrderedDict([("environment", {"python": platform.python_version(), "numpy": np.__version__,
+                                               "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                               "arguments": vars(args)}),
+                              ("wallSeconds", wallSeconds),
+                              ("examplesPerSecond", {"total": float(np.sum(throughputs)), "workers": workerResults}),
+                              ("syncLatencySeconds", latencies),
+                              ("roundSeconds", analyzeRounds(args, logDir)),
+                              ("messages", messages),
+                              ("bytes", int(sum(m["bytes"] for m in messages.values()))),
+                              ("coordinator", coordinatorUsage)])
+        if not args.profile is None:
+            report["profiles"] = mergeProfiles([logDir], os.path.splitext(args.output)[0] + "_profile")
+    finally:
+        broker.shutdown()
+        if args.log_dir is None:
+            shutil.rmtree(logDir)
+
+    print(json.dumps(report, indent = 2))
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent = 2)
+    print("results written to " + args.output)
+
+if __name__ == "__main__":
+    main()